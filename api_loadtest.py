@@ -0,0 +1,261 @@
+"""
+Load test for the HTTP API (src/api.py).
+Drives N concurrent spec threads through initial input -> gap fills ->
+detailing -> refinement -> export over HTTP, following each run on its SSE
+stream, against the stub LLM backend. Reports request and run latency
+percentiles, time to the first streamed event, throughput, RSS growth and
+errors.
+
+--background-threads keeps that many more threads cycling through the flow
+at a lower scheduler priority (?priority=background or batch) until the
+interactive threads finish; their latencies are reported separately, so the
+interactive percentiles show what saturating background load costs them.
+
+By default the API is served in-process by uvicorn on a free port; pass
+--url to load an API that is already running.
+
+Run: python api_loadtest.py --threads 200 --concurrency 100 --stub-latency 0.2
+     python api_loadtest.py --threads 20 --background-threads 40 --stub-latency 0.2
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import threading
+import traceback
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+# Same offline, isolated defaults as the app load test
+from loadtest import GAP_INPUTS, INITIAL_INPUT, current_rss_kb, percentile
+
+import httpx
+
+
+class ThreadResult:
+    def __init__(self, index: int, priority: Optional[str] = None):
+        self.index = index
+        self.priority = priority
+        self.timings: List[tuple] = []
+        self.events = 0
+        self.last_event_id = 0
+        self.errors: List[str] = []
+        self.completed = False
+
+
+def start_server(host: str = "127.0.0.1") -> str:
+    """Serve the API in a background thread; returns its base URL."""
+    import uvicorn
+    from src.api import api
+
+    server = uvicorn.Server(uvicorn.Config(api, host=host, port=0, log_level="warning", lifespan="off"))
+    threading.Thread(target=server.run, name="api-server", daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    return f"http://{host}:{port}"
+
+
+async def follow_run(client: httpx.AsyncClient, result: ThreadResult, thread_id: str, kind: str, post) -> Optional[dict]:
+    """POST a run, then read its SSE stream until it finishes. Returns the finished event's data."""
+    start = time.perf_counter()
+    response = await post()
+    result.timings.append((f"{kind}_ack", time.perf_counter() - start))
+    if response.status_code != 202:
+        result.errors.append(f"{kind}: HTTP {response.status_code} {response.text[:200]}")
+        return None
+
+    run_id = response.json()["run_id"]
+    first_event = None
+    event = None
+    async with client.stream("GET", f"/threads/{thread_id}/events", params={"until": "finished", "after": result.last_event_id}) as stream:
+        async for line in stream.aiter_lines():
+            if line.startswith("id: "):
+                result.last_event_id = int(line[4:])
+            elif line.startswith("event: "):
+                event = line[7:]
+                result.events += 1
+                if first_event is None and event not in ("queued",):
+                    first_event = time.perf_counter() - start
+            elif line.startswith("data: ") and event == "finished":
+                finished = json.loads(line[6:])
+                if finished["run_id"] != run_id:
+                    continue
+                result.timings.append((f"{kind}_first_event", first_event or 0.0))
+                result.timings.append((kind, time.perf_counter() - start))
+                if finished["status"] != "ok":
+                    result.errors.append(f"{kind}: run {finished['status']}: {finished['error']}")
+                    return None
+                return finished
+    result.errors.append(f"{kind}: event stream ended before the run finished")
+    return None
+
+
+async def timed_request(result: ThreadResult, kind: str, request) -> httpx.Response:
+    start = time.perf_counter()
+    response = await request()
+    result.timings.append((kind, time.perf_counter() - start))
+    if response.status_code >= 400:
+        result.errors.append(f"{kind}: HTTP {response.status_code} {response.text[:200]}")
+    return response
+
+
+async def run_thread(client: httpx.AsyncClient, index: int, priority: Optional[str] = None) -> ThreadResult:
+    result = ThreadResult(index, priority)
+    params = {"priority": priority} if priority else None
+    try:
+        response = await timed_request(result, "create", lambda: client.post("/threads"))
+        thread_id = response.json()["thread_id"]
+
+        initial = INITIAL_INPUT.format(session=index)
+        if not await follow_run(client, result, thread_id, "initial_submit",
+                                lambda: client.post(f"/threads/{thread_id}/input", json={"input": initial}, params=params)):
+            return result
+
+        for _ in range(len(GAP_INPUTS)):
+            state = (await timed_request(result, "get_thread", lambda: client.get(f"/threads/{thread_id}"))).json()
+            if state["is_detailed"] or not state["gaps"]:
+                break
+            gap = state["gaps"][0]
+            kind = "gap_fill_detailing" if len(state["gaps"]) == 1 else "gap_fill"
+            if not await follow_run(client, result, thread_id, kind, lambda: client.post(
+                    f"/threads/{thread_id}/gaps", json={"component": gap, "text": GAP_INPUTS[gap]}, params=params)):
+                return result
+
+        state = (await timed_request(result, "get_thread", lambda: client.get(f"/threads/{thread_id}"))).json()
+        if not state["is_detailed"]:
+            result.errors.append("spec never reached detailing")
+            return result
+
+        for name, detail in state["detailed_components"].items():
+            if detail.get("questions"):
+                answers = {name: {"0": "Owned by the platform team with a two week SLA."}}
+                if not await follow_run(client, result, thread_id, "refine", lambda: client.post(
+                        f"/threads/{thread_id}/refine", json={"answers": answers}, params=params)):
+                    return result
+                break
+
+        for fmt in ("markdown", "pdf"):
+            await timed_request(result, f"export_{fmt}", lambda: client.get(f"/threads/{thread_id}/export/{fmt}"))
+
+        result.completed = not result.errors
+    except Exception:
+        result.errors.append(traceback.format_exc(limit=3))
+    return result
+
+
+async def run_load(url: str, threads: int, concurrency: int, timeout: float,
+                   background_threads: int = 0, background_priority: str = "background") -> List[ThreadResult]:
+    slots = asyncio.Semaphore(concurrency)
+    interactive_done = asyncio.Event()
+    background_results: List[ThreadResult] = []
+
+    async def bounded(index: int) -> ThreadResult:
+        async with slots:
+            # A client per spec thread, like independent callers; one shared
+            # connection pool adds client-side queueing to the measurements
+            async with httpx.AsyncClient(base_url=url, timeout=timeout) as client:
+                return await run_thread(client, index)
+
+    async def background(index: int) -> None:
+        async with httpx.AsyncClient(base_url=url, timeout=timeout) as client:
+            while not interactive_done.is_set():
+                background_results.append(await run_thread(client, index, background_priority))
+
+    workers = [asyncio.create_task(background(threads + i)) for i in range(background_threads)]
+    results = await asyncio.gather(*(bounded(i) for i in range(threads)))
+    interactive_done.set()
+    await asyncio.gather(*workers)
+    return list(results) + background_results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=50, help="spec threads to drive")
+    parser.add_argument("--concurrency", type=int, default=50, help="threads in flight at once")
+    parser.add_argument("--stub-latency", type=float, default=0.05, help="seconds per stub LLM call (in-process server only)")
+    parser.add_argument("--url", help="base URL of a running API instead of serving one in-process")
+    parser.add_argument("--timeout", type=float, default=300, help="per-request timeout in seconds")
+    parser.add_argument("--background-threads", type=int, default=0, help="threads cycling at a lower priority meanwhile")
+    parser.add_argument("--background-priority", choices=("background", "batch"), default="background")
+    parser.add_argument("--json", help="write the report to this path")
+    args = parser.parse_args()
+
+    url = args.url
+    rss_start = current_rss_kb()
+    if url is None:
+        os.environ["SPEC_WRITER_STUB_LATENCY"] = str(args.stub_latency)
+        url = start_server()
+
+    started = time.perf_counter()
+    results = asyncio.run(run_load(url, args.threads, args.concurrency, args.timeout,
+                                   args.background_threads, args.background_priority))
+    elapsed = time.perf_counter() - started
+    rss_end = current_rss_kb()
+
+    by_kind: Dict[str, List[float]] = defaultdict(list)
+    for r in results:
+        for kind, seconds in r.timings:
+            by_kind[f"{r.priority}:{kind}" if r.priority else kind].append(seconds)
+    runs = sum(len(by_kind[k]) for k in ("initial_submit", "gap_fill", "gap_fill_detailing", "refine"))
+
+    report = {
+        "url": url if args.url else "in-process",
+        "threads": args.threads,
+        "concurrency": args.concurrency,
+        "background_threads": args.background_threads,
+        "background_priority": args.background_priority if args.background_threads else None,
+        "background_flows": sum(1 for r in results if r.priority),
+        "stub_latency": None if args.url else args.stub_latency,
+        "wall_seconds": round(elapsed, 3),
+        "completed_threads": sum(r.completed for r in results if not r.priority),
+        "runs_per_second": round(runs / elapsed, 2) if elapsed else 0.0,
+        "sse_events": sum(r.events for r in results),
+        "latency_ms": {
+            kind: {
+                "count": len(values),
+                "p50": round(percentile(values, 50) * 1000, 1),
+                "p90": round(percentile(values, 90) * 1000, 1),
+                "p95": round(percentile(values, 95) * 1000, 1),
+                "p99": round(percentile(values, 99) * 1000, 1),
+                "max": round(max(values) * 1000, 1),
+            }
+            for kind, values in sorted(by_kind.items())
+        },
+        # Only meaningful when the server runs in this process
+        "rss_kb": {"start": rss_start, "end": rss_end, "growth": rss_end - rss_start},
+        "errors": {f"thread_{r.index}" + (f"_{i}" if r.priority else ""): r.errors
+                   for i, r in enumerate(results) if r.errors},
+    }
+
+    print("\n" + "=" * 60)
+    print(f"API LOAD TEST: {args.threads} threads, concurrency {args.concurrency}"
+          + (f", {args.background_threads} {args.background_priority} threads" if args.background_threads else ""))
+    print("=" * 60)
+    print(f"Wall time: {report['wall_seconds']}s, completed: {report['completed_threads']}/{args.threads}, "
+          f"{report['runs_per_second']} runs/s, {report['sse_events']} SSE events")
+    if args.background_threads:
+        print(f"Background flows completed alongside: {report['background_flows']}")
+    width = max([30] + [len(kind) + 2 for kind in report["latency_ms"]])
+    print(f"\n{'request':<{width}}{'n':>6}{'p50':>10}{'p90':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+    for kind, s in report["latency_ms"].items():
+        print(f"{kind:<{width}}{s['count']:>6}{s['p50']:>10}{s['p90']:>10}{s['p95']:>10}{s['p99']:>10}{s['max']:>10}")
+    print(f"\nRSS: {rss_start} KB -> {rss_end} KB (+{report['rss_kb']['growth']} KB)")
+    error_count = sum(len(e) for e in report["errors"].values())
+    print(f"Errors: {error_count}")
+    for thread, errors in list(report["errors"].items())[:5]:
+        print(f"  {thread}: {errors[0].strip().splitlines()[-1]}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.json}")
+
+    return 1 if error_count else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,12 +1,35 @@
 import streamlit as st
 import asyncio
 import logging
+import time
+import uuid
+import concurrent.futures
+from io import BytesIO
 from datetime import datetime
-from typing import Dict
-from src.graph import app, get_checkpointer
-from src.state import AgentState
-from src.knowledge_base import PRD_COMPONENT_NAMES, MIN_WORDS_THRESHOLD
-from src.utils.exporter import export_to_markdown, export_to_pdf
+from typing import Dict, Optional
+from src.graph import app, get_checkpointer, asubmission, run_values
+from src.state import AgentState, initial_state
+from src.knowledge_base import PRD_COMPONENT_NAMES, MIN_WORDS_THRESHOLD, split_labeled_input
+from src.nodes.component_master import detect_gaps
+from src.nodes.detailer import get_detail_statuses, DETAIL_OK, DETAIL_FAILED, DETAIL_STALE
+from src.utils.exporter import EXPORT_FORMATS, export_formats
+from src.utils.versioning import get_version_store, diff_stats
+from src.utils.spec_library import get_spec_library
+from src.utils.bulk_export import bulk_export
+from src.utils import telemetry, memory_budget, metrics
+from src.utils.ingestion import SUPPORTED_EXTENSIONS, submit_ingestion, document_to_input
+from src.model_routing import get_routing_report
+from src.preview import apreview, preview_local, wants_model_preview
+from src.edge_sanity_checker import EDGE_SANITY_DEFAULT, apply_edge_verdict, edge_sanity_check
+from src.question_bank import local_questions, merge_questions
+from src.utils.async_runner import get_background_loop
+from src.utils.cancellation import (
+    CancelToken,
+    DeadlineExceeded,
+    RunCancelled,
+    bounded_run,
+    cancellation_scope,
+)
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -30,18 +53,9 @@ streamlit_handler = StreamlitLogHandler()
 streamlit_handler.setFormatter(logging.Formatter('%(name)s - %(levelname)s - %(message)s'))
 logging.getLogger().addHandler(streamlit_handler)
 
+# Once per process; SPEC_METRICS_PORT / SPEC_METRICS_TEXTFILE
+metrics.start_exporters()
 
-@st.cache_resource
-def get_event_loop():
-    try:
-        loop = asyncio.get_event_loop()
-    except RuntimeError:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-    return loop
-
-
-event_loop = get_event_loop()
 
 st.set_page_config(
     page_title="Spec Writer AI",
@@ -382,36 +396,365 @@ def inject_custom_css():
 inject_custom_css()
 
 
+def new_thread_id() -> str:
+    return f"session_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+
+
 def init_state():
     if "workflow_state" not in st.session_state:
-        st.session_state.workflow_state = {
-            "raw_input": "",
-            "current_spec": "",
-            "can_proceed": False,
-            "metadata": {},
-            "feedback": "",
-            "ui_queue": [],
-            "messages": [],
-            "components": {name: None for name in PRD_COMPONENT_NAMES},
-            "gaps": PRD_COMPONENT_NAMES.copy(),
-            "last_updated_component": None,
-            "is_spec_complete": False,
-            "awaiting_user_input": True,
-            "detailed_components": {},
-            "is_detailed": False,
-            "question_answers": {},
-        }
+        st.session_state.workflow_state = initial_state()
     if "thread_id" not in st.session_state:
-        st.session_state.thread_id = f"session_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        st.session_state.thread_id = new_thread_id()
     if "initialized" not in st.session_state:
         st.session_state.initialized = False
     if "is_processing" not in st.session_state:
         st.session_state.is_processing = False
     if "show_logs" not in st.session_state:
         st.session_state.show_logs = False
+    if "pending_submission" not in st.session_state:
+        st.session_state.pending_submission = None
+    if "retry_detailing" not in st.session_state:
+        st.session_state.retry_detailing = False
+    if "active_run" not in st.session_state:
+        st.session_state.active_run = None
+    if "run_error" not in st.session_state:
+        st.session_state.run_error = None
+    if "preview" not in st.session_state:
+        st.session_state.preview = None
+    if "memory" not in st.session_state:
+        st.session_state.memory = memory_budget.SessionMemory()
+    if "instant_questions" not in st.session_state:
+        st.session_state.instant_questions = {}
+
+
+def resume_evicted_session():
+    """Reinstate state released by the memory budget while this session was idle."""
+    evicted = memory_budget.resume_session(st.session_state.memory)
+    if evicted is None:
+        return
+    if evicted["session"]:
+        st.session_state.workflow_state = evicted["session"]["workflow_state"]
+        st.session_state.thinking_logs = evicted["session"]["thinking_logs"]
+        logger.info("Restored idle session from disk")
+    else:
+        st.session_state.workflow_state = initial_state()
+        st.session_state.thinking_logs = []
+        st.session_state.run_error = "This session was idle and was cleared to free memory. Saved specs can be reopened from the library."
 
 
 init_state()
+resume_evicted_session()
+
+
+# How often the live preview checks for the model result
+PREVIEW_POLL_SECONDS = 0.5
+
+EXPORT_LABELS = {
+    "markdown": "Markdown",
+    "pdf": "PDF",
+    "html": "HTML",
+    "json": "JSON",
+    "docx": "Word",
+}
+
+
+def render_export_buttons(components, detailed_components, key_prefix: str, columns=None):
+    """Render one download button per export format from a single document build."""
+    exports = export_formats(components, detailed_components, formats=EXPORT_LABELS.keys())
+    slots = columns or [None] * len(EXPORT_LABELS)
+    
+    for slot, (fmt, label) in zip(slots, EXPORT_LABELS.items()):
+        _, mime, extension = EXPORT_FORMATS[fmt]
+        content = exports[fmt]
+        container = slot if slot is not None else st.container()
+        with container:
+            if isinstance(content, Exception):
+                st.caption(f"{label} export unavailable: {content}")
+                continue
+            st.download_button(
+                f"Download {label}",
+                content,
+                file_name=f"spec.{extension}",
+                mime=mime,
+                use_container_width=True,
+                key=f"{key_prefix}_{fmt}_download"
+            )
+
+
+def record_version(label: str):
+    """Snapshot current components into this thread's version history."""
+    workflow_state = st.session_state.workflow_state
+    get_version_store(st.session_state.thread_id).record(
+        workflow_state.get("components", {}),
+        workflow_state.get("detailed_components", {}),
+        label=label,
+    )
+
+
+def save_to_library(force: bool = False):
+    """Store the spec in the searchable library once it is complete."""
+    workflow_state = st.session_state.workflow_state
+    if not force and not (workflow_state.get("is_spec_complete") or workflow_state.get("is_detailed")):
+        return
+    get_spec_library().save_spec(
+        st.session_state.thread_id,
+        workflow_state.get("components", {}),
+        workflow_state.get("detailed_components", {}),
+        workflow_state.get("metadata", {}),
+    )
+
+
+def open_library_spec(spec_id: str):
+    """Reopen a stored spec into this session. No LLM calls are made."""
+    spec = get_spec_library().get_spec(spec_id)
+    if spec is None:
+        st.warning("Spec no longer exists in the library.")
+        return
+    
+    components = spec["components"]
+    detailed_components = spec["detailed_components"]
+    gaps = detect_gaps(components)
+    st.session_state.thread_id = spec_id
+    st.session_state.workflow_state.update({
+        "components": components,
+        "detailed_components": detailed_components,
+        "detail_status": {},
+        "detail_sources": {},
+        "metadata": spec["metadata"],
+        "gaps": gaps,
+        "is_spec_complete": not gaps,
+        "is_detailed": bool(detailed_components),
+        "can_proceed": True,
+        "awaiting_user_input": bool(gaps),
+        "question_answers": {},
+        "feedback": f"Reopened '{spec['title']}' from the library.",
+    })
+    st.rerun()
+
+
+@st.fragment
+def render_library_search():
+    """Sidebar panel to search the spec library and reopen past specs."""
+    st.markdown("### Spec Library")
+    library = get_spec_library()
+    
+    query = st.text_input("Search specs", placeholder="e.g. retention gamification", key="library_query")
+    component = st.selectbox("In component", ["All"] + PRD_COMPONENT_NAMES, key="library_component")
+    
+    if query.strip():
+        results = library.search(query, component=None if component == "All" else component)
+        if not results:
+            st.caption("No matching specs")
+    else:
+        results = library.list_recent()
+        st.caption(f"{library.count()} saved specs · most recent")
+    
+    for result in results:
+        details = " · ".join(v for v in (result.get("maturity"), result.get("environment")) if v)
+        st.markdown(f"**{result['title']}**")
+        if result.get("snippet"):
+            st.caption(result["snippet"])
+        elif details:
+            st.caption(details)
+        if st.button("Open", key=f"library_open_{result['spec_id']}", use_container_width=True):
+            open_library_spec(result["spec_id"])
+
+
+BULK_EXPORT_CHOICES = 50
+
+
+@st.fragment
+def render_bulk_export():
+    """Sidebar panel to export several library specs into one zip."""
+    recent = get_spec_library().list_recent(limit=BULK_EXPORT_CHOICES)
+    if not recent:
+        return
+    
+    with st.expander("Bulk export"):
+        titles = {result["spec_id"]: result["title"] for result in recent}
+        selected = st.multiselect("Specs", list(titles), format_func=titles.get, key="bulk_specs")
+        formats = st.multiselect(
+            "Formats", list(EXPORT_LABELS), default=["markdown", "pdf"],
+            format_func=EXPORT_LABELS.get, key="bulk_formats",
+        )
+        if st.button("Build zip", key="bulk_build", use_container_width=True, disabled=not selected or not formats):
+            progress = st.progress(0.0, text=f"Rendering {len(selected)} specs...")
+            buffer = BytesIO()
+            result = bulk_export(
+                selected,
+                formats,
+                buffer,
+                on_progress=lambda p: progress.progress(p["done"] / p["total"], text=f"{p['done']}/{p['total']} · {p['title'] or p['spec_id']}"),
+            )
+            progress.empty()
+            st.session_state.bulk_export = {"data": buffer.getvalue(), "result": result}
+        
+        bundle = st.session_state.get("bulk_export")
+        if bundle:
+            result = bundle["result"]
+            st.caption(f"{len(result['exported'])} specs, {result['files']} files in {result['seconds']:.1f}s")
+            for spec_id, error in result["failed"].items():
+                st.caption(f"Failed: {titles.get(spec_id, spec_id)} ({error})")
+            st.download_button(
+                "Download zip",
+                bundle["data"],
+                file_name="specs.zip",
+                mime="application/zip",
+                use_container_width=True,
+                key="bulk_download",
+            )
+
+
+@st.fragment
+def render_performance_panel():
+    """Sidebar breakdown of node/LLM latency, tokens and cache stats. Reads in-process counters only."""
+    st.markdown("### Performance")
+    session = telemetry.get_session_stats(st.session_state.thread_id)
+    last_run = telemetry.get_last_run(st.session_state.thread_id)
+    
+    if session is None or last_run is None:
+        st.caption("No runs yet")
+        return
+    
+    with st.expander(f"Last run: {last_run.label} ({last_run.duration:.2f}s)", expanded=False):
+        col1, col2 = st.columns(2)
+        col1.metric("Prompt tokens", last_run.input_tokens)
+        col2.metric("Completion tokens", last_run.output_tokens)
+        
+        if last_run.nodes:
+            st.caption("Time per node")
+            st.dataframe(
+                [{"node": node, "ms": round(seconds * 1000)} for node, seconds in last_run.nodes.items()],
+                hide_index=True,
+                use_container_width=True,
+            )
+        if last_run.llm_calls:
+            st.caption("LLM calls")
+            st.dataframe(
+                [
+                    {
+                        "node": call["node"],
+                        "model": call.get("model") or "",
+                        "component": call["component"] or "",
+                        "ms": round(call["seconds"] * 1000),
+                        "in": call["input_tokens"],
+                        "out": call["output_tokens"],
+                        "error": call["error"] or "",
+                    }
+                    for call in last_run.llm_calls
+                ],
+                hide_index=True,
+                use_container_width=True,
+            )
+        if last_run.cache:
+            st.caption("Cache: " + ", ".join(f"{name} {c['hits']}/{c['hits'] + c['misses']} hits" for name, c in last_run.cache.items()))
+    
+    with st.expander("Session totals", expanded=False):
+        totals = session.totals
+        col1, col2 = st.columns(2)
+        col1.metric("Runs", totals["runs"])
+        col2.metric("LLM calls", totals["llm_calls"])
+        col1.metric("Total time", f"{totals['seconds']:.1f}s")
+        col2.metric("LLM time", f"{totals['llm_seconds']:.1f}s")
+        col1.metric("Prompt tokens", totals["input_tokens"])
+        col2.metric("Completion tokens", totals["output_tokens"])
+        if totals["llm_errors"]:
+            st.caption(f"LLM errors: {totals['llm_errors']}")
+        
+        slowest = telemetry.slowest_components(st.session_state.thread_id)
+        if slowest:
+            st.caption("Slowest components: " + ", ".join(f"{name} ({seconds:.1f}s)" for name, seconds in slowest))
+        if session.cache:
+            st.caption("Cache: " + ", ".join(f"{name} {c['hits']}/{c['hits'] + c['misses']} hits" for name, c in session.cache.items()))
+    
+    routing = get_routing_report()
+    if routing:
+        with st.expander("Model routing (all sessions)", expanded=False):
+            st.dataframe(
+                [
+                    {
+                        "node": row["node"],
+                        "model": row["model"],
+                        "routed": row["decisions"],
+                        "fallbacks": row["fallbacks"],
+                        "avg ms": round(row["avg_seconds"] * 1000),
+                        "est. $": round(row["cost_usd"], 4),
+                    }
+                    for row in routing
+                ],
+                hide_index=True,
+                use_container_width=True,
+            )
+
+    memory = memory_budget.get_memory_report()
+    with st.expander("Memory (all sessions)", expanded=False):
+        col1, col2 = st.columns(2)
+        col1.metric("Estimated", f"{memory['total_bytes'] / 2**20:.1f} MB")
+        col2.metric("Budget", f"{memory['budget_bytes'] / 2**20:.0f} MB")
+        st.caption(
+            f"{memory['threads']} threads, {memory['evictions']} evicted, {memory['on_disk']} on disk"
+            + (f", process RSS {memory['rss_kb'] / 1024:.0f} MB" if memory["rss_kb"] else "")
+        )
+        if memory["largest"]:
+            st.dataframe(
+                [
+                    {
+                        "thread": row["thread_id"],
+                        "session KB": row["session_bytes"] // 1024,
+                        "logs KB": row["thinking_log_bytes"] // 1024,
+                        "checkpoints KB": row["checkpoint_bytes"] // 1024,
+                        "history KB": row["history_bytes"] // 1024,
+                        "checkpoints": row["checkpoints"],
+                        "idle s": round(row["idle_seconds"]) if row["idle_seconds"] is not None else None,
+                    }
+                    for row in memory["largest"]
+                ],
+                hide_index=True,
+                use_container_width=True,
+            )
+
+    st.button("Refresh", key="perf_refresh", use_container_width=True)
+
+
+def render_version_history():
+    """Sidebar expander to browse and diff previous spec versions."""
+    store = get_version_store(st.session_state.thread_id)
+    versions = store.list_versions()
+    
+    if len(versions) < 2:
+        return
+    
+    with st.expander(f"Version History ({len(versions)})"):
+        labels = {v["version"]: f"v{v['version']} · {v['timestamp'][11:]} · {v['label']}" for v in versions}
+        options = list(labels)
+        from_version = st.selectbox("From", options, index=len(options) - 2, format_func=labels.get, key="history_from")
+        to_version = st.selectbox("To", options, index=len(options) - 1, format_func=labels.get, key="history_to")
+        
+        diff_text = store.diff(from_version, to_version)
+        added, removed = diff_stats(diff_text)
+        st.caption(f"+{added} / -{removed} lines · {store.storage_bytes()} bytes stored")
+        st.code(diff_text or "No changes", language="diff")
+        st.download_button(
+            "Download Diff",
+            diff_text,
+            file_name=f"spec_v{from_version}_v{to_version}.diff",
+            mime="text/x-diff",
+            use_container_width=True,
+            key="history_diff_download"
+        )
+        
+        if st.button(f"Restore v{from_version}", use_container_width=True, key="history_restore"):
+            restored = store.get(from_version)
+            st.session_state.workflow_state["components"] = restored["components"]
+            st.session_state.workflow_state["detailed_components"] = restored["detailed_components"]
+            st.session_state.workflow_state["detail_status"] = {}
+            st.session_state.workflow_state["detail_sources"] = {}
+            st.session_state.workflow_state["compactions"] = {}
+            st.session_state.workflow_state["is_detailed"] = bool(restored["detailed_components"])
+            st.session_state.workflow_state["gaps"] = detect_gaps(restored["components"])
+            st.session_state.workflow_state["is_spec_complete"] = not st.session_state.workflow_state["gaps"]
+            record_version(f"Restored v{from_version}")
+            st.rerun()
 
 
 def render_sidebar_exports():
@@ -435,108 +778,211 @@ def render_sidebar_exports():
         source_label = "Detailed" if is_detailed else "Draft"
         st.caption(f"Export source: {source_label}")
         
-        md_content = export_to_markdown(components, export_source)
-        st.download_button(
-            "Download Markdown",
-            md_content,
-            file_name="spec.md",
-            mime="text/markdown",
-            use_container_width=True,
-            key="sidebar_md_download"
-        )
+        render_export_buttons(components, export_source, "sidebar")
         
-        try:
-            pdf_content = export_to_pdf(components, export_source)
-            st.download_button(
-                "Download PDF",
-                pdf_content,
-                file_name="spec.pdf",
-                mime="application/pdf",
-                use_container_width=True,
-                key="sidebar_pdf_download"
-            )
-        except Exception as e:
-            st.caption(f"PDF export unavailable: {e}")
+        render_version_history()
         
         st.divider()
         
         st.markdown("### Actions")
+        if st.button("Save to Library", use_container_width=True, key="sidebar_save_library"):
+            save_to_library(force=True)
+            st.toast("Spec saved to library")
         if st.button("Reset Spec", type="secondary", use_container_width=True, key="sidebar_reset"):
-            st.session_state.workflow_state = {
-                "raw_input": "",
-                "current_spec": "",
-                "can_proceed": False,
-                "metadata": {},
-                "feedback": "",
-                "ui_queue": [],
-                "messages": [],
-                "components": {name: None for name in PRD_COMPONENT_NAMES},
-                "gaps": PRD_COMPONENT_NAMES.copy(),
-                "last_updated_component": None,
-                "is_spec_complete": False,
-                "awaiting_user_input": True,
-                "detailed_components": {},
-                "is_detailed": False,
-                "question_answers": {},
-            }
+            st.session_state.workflow_state = initial_state()
+            st.session_state.thread_id = new_thread_id()
             st.rerun()
 
 
 render_sidebar_exports()
 
+with st.sidebar:
+    st.divider()
+    render_library_search()
+    render_bulk_export()
+    st.divider()
+    render_performance_panel()
 
-async def run_component_master(user_input: str, target_component: str = None):
-    """Run component master with new input."""
-    state = st.session_state.workflow_state.copy()
-    state["raw_input"] = user_input
-    state["awaiting_user_input"] = False
-    if target_component:
-        state["last_updated_component"] = target_component
-    
-    config = {"configurable": {"thread_id": st.session_state.thread_id}}
+
+async def run_component_master(state: Dict, thread_id: str, user_input: str, target_component: str = None, token: CancelToken = None, label: str = None, edge_verdict: Dict = None):
+    """
+    Run component master with new input, resuming the thread if it is paused for gap input.
+    A decisive edge_verdict on an initial input stands in for the Gemini sanity check.
+    """
+    config = {"configurable": {"thread_id": thread_id}}
+    memory_budget.ensure_resident(thread_id)
     
-    result = await app.ainvoke(state, config)
-    st.session_state.workflow_state = result
+    with cancellation_scope(token), telemetry.track_run(thread_id, label or target_component or "Initial input"):
+        if target_component is None and user_input:
+            state = apply_edge_verdict(state, edge_verdict, user_input)
+        graph_input = await asubmission(config, user_input, target_component, state)
+        return run_values(await bounded_run(app.ainvoke(graph_input, config), token))
 
 
-async def run_refiner(question_answers: Dict[str, Dict[int, str]]):
+async def run_refiner(state: Dict, thread_id: str, question_answers: Dict[str, Dict[int, str]], token: CancelToken = None):
     """Run refiner node to process question answers."""
-    state = st.session_state.workflow_state.copy()
+    state = state.copy()
     state["question_answers"] = question_answers
     
     # Manually invoke refiner node since it's not in the main flow
-    from src.nodes.refiner import refiner_node
-    result = refiner_node(state)
-    
-    # Update state with refinement results
-    st.session_state.workflow_state["detailed_components"] = result["detailed_components"]
-    st.session_state.workflow_state["question_answers"] = result["question_answers"]
+    from src.nodes.refiner import arefiner_node
+    with cancellation_scope(token), telemetry.track_run(thread_id, "Refinement"):
+        return await bounded_run(arefiner_node(state), token)
 
 
-def run_workflow_sync(user_input: str, target_component: str = None):
-    """Sync wrapper for async workflow."""
+def run_with_cancel(make_coro, label: str, while_waiting=None):
+    """
+    Run a graph coroutine on the background loop and wait for it, showing a
+    Cancel button. The run survives reruns: a rerun finds it in
+    session_state.active_run and keeps waiting instead of starting it again.
+    while_waiting, if given, renders extra widgets below the button for the
+    duration of the run.
+    Returns the result, or None if the run was cancelled or failed, in which
+    case workflow_state is left at the last committed state.
+    """
+    active = st.session_state.get("active_run")
+    if active is None:
+        token = CancelToken()
+        active = {
+            "future": get_background_loop().submit(make_coro(token)),
+            "token": token,
+            "started": time.monotonic(),
+        }
+        st.session_state.active_run = active
+    
+    if st.button("Cancel", key="cancel_run"):
+        active["token"].cancel()
+        active["future"].cancel()
+        st.session_state.active_run = None
+        logger.info(f"{label} cancelled by user, keeping last checkpointed spec")
+        st.session_state.run_error = f"{label} cancelled. Your spec was left as it was before this run."
+        return None
+    
+    if while_waiting is not None:
+        while_waiting()
+    
+    status = st.empty()
+    while not active["future"].done():
+        # Any st call lets Streamlit interrupt this loop when Cancel is clicked
+        status.caption(f"{label}... {time.monotonic() - active['started']:.0f}s")
+        time.sleep(0.2)
+    status.empty()
+    st.session_state.active_run = None
+    
     try:
-        event_loop.run_until_complete(run_component_master(user_input, target_component))
-    except RuntimeError as e:
-        if "Event loop is closed" in str(e):
-            new_loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(new_loop)
-            new_loop.run_until_complete(run_component_master(user_input, target_component))
-        else:
-            raise
+        return active["future"].result()
+    except (RunCancelled, concurrent.futures.CancelledError):
+        st.session_state.run_error = f"{label} cancelled. Your spec was left as it was before this run."
+    except DeadlineExceeded as e:
+        logger.error(f"{label} timed out: {e}")
+        st.session_state.run_error = f"{label} timed out ({e}). Your spec was left as it was before this run."
+    except Exception as e:
+        logger.error(f"{label} failed: {e}")
+        st.session_state.run_error = f"{label} failed: {e}"
+    return None
+
+
+def expected_components(user_input: str) -> Dict[str, Optional[str]]:
+    """The components a submission should leave behind, judged from its labeled sections alone."""
+    components = dict(st.session_state.workflow_state.get("components", {}))
+    components.update(split_labeled_input(user_input))
+    return components
+
+
+def render_instant_questions(components: Dict[str, Optional[str]]):
+    """
+    Ask the question bank's follow-ups while the spec is being detailed. The
+    answer boxes use the detailed view's widget keys, so whatever the user
+    types here is still there when the detailed spec appears.
+    """
+    st.session_state.instant_questions = {}
+    if detect_gaps(components):
+        # This submission won't complete the spec, so nothing gets detailed yet
+        return
+    
+    st.markdown("#### Start answering while your spec is elaborated")
+    for name in PRD_COMPONENT_NAMES:
+        questions = local_questions(name, components.get(name))
+        if not questions:
+            continue
+        st.session_state.instant_questions[name] = questions
+        with st.expander(f"Follow-up questions for {name}"):
+            for q_idx, question in enumerate(questions):
+                st.text_area(
+                    question,
+                    value="",
+                    height=80,
+                    key=f"qa_{name}_{q_idx}",
+                    label_visibility="visible",
+                )
+
+
+def merge_instant_questions(result: Dict) -> Dict:
+    """Fold the detailer's questions into the instant ones, keeping those already answered."""
+    shown = st.session_state.instant_questions
+    st.session_state.instant_questions = {}
+    if not result.get("is_detailed"):
+        return result
+    
+    for name, local in shown.items():
+        detail = result.get("detailed_components", {}).get(name)
+        if not detail:
+            continue
+        answered = [i for i in range(len(local)) if (st.session_state.get(f"qa_{name}_{i}") or "").strip()]
+        detail["questions"] = merge_questions(local, detail.get("questions", []), answered)
+    return result
+
+
+def run_workflow_sync(user_input: str, target_component: str = None, edge_verdict: Dict = None):
+    """Run the graph for new input and commit the result to the session."""
+    state = st.session_state.workflow_state
+    thread_id = st.session_state.thread_id
+    result = run_with_cancel(
+        lambda token: run_component_master(state, thread_id, user_input, target_component, token, edge_verdict=edge_verdict),
+        "Processing",
+        while_waiting=lambda: render_instant_questions(expected_components(user_input)),
+    )
+    if result is None:
+        st.session_state.instant_questions = {}
+        return
+    
+    st.session_state.workflow_state = merge_instant_questions(result)
+    record_version(f"Input: {target_component}" if target_component else "Initial input")
+    save_to_library()
+
+
+def run_retry_failed_sync():
+    """Re-run detailing; components already detailed from their current text are kept."""
+    state = st.session_state.workflow_state
+    thread_id = st.session_state.thread_id
+    result = run_with_cancel(
+        lambda token: run_component_master(state, thread_id, "", token=token, label="Retry failed"),
+        "Retrying failed components",
+    )
+    if result is None:
+        return
+    
+    st.session_state.workflow_state = result
+    record_version("Retried failed detailing")
+    save_to_library()
 
 
 def run_refiner_sync(question_answers: Dict[str, Dict[int, str]]):
-    """Sync wrapper for refiner node."""
-    try:
-        event_loop.run_until_complete(run_refiner(question_answers))
-    except RuntimeError as e:
-        if "Event loop is closed" in str(e):
-            new_loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(new_loop)
-            new_loop.run_until_complete(run_refiner(question_answers))
-        else:
-            raise
+    """Run the refiner and commit refined components to the session."""
+    state = st.session_state.workflow_state
+    thread_id = st.session_state.thread_id
+    result = run_with_cancel(
+        lambda token: run_refiner(state, thread_id, question_answers, token),
+        "Refinement",
+    )
+    if result is None:
+        return
+    
+    # Update state with refinement results
+    st.session_state.workflow_state["detailed_components"] = result["detailed_components"]
+    st.session_state.workflow_state["question_answers"] = result["question_answers"]
+    record_version(f"Refined: {', '.join(question_answers)}")
+    save_to_library()
 
 
 def count_words(text):
@@ -545,6 +991,13 @@ def count_words(text):
     return len(text.split())
 
 
+DETAIL_BADGES = {
+    DETAIL_OK: ("Detailed", "#4F46E5", "#EEF2FF"),
+    DETAIL_FAILED: ("Failed", "#DC2626", "#FEF2F2"),
+    DETAIL_STALE: ("Stale", "#D97706", "#FFFBEB"),
+}
+
+
 def render_detailed_spec_display():
     """Render the detailed spec with elaborated text and question dropdowns for answers."""
     detailed_components = st.session_state.workflow_state.get("detailed_components", {})
@@ -553,6 +1006,15 @@ def render_detailed_spec_display():
     st.markdown("### Detailed Specification")
     st.success("Your specification has been elaborated. Answer any questions below to refine further.")
     
+    statuses = get_detail_statuses(st.session_state.workflow_state)
+    needs_retry = [name for name, status in statuses.items() if status != DETAIL_OK]
+    if needs_retry:
+        st.warning(f"Detailing failed or is out of date for: {', '.join(needs_retry)}")
+        if st.button(f"Retry failed ({len(needs_retry)})", key="retry_failed", use_container_width=True, disabled=st.session_state.is_processing):
+            st.session_state.retry_detailing = True
+            st.session_state.is_processing = True
+            st.rerun()
+    
     # Create a dict to track answers for this render
     current_answers = {}
     
@@ -560,12 +1022,13 @@ def render_detailed_spec_display():
         detail = detailed_components.get(name, {})
         text = detail.get("text") or components.get(name)
         questions = detail.get("questions", [])
+        badge_label, badge_color, badge_background = DETAIL_BADGES.get(statuses.get(name), DETAIL_BADGES[DETAIL_OK])
         
         st.markdown(f"""
         <div class="component-card component-detailed">
             <div style="display: flex; justify-content: space-between; align-items: center; margin-bottom: 8px;">
                 <strong>{name}</strong>
-                <span style="font-size: 12px; color: #4F46E5; font-weight: 500; background: #EEF2FF; padding: 2px 8px; border-radius: 12px;">Detailed</span>
+                <span style="font-size: 12px; color: {badge_color}; font-weight: 500; background: {badge_background}; padding: 2px 8px; border-radius: 12px;">{badge_label}</span>
             </div>
             <div style="color: #E2E8F0; font-size: 14px; line-height: 1.6; margin-bottom: 12px;">
                 {text if text else '<em style="color: #94A3B8;">No information provided</em>'}
@@ -598,6 +1061,13 @@ def render_detailed_spec_display():
         
         st.markdown("<br>", unsafe_allow_html=True)
     
+    if st.session_state.is_processing and st.session_state.retry_detailing:
+        with st.spinner("Retrying failed components..."):
+            run_retry_failed_sync()
+            st.session_state.retry_detailing = False
+            st.session_state.is_processing = False
+            st.rerun()
+    
     # Process refinement if questions were answered
     if st.session_state.is_processing and st.session_state.question_answers:
         with st.spinner("Refining your specification with the provided answers..."):
@@ -610,6 +1080,7 @@ def render_spec_display():
     """Render all 7 components in a stable container."""
     components = st.session_state.workflow_state.get("components", {})
     gaps = st.session_state.workflow_state.get("gaps", [])
+    compactions = st.session_state.workflow_state.get("compactions") or {}
     
     st.markdown("### Live Specification")
     
@@ -633,6 +1104,8 @@ def render_spec_display():
             </div>
         </div>
         """, unsafe_allow_html=True)
+        if name in compactions:
+            st.caption(f"Condensed to fit the context budget. The full text is v{compactions[name]} in Version History.")
 
 
 @st.fragment
@@ -668,26 +1141,110 @@ def render_gap_inputs():
             with col1:
                 if st.button("Add", key=f"btn_{gap_name}", use_container_width=True, disabled=st.session_state.is_processing):
                     if user_input.strip():
+                        combined_input = f"{gap_name}: {user_input}"
+                        if current_text:
+                            combined_input = f"{gap_name}: {current_text} {user_input}"
+                        st.session_state.pending_submission = {"input": combined_input, "component": gap_name}
                         st.session_state.is_processing = True
                         st.rerun()
                     else:
                         st.warning("Please enter some text first")
             
             # Process submission if button was pressed
-            if st.session_state.is_processing and user_input.strip():
+            pending = st.session_state.get("pending_submission")
+            if st.session_state.is_processing and pending and pending["component"] == gap_name:
                 with st.spinner("Processing your input..."):
-                    combined_input = f"{gap_name}: {user_input}"
-                    if current_text:
-                        combined_input = f"{gap_name}: {current_text} {user_input}"
-                    
                     logger.info(f"Adding input for {gap_name}")
-                    run_workflow_sync(combined_input, gap_name)
+                    run_workflow_sync(pending["input"], gap_name)
+                    st.session_state.pending_submission = None
                     st.session_state.is_processing = False
                     st.rerun()
             
             st.divider()
 
 
+def ingest_upload(uploaded) -> Optional[str]:
+    """Parse an uploaded brief on the ingestion pool; returns extraction input or None on failure."""
+    with st.spinner(f"Reading {uploaded.name}..."):
+        try:
+            document = submit_ingestion(uploaded.name, uploaded.getvalue()).result()
+        except Exception as e:
+            logger.error(f"Failed to ingest {uploaded.name}: {e}")
+            st.error(f"Could not read {uploaded.name}: {e}")
+            return None
+    
+    if not document["chunks"]:
+        st.error(f"No text found in {uploaded.name}")
+        return None
+    if document["truncated"]:
+        st.warning(f"{uploaded.name} is very long; only the first {document['char_count']:,} characters were used.")
+    return document_to_input(document)
+
+
+def schedule_preview():
+    """on_change of the live draft: replace any pending preview with one for the new text."""
+    draft = st.session_state.get("draft_input", "")
+    previous = st.session_state.get("preview")
+    if previous and previous["draft"] == draft:
+        return
+    if previous and previous["future"] is not None:
+        # Stale: cancels the debounce, or the model calls if no submission joined them
+        previous["future"].cancel()
+    st.session_state.preview = {
+        "draft": draft,
+        "result": preview_local(draft),
+        "future": get_background_loop().submit(apreview(draft)) if wants_model_preview(draft) else None,
+    }
+
+
+def finish_preview(submitted_input: str):
+    """On submit, keep a preview of the submitted text running so the graph joins its calls."""
+    preview = st.session_state.get("preview")
+    if preview and preview["future"] is not None and preview["draft"] != submitted_input:
+        preview["future"].cancel()
+    st.session_state.preview = None
+
+
+def render_live_preview():
+    """Provisional component cards for the current draft; polls while the model preview runs."""
+    preview = st.session_state.get("preview")
+    if not preview or not preview["draft"].strip():
+        st.caption("Components found in your draft will appear here.")
+        return
+    
+    future = preview["future"]
+    if future is not None and future.done():
+        if not future.cancelled() and future.exception() is None:
+            preview["result"] = future.result()
+        elif not future.cancelled():
+            logger.warning(f"Live preview failed: {future.exception()}")
+        preview["future"] = None
+        # Full rerun, so the fragment stops polling
+        st.rerun()
+    
+    result = preview["result"]
+    if future is not None:
+        st.caption("Provisional: labeled sections only, refining with the model...")
+    else:
+        st.caption("Provisional: model preview of your draft" if result["source"] == "model" else "Provisional: labeled sections only")
+    if result["can_proceed"] is False and result["feedback"]:
+        st.warning(f"Need more details: {result['feedback']}")
+    
+    for name in PRD_COMPONENT_NAMES:
+        text = result["components"].get(name)
+        if not text:
+            continue
+        st.markdown(f"""
+        <div class="component-card component-incomplete" style="opacity: 0.85;">
+            <div style="display: flex; justify-content: space-between; align-items: center; margin-bottom: 8px;">
+                <strong>{name}</strong>
+                <span style="font-size: 12px; font-weight: 500; color: #64748B; background: #F1F5F9; padding: 2px 8px; border-radius: 12px;">Provisional</span>
+            </div>
+            <div style="color: #E2E8F0; font-size: 14px; line-height: 1.6;">{text}</div>
+        </div>
+        """, unsafe_allow_html=True)
+
+
 def render_initial_input():
     """Render the initial PRD input form."""
     st.markdown("### Start Your Specification")
@@ -701,26 +1258,87 @@ def render_initial_input():
         st.error(f"Need more details: {feedback}")
 
     
-    with st.form("initial_input_form"):
-        user_input = st.text_area(
+    live_preview = st.toggle(
+        "Live preview",
+        key="live_preview",
+        help="Extract components from your draft whenever you pause (click away or press Ctrl+Enter), so analysis is already under way when you submit.",
+        disabled=st.session_state.is_processing,
+    )
+    if live_preview:
+        st.text_area(
             "Describe your idea",
             placeholder="Share some details of what you want to build. I will help you elaborate it.",
             height=200,
+            key="draft_input",
+            on_change=schedule_preview,
             disabled=st.session_state.is_processing
         )
+        preview = st.session_state.get("preview")
+        polling = preview is not None and preview["future"] is not None
+        st.fragment(render_live_preview, run_every=PREVIEW_POLL_SECONDS if polling else None)()
+    
+    edge_check = st.toggle(
+        "Check on this device first",
+        key="edge_sanity",
+        value=EDGE_SANITY_DEFAULT,
+        help="Judge the brief with a small model in your browser (needs WebGPU). A confident verdict skips the Gemini sanity check.",
+        disabled=st.session_state.is_processing,
+    )
+    pending = st.session_state.get("pending_submission")
+    submitting = st.session_state.is_processing and pending and pending["component"] is None
+    edge_verdict = None
+    if edge_check:
+        # Rendered before submitting too, so the model is loaded by the time a brief arrives
+        edge_verdict = edge_sanity_check(pending["input"] if submitting else None)
+    
+    with st.form("initial_input_form"):
+        user_input = ""
+        if not live_preview:
+            user_input = st.text_area(
+                "Describe your idea",
+                placeholder="Share some details of what you want to build. I will help you elaborate it.",
+                height=200,
+                disabled=st.session_state.is_processing
+            )
+        
+        uploaded = st.file_uploader(
+            "Or upload a brief (Markdown, text, PDF, DOCX)",
+            type=sorted(SUPPORTED_EXTENSIONS),
+            disabled=st.session_state.is_processing,
+        )
         
         submitted = st.form_submit_button("Analyze and Extract Components", use_container_width=True, disabled=st.session_state.is_processing)
         
-        if submitted and user_input.strip():
+        if submitted and live_preview:
+            user_input = st.session_state.get("draft_input", "")
+        
+        if submitted and (user_input.strip() or uploaded is not None):
+            combined_input = user_input
+            if uploaded is not None:
+                document_text = ingest_upload(uploaded)
+                if document_text is None:
+                    return
+                combined_input = f"{user_input}\n\n{document_text}" if user_input.strip() else document_text
+            
+            finish_preview(combined_input)
+            st.session_state.pending_submission = {"input": combined_input, "component": None}
             st.session_state.is_processing = True
             st.session_state.show_logs = False
             st.rerun()
     
     # Process initial submission with loader and hidden logs
-    if st.session_state.is_processing and user_input.strip():
+    if submitting:
+        if edge_check and edge_verdict is None and not pending.get("edge_skipped"):
+            # The component reruns the script with its verdict
+            st.caption("Checking your brief on this device...")
+            if st.button("Skip on-device check", key="skip_edge_check"):
+                pending["edge_skipped"] = True
+                st.rerun()
+            return
         with st.spinner("Analyzing your specification and extracting components..."):
             logger.info("Processing initial input...")
-            run_workflow_sync(user_input)
+            run_workflow_sync(pending["input"], edge_verdict=edge_verdict)
+            st.session_state.pending_submission = None
             st.session_state.is_processing = False
             st.rerun()
 
@@ -732,6 +1350,10 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
+if st.session_state.run_error:
+    st.warning(st.session_state.run_error)
+    st.session_state.run_error = None
+
 components = st.session_state.workflow_state.get("components", {})
 has_any_content = any(v for v in components.values() if v)
 is_detailed = st.session_state.workflow_state.get("is_detailed", False)
@@ -744,30 +1366,12 @@ elif is_detailed:
     
     st.markdown("---")
     st.markdown("### Export Your Specification")
-    col1, col2, col3 = st.columns([1, 1, 2])
-    with col1:
-        md_content = export_to_markdown(components, st.session_state.workflow_state.get("detailed_components", {}))
-        st.download_button(
-            "Download Markdown",
-            md_content,
-            file_name="spec.md",
-            mime="text/markdown",
-            use_container_width=True,
-            key="main_md_download"
-        )
-    with col2:
-        try:
-            pdf_content = export_to_pdf(components, st.session_state.workflow_state.get("detailed_components", {}))
-            st.download_button(
-                "Download PDF",
-                pdf_content,
-                file_name="spec.pdf",
-                mime="application/pdf",
-                use_container_width=True,
-                key="main_pdf_download"
-            )
-        except Exception as e:
-            st.caption(f"PDF unavailable: {e}")
+    render_export_buttons(
+        components,
+        st.session_state.workflow_state.get("detailed_components", {}),
+        "main",
+        columns=st.columns(len(EXPORT_LABELS)),
+    )
 else:
     col1, col2 = st.columns([1, 1], gap="large")
     
@@ -780,3 +1384,6 @@ else:
     if is_complete:
         st.markdown("---")
         st.info("Your specification is complete. Refining with additional details...")
+
+# Measured after the rerun so eviction sees the state the session settled on
+memory_budget.account_session(st.session_state.memory, st.session_state.thread_id, st.session_state.to_dict())
@@ -0,0 +1,344 @@
+"""
+Golden-corpus latency and output-drift regression suite.
+
+Runs every idea in golden/corpus.jsonl through the full graph (initial input,
+gap fills, detailing) with LLM responses replayed from golden/cassette.jsonl,
+then reports per-stage latency and token counts, and how far components, gaps
+and detailed text drifted from golden/baseline.json. Regressions beyond the
+thresholds exit non-zero.
+
+Run:      python golden.py
+Accept:   python golden.py --update-baseline
+Record:   python golden.py --record --update-baseline
+
+Replay serves responses by prompt hash, so a prompt change in
+src/knowledge_base.py shows up as missing cassette entries: re-record, then
+compare against the existing baseline before accepting it.
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import difflib
+import argparse
+import tempfile
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden")
+CORPUS_PATH = os.path.join(GOLDEN_DIR, "corpus.jsonl")
+CASSETTE_PATH = os.path.join(GOLDEN_DIR, "cassette.jsonl")
+BASELINE_PATH = os.path.join(GOLDEN_DIR, "baseline.json")
+
+# Run against a fresh history and similarity index, so results don't depend on local state
+_scratch = tempfile.mkdtemp(prefix="spec_golden_")
+os.environ.setdefault("SPEC_HISTORY_DIR", os.path.join(_scratch, "history"))
+os.environ.setdefault("SPEC_LIBRARY_PATH", os.path.join(_scratch, "library.db"))
+os.environ.setdefault("SPEC_SIMILARITY_INDEX", os.path.join(_scratch, "similarity.jsonl"))
+
+import logging
+logging.basicConfig(level=logging.WARNING)
+
+# Stage latencies below this many milliseconds are treated as noise
+LATENCY_NOISE_FLOOR_MS = 25.0
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100
+    lower = int(k)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (k - lower)
+
+
+def load_corpus(path: str = CORPUS_PATH) -> List[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def initial_state() -> Dict[str, Any]:
+    from src.knowledge_base import PRD_COMPONENT_NAMES
+    return {
+        "raw_input": "",
+        "current_spec": "",
+        "can_proceed": False,
+        "metadata": {},
+        "feedback": "",
+        "ui_queue": [],
+        "messages": [],
+        "components": {name: None for name in PRD_COMPONENT_NAMES},
+        "gaps": PRD_COMPONENT_NAMES.copy(),
+        "last_updated_component": None,
+        "is_spec_complete": False,
+        "awaiting_user_input": True,
+        "detailed_components": {},
+        "detail_status": {},
+        "detail_sources": {},
+        "is_detailed": False,
+        "question_answers": {},
+    }
+
+
+async def run_step(state: Dict, thread_id: str, user_input: str, target_component: Optional[str], runs: List):
+    """One app submission: same state handling as run_component_master in app.py."""
+    from src.graph import app, asubmission, run_values
+    from src.utils import telemetry
+
+    config = {"configurable": {"thread_id": thread_id}}
+    with telemetry.track_run(thread_id, target_component or "Initial input") as run:
+        graph_input = await asubmission(config, user_input, target_component, state)
+        result = run_values(await app.ainvoke(graph_input, config))
+    runs.append(run)
+    return result
+
+
+async def run_idea(idea: Dict[str, Any]) -> Dict[str, Any]:
+    """Submit the idea, fill gaps from its gap_fills like the app's gap form, and collect outputs."""
+    thread_id = f"golden_{idea['id']}"
+    gap_fills = idea.get("gap_fills", {})
+    runs = []
+    error = None
+    filled = set()
+    state = initial_state()
+    try:
+        state = await run_step(state, thread_id, idea["input"], None, runs)
+        while not state.get("is_detailed"):
+            # Each gap is answered at most once; gaps without a fill stay open
+            gap = next((g for g in state.get("gaps") or [] if g in gap_fills and g not in filled), None)
+            if gap is None:
+                break
+            filled.add(gap)
+            current_text = (state.get("components") or {}).get(gap)
+            combined_input = f"{gap}: {gap_fills[gap]}"
+            if current_text:
+                combined_input = f"{gap}: {current_text} {gap_fills[gap]}"
+            state = await run_step(state, thread_id, combined_input, gap, runs)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+
+    stages: Dict[str, Dict[str, float]] = defaultdict(lambda: {"seconds": 0.0, "input_tokens": 0, "output_tokens": 0, "llm_calls": 0})
+    for run in runs:
+        for node, seconds in run.nodes.items():
+            stages[node]["seconds"] += seconds
+        for call in run.llm_calls:
+            stage = stages[call["node"]]
+            stage["input_tokens"] += call["input_tokens"]
+            stage["output_tokens"] += call["output_tokens"]
+            stage["llm_calls"] += 1
+
+    return {
+        "id": idea["id"],
+        "error": error,
+        "seconds": sum(run.duration for run in runs),
+        "stages": dict(stages),
+        "outputs": {
+            "components": dict(state.get("components") or {}),
+            "gaps": list(state.get("gaps") or []),
+            "is_detailed": bool(state.get("is_detailed")),
+            "detailed": {
+                name: detail.get("text")
+                for name, detail in (state.get("detailed_components") or {}).items()
+            },
+        },
+    }
+
+
+async def run_corpus(ideas: List[Dict[str, Any]], concurrency: int) -> List[Dict[str, Any]]:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded(idea):
+        async with semaphore:
+            return await run_idea(idea)
+
+    return await asyncio.gather(*(bounded(idea) for idea in ideas))
+
+
+def text_drift(old: Optional[str], new: Optional[str]) -> float:
+    """0.0 for identical text, 1.0 for nothing in common."""
+    if (old or "") == (new or ""):
+        return 0.0
+    return 1.0 - difflib.SequenceMatcher(None, old or "", new or "", autojunk=False).ratio()
+
+
+def set_drift(old: List[str], new: List[str]) -> float:
+    """Jaccard distance between two lists treated as sets."""
+    old_set, new_set = set(old), set(new)
+    union = old_set | new_set
+    return len(old_set ^ new_set) / len(union) if union else 0.0
+
+
+def mapping_drift(old: Dict[str, Optional[str]], new: Dict[str, Optional[str]]) -> float:
+    names = set(old) | set(new)
+    if not names:
+        return 0.0
+    return sum(text_drift(old.get(n), new.get(n)) for n in names) / len(names)
+
+
+def idea_drift(baseline: Dict[str, Any], outputs: Dict[str, Any]) -> Dict[str, float]:
+    return {
+        "components": mapping_drift(baseline["components"], outputs["components"]),
+        "gaps": set_drift(baseline["gaps"], outputs["gaps"]),
+        "detailed": 1.0 if baseline["is_detailed"] != outputs["is_detailed"] else mapping_drift(baseline["detailed"], outputs["detailed"]),
+    }
+
+
+def summarize_stages(results: List[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    """Per node: latency percentiles per idea, and token totals across the corpus."""
+    seconds: Dict[str, List[float]] = defaultdict(list)
+    totals: Dict[str, Dict[str, int]] = defaultdict(lambda: {"input_tokens": 0, "output_tokens": 0, "llm_calls": 0})
+    for result in results:
+        for node, stage in result["stages"].items():
+            seconds[node].append(stage["seconds"])
+            for key in totals[node]:
+                totals[node][key] += stage[key]
+    seconds["total"] = [r["seconds"] for r in results]
+    totals["total"] = {key: sum(t[key] for t in list(totals.values())) for key in ("input_tokens", "output_tokens", "llm_calls")}
+
+    return {
+        node: {
+            "ideas": len(values),
+            "p50_ms": round(percentile(values, 50) * 1000, 1),
+            "p95_ms": round(percentile(values, 95) * 1000, 1),
+            **totals[node],
+        }
+        for node, values in seconds.items()
+    }
+
+
+def compare(stages: Dict, drift: Dict[str, Dict[str, float]], baseline: Dict, args) -> List[str]:
+    """Threshold violations against the baseline, as human-readable lines."""
+    failures = []
+    for node, stage in stages.items():
+        base = baseline["stages"].get(node)
+        if not base:
+            continue
+        for pct in ("p50_ms", "p95_ms"):
+            delta = stage[pct] - base[pct]
+            if delta > LATENCY_NOISE_FLOOR_MS and base[pct] and delta / base[pct] > args.max_latency_regression:
+                failures.append(f"{node} {pct} {base[pct]} -> {stage[pct]} (+{delta / base[pct]:.0%})")
+        for key in ("input_tokens", "output_tokens"):
+            delta = stage[key] - base[key]
+            if base[key] and delta / base[key] > args.max_token_regression:
+                failures.append(f"{node} {key} {base[key]} -> {stage[key]} (+{delta / base[key]:.0%})")
+
+    thresholds = {"components": args.max_component_drift, "gaps": args.max_gap_drift, "detailed": args.max_detail_drift}
+    for field, threshold in thresholds.items():
+        values = [d[field] for d in drift.values()]
+        mean = sum(values) / len(values) if values else 0.0
+        if mean > threshold:
+            worst = sorted(drift, key=lambda i: drift[i][field], reverse=True)[:3]
+            failures.append(f"{field} drift {mean:.3f} > {threshold} (worst: {', '.join(worst)})")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=CORPUS_PATH)
+    parser.add_argument("--cassette", default=CASSETTE_PATH)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--record", action="store_true", help="re-record the cassette against the configured LLM backend")
+    parser.add_argument("--replay-latency", default="recorded", help='"recorded" or fixed seconds per replayed call')
+    parser.add_argument("--concurrency", type=int, default=1, help="ideas run at once; >1 makes latency noisier")
+    parser.add_argument("--update-baseline", action="store_true", help="accept this run as the new baseline")
+    parser.add_argument("--max-latency-regression", type=float, default=0.2, help="allowed relative p50/p95 stage latency growth")
+    parser.add_argument("--max-token-regression", type=float, default=0.1, help="allowed relative token growth per stage")
+    parser.add_argument("--max-component-drift", type=float, default=0.05, help="allowed mean components drift (0-1)")
+    parser.add_argument("--max-gap-drift", type=float, default=0.05, help="allowed mean gaps drift (0-1)")
+    parser.add_argument("--max-detail-drift", type=float, default=0.1, help="allowed mean detailed text drift (0-1)")
+    parser.add_argument("--json", help="write the report to this path")
+    args = parser.parse_args()
+
+    from src.cassette import CASSETTE_MODE_ENV, CASSETTE_PATH_ENV, REPLAY_LATENCY_ENV, reset_cassettes
+
+    if args.record:
+        if os.path.exists(args.cassette):
+            os.remove(args.cassette)
+        os.environ[CASSETTE_MODE_ENV] = "record"
+    else:
+        os.environ[CASSETTE_MODE_ENV] = "replay"
+    os.environ[CASSETTE_PATH_ENV] = args.cassette
+    os.environ[REPLAY_LATENCY_ENV] = args.replay_latency
+    reset_cassettes()
+
+    ideas = load_corpus(args.corpus)
+    started = time.perf_counter()
+    results = asyncio.run(run_corpus(ideas, args.concurrency))
+    elapsed = time.perf_counter() - started
+
+    stages = summarize_stages(results)
+    baseline = None
+    if os.path.exists(args.baseline) and not args.update_baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    drift = {}
+    if baseline:
+        drift = {
+            r["id"]: idea_drift(baseline["ideas"][r["id"]], r["outputs"])
+            for r in results
+            if r["id"] in baseline["ideas"] and not r["error"]
+        }
+    errors = {r["id"]: r["error"] for r in results if r["error"]}
+    failures = compare(stages, drift, baseline, args) if baseline else []
+    failures += [f"{idea_id}: {error}" for idea_id, error in errors.items()]
+
+    print("\n" + "=" * 60)
+    print(f"GOLDEN CORPUS: {len(ideas)} ideas ({'record' if args.record else 'replay'}), {elapsed:.1f}s")
+    print("=" * 60)
+    print(f"Detailed: {sum(r['outputs']['is_detailed'] for r in results)}/{len(results)}, errors: {len(errors)}")
+    print(f"\n{'stage':<20}{'p50 ms':>10}{'p95 ms':>10}{'calls':>8}{'in tok':>10}{'out tok':>10}")
+    for node, s in stages.items():
+        print(f"{node:<20}{s['p50_ms']:>10}{s['p95_ms']:>10}{s['llm_calls']:>8}{s['input_tokens']:>10}{s['output_tokens']:>10}")
+    if drift:
+        print("\nMean drift vs baseline:")
+        for field in ("components", "gaps", "detailed"):
+            values = [d[field] for d in drift.values()]
+            changed = sum(1 for v in values if v > 0)
+            print(f"  {field:<12}{sum(values) / len(values):.4f}  ({changed} ideas changed)")
+    elif not args.update_baseline:
+        print(f"\nNo baseline at {args.baseline}; run with --update-baseline to create one.")
+
+    if errors and any("CassetteMiss" in e for e in errors.values()):
+        print("\nPrompts changed since the cassette was recorded; re-record with --record.")
+    if failures:
+        print(f"\nREGRESSIONS ({len(failures)}):")
+        for line in failures:
+            print(f"  {line}")
+
+    report = {
+        "ideas": len(ideas),
+        "mode": "record" if args.record else "replay",
+        "wall_seconds": round(elapsed, 3),
+        "stages": stages,
+        "drift": drift,
+        "errors": errors,
+        "failures": failures,
+    }
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.json}")
+
+    if args.update_baseline:
+        if errors:
+            print("\nNot updating the baseline: the run had errors.")
+            return 1
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({
+                "created_at": datetime.now().isoformat(),
+                "stages": stages,
+                "ideas": {r["id"]: r["outputs"] for r in results},
+            }, f, indent=1, sort_keys=True)
+        print(f"\nBaseline written to {args.baseline}")
+        return 0
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,281 @@
+"""
+Multi-session load test for the Streamlit app.
+Drives N concurrent AppTest sessions through initial input -> gap fills ->
+detailing -> refinement against the stub LLM backend, then reports rerun
+latency percentiles, background event-loop lag, process RSS growth and errors.
+
+Run: python loadtest.py --sessions 50 --concurrency 50 --stub-latency 0.2
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import threading
+import traceback
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any
+
+# Configure the app for offline, isolated runs before anything imports it
+_scratch = tempfile.mkdtemp(prefix="spec_load_test_")
+os.environ.setdefault("SPEC_WRITER_LLM_BACKEND", "stub")
+os.environ.setdefault("SPEC_HISTORY_DIR", os.path.join(_scratch, "history"))
+os.environ.setdefault("SPEC_LIBRARY_PATH", os.path.join(_scratch, "library.db"))
+os.environ.setdefault("SPEC_SIMILARITY_INDEX", os.path.join(_scratch, "similarity.jsonl"))
+
+import logging
+logging.getLogger("streamlit").setLevel(logging.ERROR)
+
+from streamlit.testing.v1 import AppTest
+from streamlit.runtime import Runtime
+from streamlit.runtime.scriptrunner import magic
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+INITIAL_INPUT = """Goal: Help remote teams in session {session} run asynchronous stand-ups without extra meetings.
+Problem Statement: Distributed teams lose hours each week to stand-up calls across time zones, and written updates get buried in chat.
+"""
+
+GAP_INPUTS = {
+    "Goal": "Cut synchronous stand-up time by half for pilot teams within one quarter of launch.",
+    "Problem Statement": "Status calls across time zones waste hours and written updates are scattered across chat threads.",
+    "User Cohort": "Engineering managers and individual contributors on distributed teams of five to thirty people.",
+    "Metrics": "Weekly active teams, update completion rate above eighty percent, and meeting hours saved per team.",
+    "Solutions": "Scheduled prompts in Slack, a digest view per team, and blockers highlighted for managers automatically.",
+    "Risks": "Notification fatigue, low completion without manager buy-in, and Slack API rate limits during peaks.",
+    "GTM": "Free beta for fifty teams, then a Slack marketplace listing with a team plan and onboarding webinars.",
+}
+
+
+def current_rss_kb() -> int:
+    """Resident set size of this process in KB (Linux /proc, else peak RSS)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def share_apptest_runtime():
+    """
+    AppTest installs a mock Runtime singleton per run and clears it when the
+    run ends, which breaks overlapping sessions. Keep the most recent mock
+    visible so concurrent runs don't see an empty runtime.
+    """
+    last = {"runtime": None}
+
+    def instance(cls):
+        if cls._instance is not None:
+            last["runtime"] = cls._instance
+        if last["runtime"] is None:
+            raise RuntimeError("Runtime hasn't been created!")
+        return cls._instance or last["runtime"]
+
+    def exists(cls):
+        return cls._instance is not None or last["runtime"] is not None
+
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(exists)
+
+    # Each AppTest compiles the script with its own cache, and concurrent
+    # ast.parse calls can fail on CPython 3.11 ("AST constructor recursion
+    # depth mismatch"). Serialize the parse step.
+    compile_lock = threading.Lock()
+    add_magic = magic.add_magic
+
+    def locked_add_magic(code, script_path):
+        with compile_lock:
+            return add_magic(code, script_path)
+
+    magic.add_magic = locked_add_magic
+
+
+class LoopLagProbe:
+    """
+    Samples the app's background event loop (src/utils/async_runner.py),
+    which every session's graph runs share: how late a timer fires there
+    (scheduling lag, i.e. how long callbacks wait behind other work) and
+    how many tasks are pending on it.
+    """
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.lags: List[float] = []
+        self.depths: List[int] = []
+        self._future = None
+
+    async def _sample(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            scheduled = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, loop.time() - scheduled))
+            # Excluding this probe
+            self.depths.append(len(asyncio.all_tasks()) - 1)
+
+    def install(self):
+        from src.utils.async_runner import get_background_loop
+        self._future = get_background_loop().submit(self._sample())
+
+    def uninstall(self):
+        if self._future:
+            self._future.cancel()
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "samples": len(self.lags),
+            "lag_p50_ms": round(percentile(self.lags, 50) * 1000, 1),
+            "lag_p99_ms": round(percentile(self.lags, 99) * 1000, 1),
+            "lag_max_ms": round(max(self.lags, default=0.0) * 1000, 1),
+            "pending_tasks_p50": round(percentile(self.depths, 50), 1),
+            "pending_tasks_max": max(self.depths, default=0),
+        }
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100
+    lower = int(k)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (k - lower)
+
+
+class SessionResult:
+    def __init__(self, session: int):
+        self.session = session
+        self.timings: List[tuple] = []
+        self.errors: List[str] = []
+        self.completed = False
+
+
+def timed_run(result: SessionResult, kind: str, action) -> AppTest:
+    start = time.perf_counter()
+    at = action()
+    result.timings.append((kind, time.perf_counter() - start))
+    if at.exception:
+        result.errors.extend(f"{kind}: {e.message}" for e in at.exception)
+    return at
+
+
+def run_session(session: int, timeout: float) -> SessionResult:
+    result = SessionResult(session)
+    try:
+        at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+        at = timed_run(result, "initial_render", at.run)
+
+        at.text_area[0].input(INITIAL_INPUT.format(session=session))
+        at = timed_run(result, "initial_submit", at.button[0].click().run)
+
+        for _ in range(len(GAP_INPUTS)):
+            state = at.session_state.workflow_state
+            if state.get("is_detailed") or not state.get("gaps"):
+                break
+            gap = state["gaps"][0]
+            at.text_area(key=f"input_{gap}").input(GAP_INPUTS[gap])
+            kind = "gap_fill_detailing" if len(state["gaps"]) == 1 else "gap_fill"
+            at = timed_run(result, kind, at.button(key=f"btn_{gap}").click().run)
+
+        state = at.session_state.workflow_state
+        if not state.get("is_detailed"):
+            result.errors.append("spec never reached detailing")
+            return result
+
+        for name, detail in state["detailed_components"].items():
+            if detail.get("questions"):
+                at.text_area(key=f"qa_{name}_0").input("Owned by the platform team with a two week SLA.")
+                # The refine button only renders once an answer exists
+                at = timed_run(result, "answer", at.run)
+                at = timed_run(result, "refine", at.button(key=f"refine_{name}").click().run)
+                break
+
+        result.completed = True
+    except Exception:
+        result.errors.append(traceback.format_exc(limit=3))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--stub-latency", type=float, default=0.05, help="seconds per stub LLM call")
+    parser.add_argument("--timeout", type=float, default=120, help="per-rerun timeout in seconds")
+    parser.add_argument("--json", help="write the report to this path")
+    args = parser.parse_args()
+
+    os.environ["SPEC_WRITER_STUB_LATENCY"] = str(args.stub_latency)
+
+    share_apptest_runtime()
+    probe = LoopLagProbe()
+    probe.install()
+    rss_start = current_rss_kb()
+    started = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(lambda i: run_session(i, args.timeout), range(args.sessions)))
+
+    elapsed = time.perf_counter() - started
+    rss_end = current_rss_kb()
+    probe.uninstall()
+
+    by_kind: Dict[str, List[float]] = defaultdict(list)
+    for r in results:
+        for kind, seconds in r.timings:
+            by_kind[kind].append(seconds)
+
+    report = {
+        "sessions": args.sessions,
+        "concurrency": args.concurrency,
+        "stub_latency": args.stub_latency,
+        "wall_seconds": round(elapsed, 3),
+        "completed_sessions": sum(r.completed for r in results),
+        "latency_ms": {
+            kind: {
+                "count": len(values),
+                "p50": round(percentile(values, 50) * 1000, 1),
+                "p90": round(percentile(values, 90) * 1000, 1),
+                "p95": round(percentile(values, 95) * 1000, 1),
+                "p99": round(percentile(values, 99) * 1000, 1),
+                "max": round(max(values) * 1000, 1),
+            }
+            for kind, values in by_kind.items()
+        },
+        "event_loop": probe.report(),
+        "rss_kb": {"start": rss_start, "end": rss_end, "growth": rss_end - rss_start},
+        "errors": {f"session_{r.session}": r.errors for r in results if r.errors},
+    }
+
+    print("\n" + "=" * 60)
+    print(f"LOAD TEST: {args.sessions} sessions, concurrency {args.concurrency}")
+    print("=" * 60)
+    print(f"Wall time: {report['wall_seconds']}s, completed: {report['completed_sessions']}/{args.sessions}")
+    print(f"\n{'interaction':<22}{'n':>5}{'p50':>10}{'p90':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+    for kind, s in report["latency_ms"].items():
+        print(f"{kind:<22}{s['count']:>5}{s['p50']:>10}{s['p90']:>10}{s['p95']:>10}{s['p99']:>10}{s['max']:>10}")
+    print(f"\nEvent loop: {report['event_loop']}")
+    print(f"RSS: {rss_start} KB -> {rss_end} KB (+{report['rss_kb']['growth']} KB)")
+    error_count = sum(len(e) for e in report["errors"].values())
+    print(f"Errors: {error_count}")
+    for session, errors in list(report["errors"].items())[:5]:
+        print(f"  {session}: {errors[0].strip().splitlines()[-1]}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.json}")
+
+    return 1 if error_count else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,579 @@
+"""
+Standalone async HTTP API for the spec graph.
+
+Other tools create spec threads, submit input, fill gaps, trigger detailing
+and refinement, and fetch exports over HTTP, using the same compiled graph
+and checkpointer as the Streamlit app. Runs execute as tasks on the server's
+event loop, at most SPEC_API_MAX_RUNS at once; a thread runs one at a time.
+Progress (nodes finishing, model output, token usage) streams over
+Server-Sent Events from GET /threads/{id}/events, and reconnecting clients
+resume from Last-Event-ID.
+
+Run: uvicorn src.api:api --port 8000
+"""
+
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+import functools
+import tempfile
+from collections import deque
+from typing import Any, Dict, Optional, Set
+
+from langchain_core.runnables import RunnableLambda
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from src.graph import app as graph, asubmission, run_values
+from src.state import initial_state
+from src.knowledge_base import PRD_COMPONENT_NAMES
+from src.nodes.component_master import detect_gaps
+from src.nodes.detailer import get_detail_statuses
+from src.nodes.refiner import arefiner_node
+from src.utils import telemetry, memory_budget, metrics
+from src.utils.scheduler import PRIORITIES, priority_scope
+from src.utils.exporter import EXPORT_FORMATS, export_formats
+from src.utils.bulk_export import bulk_export
+from src.utils.versioning import get_version_store
+from src.utils.spec_library import get_spec_library
+from src.utils.cancellation import (
+    CancelToken,
+    DeadlineExceeded,
+    RunCancelled,
+    bounded_run,
+    cancellation_scope,
+)
+
+logger = logging.getLogger(__name__)
+
+API_MAX_RUNS = int(os.environ.get("SPEC_API_MAX_RUNS", "64"))
+# Events kept per thread so a reconnecting client can catch up
+API_EVENT_BUFFER = int(os.environ.get("SPEC_API_EVENT_BUFFER", "512"))
+SSE_KEEPALIVE = float(os.environ.get("SPEC_API_SSE_KEEPALIVE", "15"))
+# A subscriber this far behind is disconnected and resumes with Last-Event-ID
+SSE_QUEUE_SIZE = 1024
+# Bulk export archives are streamed back in chunks of this size
+EXPORT_CHUNK_BYTES = 64 * 1024
+# Records of threads idle this long (or evicted by the memory budget) are dropped;
+# the thread itself stays in the checkpointer and is picked up again on its next request
+API_THREAD_IDLE_SECONDS = float(os.environ.get("SPEC_API_THREAD_IDLE_SECONDS", str(memory_budget.SESSION_IDLE_SECONDS)))
+
+GRAPH_NODES = {"sanity_checker", "component_master", "input_gatherer", "detailer", "refiner"}
+FINISHED = "finished"
+
+
+class ThreadRecord:
+    """A spec thread known to the API: its in-flight run and recent events."""
+
+    def __init__(self, thread_id: str):
+        self.thread_id = thread_id
+        self.created = time.time()
+        self.last_seen = self.created
+        self.run: Optional[Dict[str, Any]] = None
+        self.events: deque = deque(maxlen=API_EVENT_BUFFER)
+        self.next_event_id = 1
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.memory = memory_budget.SessionMemory()
+
+    def publish(self, event: str, data: Dict[str, Any]) -> None:
+        item = (self.next_event_id, event, json.dumps(data, default=str))
+        self.next_event_id += 1
+        self.events.append(item)
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(item)
+            except asyncio.QueueFull:
+                # Too far behind: end its stream; the client resumes from its Last-Event-ID
+                self.subscribers.discard(queue)
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(None)
+
+
+_threads: Dict[str, ThreadRecord] = {}
+_run_slots = asyncio.Semaphore(API_MAX_RUNS)
+_last_prune = 0.0
+
+
+class ApiError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def _config(thread_id: str) -> Dict[str, Any]:
+    return {"configurable": {"thread_id": thread_id}}
+
+
+def _prune_threads(now: Optional[float] = None) -> None:
+    """
+    Drop records that are idle or whose thread the memory budget evicted,
+    releasing their event buffers. Records with a run or a live event stream
+    are kept. At most once per SPEC_MEMORY_CHECK_SECONDS.
+    """
+    global _last_prune
+    now = now or time.time()
+    if now - _last_prune < memory_budget.MEMORY_CHECK_SECONDS:
+        return
+    _last_prune = now
+    for thread_id, record in list(_threads.items()):
+        if record.run is not None or record.subscribers:
+            continue
+        idle = now - max(record.last_seen, record.memory.last_active)
+        if record.memory.evicted or idle >= API_THREAD_IDLE_SECONDS:
+            del _threads[thread_id]
+            logger.info(f"api: Dropped record of {thread_id} ({'evicted' if record.memory.evicted else f'idle {idle:.0f}s'})")
+
+
+def _record(thread_id: str) -> ThreadRecord:
+    _prune_threads()
+    record = _threads.get(thread_id)
+    if record is None:
+        # Threads started by the Streamlit app share the checkpointer
+        memory_budget.ensure_resident(thread_id)
+        if not graph.checkpointer.get_tuple(_config(thread_id)):
+            raise ApiError(404, f"Unknown thread {thread_id}")
+        record = _threads[thread_id] = ThreadRecord(thread_id)
+    elif record.memory.evicted:
+        # Kept for a live event stream; its checkpoints are reloaded
+        memory_budget.resume_session(record.memory)
+    record.last_seen = time.time()
+    return record
+
+
+async def _state(thread_id: str) -> Dict[str, Any]:
+    memory_budget.ensure_resident(thread_id)
+    snapshot = await graph.aget_state(_config(thread_id))
+    return {**initial_state(), **(snapshot.values or {})}
+
+
+def _summary(record: ThreadRecord, state: Dict[str, Any]) -> Dict[str, Any]:
+    run = record.run
+    return {
+        "thread_id": record.thread_id,
+        "components": state.get("components", {}),
+        "gaps": state.get("gaps", []),
+        "compactions": state.get("compactions") or {},
+        "can_proceed": state.get("can_proceed"),
+        "feedback": state.get("feedback"),
+        "is_spec_complete": state.get("is_spec_complete", False),
+        "is_detailed": state.get("is_detailed", False),
+        "detailed_components": state.get("detailed_components", {}),
+        "detail_status": get_detail_statuses(state) if state.get("is_detailed") else {},
+        "run": {"run_id": run["run_id"], "kind": run["kind"]} if run else None,
+        "last_event_id": record.next_event_id - 1,
+    }
+
+
+def _touch(record: ThreadRecord, events: list) -> None:
+    """Count the thread as active for the memory budget, with its buffered events (a snapshot taken on the loop)."""
+    memory_budget.account_session(record.memory, record.thread_id, {"events": events})
+
+
+def _message_text(message: Any) -> str:
+    content = getattr(message, "content", "")
+    if isinstance(content, list):
+        return "".join(block.get("text", "") if isinstance(block, dict) else str(block) for block in content)
+    return content if isinstance(content, str) else json.dumps(content)
+
+
+async def _forward_events(record: ThreadRecord, run: Dict[str, Any], runnable, payload, config, node: str = None) -> Any:
+    """Drive a runnable with astream_events, publishing progress; returns its output."""
+    output = None
+    streamed = set()
+    async for event in runnable.astream_events(payload, config, version="v2"):
+        kind = event["event"]
+        source = event.get("metadata", {}).get("langgraph_node", node)
+        if kind == "on_chat_model_stream":
+            streamed.add(event["run_id"])
+            text = _message_text(event["data"]["chunk"])
+            if text:
+                record.publish("token", {"run_id": run["run_id"], "node": source, "text": text})
+        elif kind == "on_chat_model_end":
+            message = event["data"]["output"]
+            if event["run_id"] not in streamed:
+                # Not streamed by the model: send the whole response as one token event
+                record.publish("token", {"run_id": run["run_id"], "node": source, "text": _message_text(message)})
+            usage = getattr(message, "usage_metadata", None) or {}
+            record.publish("llm", {
+                "run_id": run["run_id"],
+                "node": source,
+                "input_tokens": usage.get("input_tokens", 0),
+                "output_tokens": usage.get("output_tokens", 0),
+            })
+        elif kind == "on_chain_end" and event["name"] in GRAPH_NODES and event["name"] == source:
+            record.publish("node", {
+                "run_id": run["run_id"],
+                "node": source,
+                "elapsed": round(time.monotonic() - run["started"], 3),
+            })
+        if kind == "on_chain_end" and not event["parent_ids"]:
+            output = event["data"]["output"]
+    return output
+
+
+async def _graph_run(record: ThreadRecord, run: Dict[str, Any], user_input: str, target_component: str = None) -> Dict[str, Any]:
+    config = _config(record.thread_id)
+    memory_budget.ensure_resident(record.thread_id)
+    # Resumes a thread paused for gap input with just the input
+    graph_input = await asubmission(config, user_input, target_component)
+    return run_values(await _forward_events(record, run, graph, graph_input, config))
+
+
+async def _refine_run(record: ThreadRecord, run: Dict[str, Any], answers: Dict[str, Dict[int, str]]) -> Dict[str, Any]:
+    state = await _state(record.thread_id)
+    state["question_answers"] = answers
+    # The refiner isn't on the graph's path, so it runs directly and its update is checkpointed
+    update = await _forward_events(record, run, RunnableLambda(arefiner_node, name="refiner"), state, None, node="refiner")
+    await graph.aupdate_state(_config(record.thread_id), update, as_node="refiner")
+    return {**state, **update}
+
+
+def _commit(thread_id: str, state: Dict[str, Any], label: str) -> None:
+    """Version history and library, as the Streamlit app records them after a run."""
+    get_version_store(thread_id).record(
+        state.get("components", {}),
+        state.get("detailed_components", {}),
+        label=label,
+    )
+    if state.get("is_spec_complete") or state.get("is_detailed"):
+        get_spec_library().save_spec(
+            thread_id,
+            state.get("components", {}),
+            state.get("detailed_components", {}),
+            state.get("metadata", {}),
+        )
+
+
+async def _execute(record: ThreadRecord, run: Dict[str, Any], label: str, make_coro) -> None:
+    status, error, stats = "ok", None, None
+    token = run["token"]
+    try:
+        await asyncio.to_thread(_touch, record, list(record.events))
+        record.publish("queued", {"run_id": run["run_id"], "kind": run["kind"], "priority": run["priority"]})
+        async with _run_slots:
+            run["started"] = time.monotonic()
+            record.publish("started", {"run_id": run["run_id"], "kind": run["kind"]})
+            with cancellation_scope(token), priority_scope(run["priority"]), telemetry.track_run(record.thread_id, label) as stats:
+                state = await bounded_run(make_coro(), token)
+            await asyncio.to_thread(_commit, record.thread_id, state, label)
+    except (RunCancelled, asyncio.CancelledError):
+        status = "cancelled"
+    except DeadlineExceeded as e:
+        status, error = "timeout", str(e)
+    except Exception as e:
+        logger.exception(f"api: {label} failed on {record.thread_id}")
+        status, error = "failed", str(e)
+    finally:
+        record.run = None
+
+    summary = _summary(record, await _state(record.thread_id))
+    record.publish("state", summary)
+    record.publish(FINISHED, {
+        "run_id": run["run_id"],
+        "kind": run["kind"],
+        "status": status,
+        "error": error,
+        "seconds": round(stats.duration, 3) if stats else 0.0,
+        "llm_calls": len(stats.llm_calls) if stats else 0,
+        "input_tokens": stats.input_tokens if stats else 0,
+        "output_tokens": stats.output_tokens if stats else 0,
+    })
+    logger.info(f"api: {label} on {record.thread_id} {status}")
+    await asyncio.to_thread(_touch, record, list(record.events))
+
+
+def _priority(request: Request) -> str:
+    """The run's LLM scheduling class from ?priority=, interactive unless given."""
+    priority = request.query_params.get("priority", "interactive")
+    if priority not in PRIORITIES:
+        raise ApiError(400, f"'priority' must be one of {', '.join(PRIORITIES)}")
+    return priority
+
+
+def _start_run(record: ThreadRecord, kind: str, label: str, make_coro, priority: str = "interactive") -> Dict[str, Any]:
+    if record.run is not None:
+        raise ApiError(409, f"Thread {record.thread_id} already has a run in progress ({record.run['kind']})")
+    run = {
+        "run_id": uuid.uuid4().hex[:12],
+        "kind": kind,
+        "priority": priority,
+        "token": CancelToken(),
+        "started": time.monotonic(),
+        "task": None,
+    }
+    record.run = run
+    run["task"] = asyncio.create_task(_execute(record, run, label, lambda: make_coro(run)))
+    return run
+
+
+async def _respond_to_run(request: Request, record: ThreadRecord, run: Dict[str, Any]) -> JSONResponse:
+    """202 with the run id, or with ?wait=true the thread summary once the run finishes."""
+    if request.query_params.get("wait", "").lower() in ("1", "true", "yes"):
+        await asyncio.shield(run["task"])
+        return JSONResponse(_summary(record, await _state(record.thread_id)))
+    return JSONResponse({"run_id": run["run_id"], "kind": run["kind"], "priority": run["priority"], "thread_id": record.thread_id}, status_code=202)
+
+
+async def _body(request: Request) -> Dict[str, Any]:
+    try:
+        body = await request.json()
+    except ValueError:
+        raise ApiError(400, "Request body must be JSON")
+    if not isinstance(body, dict):
+        raise ApiError(400, "Request body must be a JSON object")
+    return body
+
+
+def _text_field(body: Dict[str, Any], field: str) -> str:
+    value = body.get(field)
+    if not isinstance(value, str) or not value.strip():
+        raise ApiError(400, f"'{field}' must be a non-empty string")
+    return value
+
+
+def handles_errors(endpoint):
+    @functools.wraps(endpoint)
+    async def wrapper(request: Request):
+        try:
+            return await endpoint(request)
+        except ApiError as e:
+            return JSONResponse({"error": str(e)}, status_code=e.status)
+    return wrapper
+
+
+@handles_errors
+async def create_thread(request: Request) -> JSONResponse:
+    _prune_threads()
+    thread_id = f"api_{uuid.uuid4().hex}"
+    _threads[thread_id] = ThreadRecord(thread_id)
+    return JSONResponse({"thread_id": thread_id}, status_code=201)
+
+
+@handles_errors
+async def get_thread(request: Request) -> JSONResponse:
+    record = _record(request.path_params["thread_id"])
+    return JSONResponse(_summary(record, await _state(record.thread_id)))
+
+
+@handles_errors
+async def submit_input(request: Request) -> JSONResponse:
+    record = _record(request.path_params["thread_id"])
+    user_input = _text_field(await _body(request), "input")
+    run = _start_run(record, "input", "Initial input", lambda run: _graph_run(record, run, user_input), _priority(request))
+    return await _respond_to_run(request, record, run)
+
+
+@handles_errors
+async def fill_gap(request: Request) -> JSONResponse:
+    record = _record(request.path_params["thread_id"])
+    body = await _body(request)
+    component = _text_field(body, "component")
+    text = _text_field(body, "text")
+    if component not in PRD_COMPONENT_NAMES:
+        raise ApiError(400, f"Unknown component '{component}'")
+    current_text = (await _state(record.thread_id))["components"].get(component) or ""
+    combined_input = f"{component}: {current_text} {text}" if current_text else f"{component}: {text}"
+    run = _start_run(
+        record, "gap", f"Input: {component}",
+        lambda run: _graph_run(record, run, combined_input, component),
+        _priority(request),
+    )
+    return await _respond_to_run(request, record, run)
+
+
+@handles_errors
+async def detail(request: Request) -> JSONResponse:
+    """Detail a complete spec; components already detailed from their current text are kept."""
+    record = _record(request.path_params["thread_id"])
+    state = await _state(record.thread_id)
+    if not any(state["components"].values()) or detect_gaps(state["components"]):
+        raise ApiError(409, "The spec still has gaps; fill them before detailing")
+    run = _start_run(record, "detail", "Detailing", lambda run: _graph_run(record, run, ""), _priority(request))
+    return await _respond_to_run(request, record, run)
+
+
+@handles_errors
+async def refine(request: Request) -> JSONResponse:
+    record = _record(request.path_params["thread_id"])
+    answers = (await _body(request)).get("answers")
+    if not isinstance(answers, dict) or not answers:
+        raise ApiError(400, "'answers' must map component names to {question_index: answer}")
+    try:
+        question_answers = {
+            component: {int(index): str(answer) for index, answer in by_index.items()}
+            for component, by_index in answers.items()
+        }
+    except (AttributeError, TypeError, ValueError):
+        raise ApiError(400, "'answers' must map component names to {question_index: answer}")
+    if not (await _state(record.thread_id)).get("is_detailed"):
+        raise ApiError(409, "The spec must be detailed before it can be refined")
+    run = _start_run(
+        record, "refine", f"Refined: {', '.join(question_answers)}",
+        lambda run: _refine_run(record, run, question_answers),
+        _priority(request),
+    )
+    return await _respond_to_run(request, record, run)
+
+
+@handles_errors
+async def cancel_run(request: Request) -> JSONResponse:
+    record = _record(request.path_params["thread_id"])
+    run = record.run
+    if run is None:
+        raise ApiError(409, "No run in progress")
+    run["token"].cancel()
+    run["task"].cancel()
+    return JSONResponse({"run_id": run["run_id"], "cancelled": True}, status_code=202)
+
+
+@handles_errors
+async def export(request: Request) -> Response:
+    record = _record(request.path_params["thread_id"])
+    fmt = request.path_params["fmt"]
+    if fmt not in EXPORT_FORMATS:
+        raise ApiError(404, f"Unknown export format '{fmt}'; expected one of {', '.join(EXPORT_FORMATS)}")
+    state = await _state(record.thread_id)
+    detailed = state.get("detailed_components") if state.get("is_detailed") else None
+    # Rendering (PDF, DOCX) is CPU work; keep it off the event loop
+    content = (await asyncio.to_thread(export_formats, state["components"], detailed, [fmt]))[fmt]
+    if isinstance(content, Exception):
+        raise ApiError(500, f"{fmt} export failed: {content}")
+    _, mime, extension = EXPORT_FORMATS[fmt]
+    return Response(content, media_type=mime, headers={"Content-Disposition": f'attachment; filename="spec.{extension}"'})
+
+
+@handles_errors
+async def bulk(request: Request) -> Response:
+    """Zip of several specs (library ids or thread ids), rendered on the export process pool."""
+    body = await _body(request)
+    spec_ids = body.get("spec_ids")
+    formats = body.get("formats", ["markdown", "pdf"])
+    if not isinstance(spec_ids, list) or not spec_ids or not all(isinstance(i, str) for i in spec_ids):
+        raise ApiError(400, "'spec_ids' must be a non-empty list of ids")
+    if not isinstance(formats, list) or not formats or any(fmt not in EXPORT_FORMATS for fmt in formats):
+        raise ApiError(400, f"'formats' must list formats from {', '.join(EXPORT_FORMATS)}")
+
+    archive = tempfile.SpooledTemporaryFile(max_size=16 * 1024 * 1024)
+    try:
+        result = await asyncio.to_thread(bulk_export, spec_ids, formats, archive)
+        size = archive.seek(0, os.SEEK_END)
+        archive.seek(0)
+    except BaseException:
+        archive.close()
+        raise
+
+    async def chunks():
+        # Stream the archive back from the spool instead of loading it whole
+        try:
+            while chunk := await asyncio.to_thread(archive.read, EXPORT_CHUNK_BYTES):
+                yield chunk
+        finally:
+            archive.close()
+
+    return StreamingResponse(chunks(), media_type="application/zip", headers={
+        "Content-Disposition": 'attachment; filename="specs.zip"',
+        "Content-Length": str(size),
+        "X-Specs-Exported": str(len(result["exported"])),
+        "X-Specs-Failed": str(len(result["failed"])),
+    })
+
+
+def _sse(item) -> str:
+    event_id, event, data = item
+    return f"id: {event_id}\nevent: {event}\ndata: {data}\n\n"
+
+
+@handles_errors
+async def events(request: Request) -> StreamingResponse:
+    """
+    Server-Sent Events for a thread. Events after Last-Event-ID (or ?after=)
+    are replayed first. With ?until=finished the stream closes after the
+    next run finishes, or right away if none is in progress and the replay
+    already ends with one.
+    """
+    record = _record(request.path_params["thread_id"])
+    try:
+        last_id = int(request.headers.get("last-event-id") or request.query_params.get("after", "0"))
+    except ValueError:
+        raise ApiError(400, "Last-Event-ID must be an integer")
+    until_finished = request.query_params.get("until") == FINISHED
+
+    queue: asyncio.Queue = asyncio.Queue(maxsize=SSE_QUEUE_SIZE)
+    record.subscribers.add(queue)
+    backlog = [item for item in record.events if item[0] > last_id]
+
+    async def stream():
+        sent = last_id
+        try:
+            for item in backlog:
+                sent = item[0]
+                yield _sse(item)
+            if until_finished and record.run is None and backlog and backlog[-1][1] == FINISHED:
+                return
+            while True:
+                try:
+                    item = await asyncio.wait_for(queue.get(), SSE_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if item is None:
+                    return
+                if item[0] <= sent:
+                    continue
+                sent = item[0]
+                yield _sse(item)
+                if until_finished and item[1] == FINISHED:
+                    return
+        finally:
+            record.subscribers.discard(queue)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def health(request: Request) -> JSONResponse:
+    return JSONResponse({
+        "status": "ok",
+        "threads": len(_threads),
+        "active_runs": sum(1 for record in _threads.values() if record.run is not None),
+    })
+
+
+def collect_metrics():
+    """Scrape-time gauges for the API's threads and runs."""
+    records = list(_threads.values())
+    return [
+        ("spec_api_threads", "gauge", "Threads known to the API.", [("", {}, len(records))]),
+        ("spec_api_active_runs", "gauge", "API runs queued or executing.",
+         [("", {}, sum(1 for record in records if record.run is not None))]),
+    ]
+
+
+metrics.register_collector(collect_metrics)
+
+
+api = Starlette(routes=[
+    Route("/health", health),
+    Route("/threads", create_thread, methods=["POST"]),
+    Route("/threads/{thread_id}", get_thread),
+    Route("/threads/{thread_id}/input", submit_input, methods=["POST"]),
+    Route("/threads/{thread_id}/gaps", fill_gap, methods=["POST"]),
+    Route("/threads/{thread_id}/detail", detail, methods=["POST"]),
+    Route("/threads/{thread_id}/refine", refine, methods=["POST"]),
+    Route("/threads/{thread_id}/run", cancel_run, methods=["DELETE"]),
+    Route("/threads/{thread_id}/events", events),
+    Route("/threads/{thread_id}/export/{fmt}", export),
+    Route("/exports", bulk, methods=["POST"]),
+])
+
+# SPEC_METRICS_PORT / SPEC_METRICS_TEXTFILE
+metrics.start_exporters()
@@ -0,0 +1,215 @@
+"""
+Record/replay of LLM traffic for offline regression runs and profiling.
+
+SPEC_WRITER_CASSETTE_MODE selects the mode:
+- "off" (default): no recording
+- "record": every node's chat call is appended to the cassette file
+- "replay": calls are served from the cassette; a missing entry is an error
+
+SPEC_WRITER_CASSETTE is the cassette path. Entries are keyed by node plus a
+hash of the normalized prompt messages, so routing or model changes don't
+invalidate a recording. SPEC_WRITER_REPLAY_LATENCY is "recorded" (default,
+sleep the originally measured latency) or a fixed number of seconds.
+"""
+
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+logger = logging.getLogger(__name__)
+
+CASSETTE_MODE_ENV = "SPEC_WRITER_CASSETTE_MODE"
+CASSETTE_PATH_ENV = "SPEC_WRITER_CASSETTE"
+REPLAY_LATENCY_ENV = "SPEC_WRITER_REPLAY_LATENCY"
+DEFAULT_CASSETTE_PATH = "cassettes/session.jsonl"
+
+# Bump when the entry format or prompt normalization changes
+CASSETTE_VERSION = 1
+
+
+class CassetteError(RuntimeError):
+    pass
+
+
+class CassetteMiss(CassetteError):
+    """Replay found no recorded response for a prompt."""
+
+
+def get_cassette_mode() -> str:
+    return os.environ.get(CASSETTE_MODE_ENV, "off").strip().lower()
+
+
+def normalize_message(message: BaseMessage) -> str:
+    content = message.content if isinstance(message.content, str) else json.dumps(message.content, sort_keys=True)
+    return f"{message.type}: {' '.join(content.split())}"
+
+
+def prompt_key(node: Optional[str], messages: List[BaseMessage]) -> str:
+    """Stable key for a node's call: whitespace-normalized messages, hashed."""
+    normalized = "\n".join(normalize_message(m) for m in messages)
+    digest = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+    return f"{node or '-'}:{digest}"
+
+
+class Cassette:
+    """Append-only JSONL cassette: a version header followed by one entry per call."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: Dict[str, List[Dict[str, Any]]] = {}
+        self._served: Dict[str, int] = {}
+        self._load()
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for number, line in enumerate(f):
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if number == 0:
+                    if record.get("type") != "header" or record.get("version") != CASSETTE_VERSION:
+                        raise CassetteError(
+                            f"{self.path} is cassette version {record.get('version')}, expected {CASSETTE_VERSION}; re-record it"
+                        )
+                    continue
+                self._entries.setdefault(record["key"], []).append(record)
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self._entries.values())
+
+    def record(self, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            is_new = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+            with open(self.path, "a", encoding="utf-8") as f:
+                if is_new:
+                    header = {"type": "header", "version": CASSETTE_VERSION, "created_at": datetime.now().isoformat()}
+                    f.write(json.dumps(header) + "\n")
+                f.write(json.dumps(entry) + "\n")
+            self._entries.setdefault(entry["key"], []).append(entry)
+
+    def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        """Repeated prompts are served in recorded order, then the last one again."""
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                return None
+            index = self._served.get(key, 0)
+            self._served[key] = index + 1
+            return entries[min(index, len(entries) - 1)]
+
+
+_cassettes: Dict[str, Cassette] = {}
+_cassettes_lock = threading.Lock()
+
+
+def get_cassette(path: Optional[str] = None) -> Cassette:
+    path = path or os.environ.get(CASSETTE_PATH_ENV, DEFAULT_CASSETTE_PATH)
+    with _cassettes_lock:
+        if path not in _cassettes:
+            _cassettes[path] = Cassette(path)
+        return _cassettes[path]
+
+
+def reset_cassettes() -> None:
+    """Drop loaded cassettes, e.g. after switching SPEC_WRITER_CASSETTE."""
+    with _cassettes_lock:
+        _cassettes.clear()
+
+
+class CassetteRecorder(BaseCallbackHandler):
+    """Callback appending each successful chat call of a node to the cassette."""
+
+    run_inline = True
+
+    def __init__(self, node: Optional[str], model: Optional[str], cassette: Cassette):
+        self.node = node
+        self.model = model
+        self.cassette = cassette
+        self._pending: Dict[UUID, tuple] = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs):
+        self._pending[run_id] = (time.perf_counter(), messages[0] if messages else [])
+
+    def on_llm_error(self, error, *, run_id: UUID, **kwargs):
+        self._pending.pop(run_id, None)
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs):
+        pending = self._pending.pop(run_id, None)
+        if pending is None or not response.generations or not response.generations[0]:
+            return
+        start, messages = pending
+        message = getattr(response.generations[0][0], "message", None)
+        if message is None:
+            return
+        self.cassette.record({
+            "key": prompt_key(self.node, messages),
+            "node": self.node,
+            "model": self.model,
+            "prompt": [normalize_message(m) for m in messages],
+            "content": message.content,
+            "usage_metadata": dict(getattr(message, "usage_metadata", None) or {}),
+            "latency": time.perf_counter() - start,
+        })
+
+
+class ReplayChatModel(BaseChatModel):
+    """Chat model serving recorded responses for one node."""
+
+    node: Optional[str] = None
+    cassette_path: Optional[str] = None
+    latency: Optional[float] = None  # None sleeps the recorded latency
+
+    def __init__(self, **kwargs: Any):
+        setting = os.environ.get(REPLAY_LATENCY_ENV, "recorded").strip().lower()
+        if setting != "recorded":
+            kwargs.setdefault("latency", float(setting or 0))
+        super().__init__(**kwargs)
+
+    @property
+    def _llm_type(self) -> str:
+        return "spec-writer-replay"
+
+    def _entry(self, messages: List[BaseMessage]) -> Dict[str, Any]:
+        key = prompt_key(self.node, messages)
+        entry = get_cassette(self.cassette_path).lookup(key)
+        if entry is None:
+            raise CassetteMiss(f"No recorded response for {self.node} prompt {key}")
+        return entry
+
+    def _delay(self, entry: Dict[str, Any]) -> float:
+        return entry.get("latency", 0.0) if self.latency is None else self.latency
+
+    @staticmethod
+    def _result(entry: Dict[str, Any]) -> ChatResult:
+        message = AIMessage(content=entry["content"], usage_metadata=entry.get("usage_metadata") or None)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        entry = self._entry(messages)
+        if self._delay(entry):
+            time.sleep(self._delay(entry))
+        return self._result(entry)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        entry = self._entry(messages)
+        if self._delay(entry):
+            await asyncio.sleep(self._delay(entry))
+        return self._result(entry)
@@ -1,233 +1,153 @@
 """
 Edge-based sanity checker using WebLLM (Gemma-2b).
 Runs locally in the browser. Saves Gemini tokens by pre-filtering flimsy specs.
+
+The browser side is a bidirectional Streamlit component
+(src/edge_sanity_component/index.html). The brief goes to it as a component
+argument, never as markup or script text, and its verdict comes back as the
+component value, tagged with a hash of the brief it judged. A verdict at
+least SPEC_EDGE_DECISIVE_CONFIDENCE confident is applied to the graph state
+so entry_router skips sanity_checker_node; anything else (an unsure model,
+no WebGPU, a load failure) leaves the decision to Gemini.
+
+SPEC_EDGE_SANITY_STUB replaces the component with a fixed JSON verdict, for
+tests and for browsers without WebGPU.
 """
 
-import streamlit as st
-import logging
+import os
 import json
-from typing import Dict, Optional
+import hashlib
+import logging
+from typing import Any, Dict, Optional, Tuple, TypedDict
+
+from src.utils import metrics, telemetry
 
 logger = logging.getLogger(__name__)
 
-# Global LLM engine - initialized once and reused
-WEBLLM_ENGINE_SCRIPT = """
-<script type="module">
-import * as webllm from "https://cdn.jsdelivr.net/npm/@mlc-ai/web-llm@0.2.80/+esm";
-window.webllmModule = webllm;
-window.edgeLLMEngine = null;
-window.edgeLLMReady = false;
-
-// Initialize engine on page load (happens once)
-async function initEdgeLLM() {
-    if (window.edgeLLMEngine && window.edgeLLMReady) {
-        console.log("LLM engine already initialized");
-        return;
-    }
-    
-    if (!window.edgeLLMEngine) {
-        console.log("Creating LLM engine for first time...");
-        window.edgeLLMEngine = new window.webllmModule.MLCEngine();
-        
-        const SELECTED_MODEL = "gemma-2b-it-q4f16_1-MLC";
-        
-        // Initialize silently in background
-        try {
-            await window.edgeLLMEngine.reload(SELECTED_MODEL, {
-                initProgressCallback: (report) => {
-                    console.log("Engine loading...", Math.round((report.progress || 0) * 100) + "%");
-                }
-            });
-            window.edgeLLMReady = true;
-            console.log("LLM engine ready");
-        } catch (e) {
-            console.error("Failed to initialize LLM engine:", e);
-        }
-    }
-}
+EDGE_SANITY_DEFAULT = os.environ.get("SPEC_EDGE_SANITY", "0") == "1"
+EDGE_DECISIVE_CONFIDENCE = float(os.environ.get("SPEC_EDGE_DECISIVE_CONFIDENCE", "0.8"))
+EDGE_SANITY_STUB = os.environ.get("SPEC_EDGE_SANITY_STUB", "")
+# Typical size of Gemini's sanity verdict, for the savings estimate
+SANITY_RESPONSE_TOKENS = int(os.environ.get("SPEC_SANITY_RESPONSE_TOKENS", "80"))
 
-// Initialize on page load
-window.addEventListener('load', initEdgeLLM);
-initEdgeLLM();
-</script>
-"""
+_COMPONENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "edge_sanity_component")
+_component = None
 
 
-def run_edge_sanity_check_ui(user_input: str) -> Optional[Dict]:
-    """
-    Run sanity check on edge using cached WebLLM engine.
-    Engine is initialized once on page load, not every time.
-    
-    Returns:
-        Dict with can_proceed, feedback, and metadata
+class EdgeVerdict(TypedDict):
+    input_hash: str
+    can_proceed: Optional[bool]  # None when the model's answer had no usable verdict
+    confidence: float
+    feedback: str
+    metadata: Dict[str, Any]
+    error: Optional[str]
+
+
+def input_hash(text: str) -> str:
+    """Identifies the brief a verdict was given for."""
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()[:16]
+
+
+def _declare():
+    global _component
+    if _component is None:
+        import streamlit.components.v1 as components
+        _component = components.declare_component("edge_sanity_check", path=_COMPONENT_DIR)
+    return _component
+
+
+def edge_sanity_check(user_input: Optional[str], key: str = "edge_sanity_check") -> Optional[EdgeVerdict]:
     """
-    
-    # Inject the global LLM initialization script once
-    if "edge_llm_script_injected" not in st.session_state:
-        st.markdown(WEBLLM_ENGINE_SCRIPT, unsafe_allow_html=True)
-        st.session_state.edge_llm_script_injected = True
-    
-    # HTML/JS that uses the cached engine (no re-initialization)
-    sanity_check_js = f"""
-    <div id="sanity-check-container">
-        <div id="progress" style="margin: 20px 0;">
-            <p id="progress-text" style="font-size: 14px; color: #666;">Initializing local model...</p>
-            <div style="width: 100%; height: 6px; background: #e0e0e0; border-radius: 3px; overflow: hidden;">
-                <div id="progress-fill" style="width: 0%; height: 100%; background: linear-gradient(90deg, #6366f1, #a855f7);"></div>
-            </div>
-        </div>
-        <div id="result" style="display: none; margin-top: 15px; padding: 15px; border-radius: 8px;"></div>
-    </div>
-    
-    <script type="module">
-        (async () => {{
-            try {{
-                const progressText = document.getElementById('progress-text');
-                const progressFill = document.getElementById('progress-fill');
-                const resultDiv = document.getElementById('result');
-                
-                const SYSTEM_PROMPT = `You are a technical spec sanity checker.
-Analyze the input and determine if it has enough detail (approx 5 lines minimum).
-Return ONLY valid JSON with: can_proceed (bool), feedback (string), metadata (object)`;
-                
-                // Wait for global engine to be ready (initialized on page load)
-                let retries = 0;
-                while (!window.edgeLLMReady && retries < 30) {{
-                    progressText.textContent = 'Waiting for engine...';
-                    await new Promise(r => setTimeout(r, 500));
-                    retries++;
-                }}
-                
-                if (!window.edgeLLMReady) {{
-                    throw new Error('LLM engine failed to initialize');
-                }}
-                
-                progressText.textContent = 'Analyzing...';
-                progressFill.style.width = '100%';
-                
-                // Use the cached global engine (no re-initialization)
-                const engine = window.edgeLLMEngine;
-                
-                // Run analysis using the pre-loaded engine
-                const completion = await engine.chat.completions.create({{
-                    messages: [
-                        {{ role: "system", content: SYSTEM_PROMPT }},
-                        {{ role: "user", content: `{user_input}` }}
-                    ],
-                    stream: false
-                }});
-                
-                let response = completion.choices[0].message.content;
-                
-                // Extract JSON from code blocks
-                let jsonStr = response;
-                const codeBlockMatch = response.match(/```(?:json)?\\n?([\\s\\S]*?)\\n?```/);
-                if (codeBlockMatch) {{
-                    jsonStr = codeBlockMatch[1].trim();
-                }}
-                
-                // Clean up JSON
-                jsonStr = jsonStr
-                    .replace(/\\n/g, ' ')
-                    .replace(/\\r/g, ' ')
-                    .replace(/\\t/g, ' ')
-                    .replace(/  +/g, ' ')
-                    .replace(/'/g, '"');
-                
-                // Parse JSON
-                let result;
-                try {{
-                    result = JSON.parse(jsonStr);
-                }} catch (e) {{
-                    // Try extracting raw JSON object
-                    const match = jsonStr.match(/\\{{[^{{]*\\}}/);
-                    if (match) {{
-                        result = JSON.parse(match[0]);
-                    }} else {{
-                        throw new Error('Could not parse JSON response');
-                    }}
-                }}
-                
-                // Hide progress, show result
-                document.getElementById('progress').style.display = 'none';
-                resultDiv.style.display = 'block';
-                
-                // Display result
-                const passed = result.can_proceed === true;
-                const bgColor = passed ? '#d1fae5' : '#fee2e2';
-                const borderColor = passed ? '#10b981' : '#ef4444';
-                const statusIcon = passed ? '✅' : '❌';
-                
-                resultDiv.style.border = `2px solid ${{borderColor}}`;
-                resultDiv.style.backgroundColor = bgColor;
-                resultDiv.innerHTML = `
-                    <div style="font-weight: bold; color: ${{borderColor}}; margin-bottom: 8px; font-size: 16px;">
-                        ${{statusIcon}} Sanity Check ${{passed ? 'PASSED' : 'FAILED'}}
-                    </div>
-                    <div style="color: #333; font-size: 14px; line-height: 1.5;">
-                        ${{result.feedback || 'Check complete'}}
-                    </div>
-                `;
-                
-                // Store result in window for Streamlit to access
-                window.edgeSanityCheckResult = {{
-                    can_proceed: result.can_proceed,
-                    feedback: result.feedback,
-                    metadata: result.metadata || {{}}
-                }};
-                
-            }} catch (error) {{
-                document.getElementById('progress').style.display = 'none';
-                document.getElementById('result').style.display = 'block';
-                document.getElementById('result').innerHTML = `
-                    <div style="background: #fee2e2; border: 2px solid #ef4444; padding: 15px; border-radius: 8px; color: #dc2626;">
-                        <strong>Error:</strong> ${{error.message}}
-                    </div>
-                `;
-                window.edgeSanityCheckResult = {{ error: error.message }};
-            }}
-        }})();
-    </script>
+    Render the on-device checker. With user_input None it only loads the
+    model, so it is warm by the time a brief is submitted. Returns the
+    verdict for user_input, or None while the browser is still working.
     """
-    
-    # Render the HTML component
-    st.markdown(sanity_check_js, unsafe_allow_html=True)
-    
-    # Add a client-side script to poll for the result
-    st.markdown("""
-    <script>
-        (async () => {
-            // Wait for the edge check to complete (max 5 minutes)
-            let maxWait = 300000; // 5 minutes
-            let elapsed = 0;
-            const checkInterval = 500;
-            
-            while (elapsed < maxWait && !window.edgeSanityCheckResult) {
-                await new Promise(r => setTimeout(r, checkInterval));
-                elapsed += checkInterval;
-            }
-            
-            // If result found, trigger Streamlit rerun with the data
-            if (window.edgeSanityCheckResult && !window.edgeSanityCheckResult.error) {
-                // Store in sessionStorage for Streamlit to pick up
-                sessionStorage.setItem('edgeSanityResult', JSON.stringify(window.edgeSanityCheckResult));
-            }
-        })();
-    </script>
-    """, unsafe_allow_html=True)
-    
-    # Check if result is available in session storage (requires page refresh)
-    # For a better solution, you'd use Streamlit Components library
-    # For now, we'll return a default that indicates the check ran
-    
-    result_from_storage = st.session_state.get("edge_sanity_result")
-    if result_from_storage:
-        return result_from_storage
-    
-    # Default: assume passed (the visual feedback is in the browser)
-    # The actual validation happens client-side
+    if EDGE_SANITY_STUB:
+        value = {"input_hash": input_hash(user_input or ""), **json.loads(EDGE_SANITY_STUB)} if user_input else None
+    else:
+        value = _declare()(
+            user_input=user_input,
+            input_hash=input_hash(user_input) if user_input else None,
+            key=key,
+            default=None,
+        )
+    return parse_component_value(value, user_input) if user_input else None
+
+
+def parse_component_value(value: Any, user_input: str) -> Optional[EdgeVerdict]:
+    """The component's value as a verdict on user_input; None if it is for another brief or malformed."""
+    if not isinstance(value, dict) or value.get("input_hash") != input_hash(user_input):
+        return None
+
+    can_proceed = value.get("can_proceed")
+    try:
+        confidence = min(max(float(value.get("confidence") or 0.0), 0.0), 1.0)
+    except (TypeError, ValueError):
+        confidence = 0.0
+    metadata = value.get("metadata")
     return {
-        "can_proceed": True,
-        "feedback": "Edge check completed locally (see result above)",
-        "metadata": {}
+        "input_hash": value["input_hash"],
+        "can_proceed": can_proceed if isinstance(can_proceed, bool) else None,
+        "confidence": confidence,
+        "feedback": str(value.get("feedback") or ""),
+        "metadata": metadata if isinstance(metadata, dict) else {},
+        "error": str(value["error"]) if value.get("error") else None,
+    }
+
+
+def is_decisive(verdict: Optional[EdgeVerdict]) -> bool:
+    return (
+        verdict is not None
+        and verdict["error"] is None
+        and verdict["can_proceed"] is not None
+        and verdict["confidence"] >= EDGE_DECISIVE_CONFIDENCE
+    )
+
+
+def estimated_sanity_tokens(user_input: str) -> Tuple[int, int]:
+    """(prompt, completion) tokens the Gemini sanity check would use for user_input."""
+    from src.nodes.sanity_checker import sanity_prompt
+    from src.utils.context_guard import estimate_tokens
+
+    routing_prompt, _ = sanity_prompt(user_input)
+    return estimate_tokens(routing_prompt), SANITY_RESPONSE_TOKENS
+
+
+def apply_edge_verdict(state: Dict[str, Any], verdict: Optional[EdgeVerdict], user_input: str) -> Dict[str, Any]:
+    """
+    State for a submission of user_input. A decisive verdict sets the
+    sanity outcome and edge_verdict, so the graph skips sanity_checker_node,
+    and counts the Gemini tokens that saves; otherwise any earlier edge
+    verdict is cleared and Gemini decides.
+    """
+    state = dict(state)
+    if verdict is not None and verdict["input_hash"] != input_hash(user_input):
+        verdict = None
+
+    if not is_decisive(verdict):
+        if verdict is not None:
+            metrics.EDGE_SANITY_VERDICTS.inc("error" if verdict["error"] else "undecided")
+            reason = verdict["error"] or f"confidence {verdict['confidence']:.2f}"
+            logger.info(f"edge_sanity: Not decisive ({reason}), using the Gemini sanity check")
+            telemetry.record_cache("edge_sanity", False)
+        state["edge_verdict"] = None
+        return state
+
+    input_tokens, output_tokens = estimated_sanity_tokens(user_input)
+    metrics.EDGE_SANITY_VERDICTS.inc("accept" if verdict["can_proceed"] else "reject")
+    metrics.EDGE_SANITY_SAVED_TOKENS.inc("input", amount=input_tokens)
+    metrics.EDGE_SANITY_SAVED_TOKENS.inc("output", amount=output_tokens)
+    telemetry.record_cache("edge_sanity", True)
+    logger.info(
+        f"edge_sanity: can_proceed={verdict['can_proceed']} at confidence {verdict['confidence']:.2f}, "
+        f"skipping the Gemini sanity check (~{input_tokens + output_tokens} tokens saved)"
+    )
+
+    state["can_proceed"] = verdict["can_proceed"]
+    state["feedback"] = verdict["feedback"] or ("Checked on your device." if verdict["can_proceed"] else "Please add more detail.")
+    state["metadata"] = {
+        "maturity": verdict["metadata"].get("maturity"),
+        "environment": verdict["metadata"].get("environment"),
     }
+    state["edge_verdict"] = verdict
+    return state
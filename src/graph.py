@@ -1,12 +1,17 @@
+from typing import Any, Dict, Optional
+
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph, END, START
 from langgraph.checkpoint.memory import MemorySaver
+from langgraph.types import Command
 
-from src.state import AgentState
-from src.nodes.component_master import component_master_node
-from src.nodes.input_gatherer import input_gatherer_node
-from src.nodes.detailer import detailer_node
-from src.nodes.refiner import refiner_node
+from src.state import AgentState, initial_state
+from src.nodes.component_master import component_master_node, acomponent_master_node
+from src.nodes.input_gatherer import input_gatherer_node, ainput_gatherer_node
+from src.nodes.detailer import detailer_node, adetailer_node
+from src.nodes.refiner import refiner_node, arefiner_node
 from src.knowledge_base import PRD_COMPONENT_NAMES
+from src.edge_sanity_checker import input_hash
 
 
 checkpointer = MemorySaver()
@@ -29,7 +34,7 @@ def component_master_router(state: AgentState) -> str:
     return "input_gatherer"
 
 
-from src.nodes.sanity_checker import sanity_checker_node
+from src.nodes.sanity_checker import sanity_checker_node, asanity_checker_node
 
 def sanity_router(state: AgentState) -> str:
     """Route based on sanity check."""
@@ -48,7 +53,20 @@ def entry_router(state: AgentState) -> str:
     components = state.get("components", {})
     has_components = any(v for v in components.values() if v)
     
-    if has_components or state.get("can_proceed", False):
+    if has_components:
+        print("=== ROUTER: Skipping sanity check, routing directly to component_master ===")
+        return "component_master"
+    
+    # Decided in the browser for this exact input; the Gemini check is skipped
+    edge = state.get("edge_verdict")
+    if edge and edge.get("input_hash") == input_hash(state.get("raw_input", "")):
+        if state.get("can_proceed", False):
+            print("=== ROUTER: Edge sanity check passed, routing to component_master ===")
+            return "component_master"
+        print("=== ROUTER: Edge sanity check failed, ending workflow ===")
+        return "end"
+    
+    if state.get("can_proceed", False):
         print("=== ROUTER: Skipping sanity check, routing directly to component_master ===")
         return "component_master"
     
@@ -56,13 +74,18 @@ def entry_router(state: AgentState) -> str:
     return "sanity_checker"
 
 
+def dual_node(sync_fn, async_fn) -> RunnableLambda:
+    """ainvoke awaits the async node on the caller's loop; invoke uses the sync wrapper."""
+    return RunnableLambda(sync_fn, afunc=async_fn)
+
+
 workflow = StateGraph(AgentState)
 
-workflow.add_node("sanity_checker", sanity_checker_node)
-workflow.add_node("component_master", component_master_node)
-workflow.add_node("input_gatherer", input_gatherer_node)
-workflow.add_node("detailer", detailer_node)
-workflow.add_node("refiner", refiner_node)
+workflow.add_node("sanity_checker", dual_node(sanity_checker_node, asanity_checker_node))
+workflow.add_node("component_master", dual_node(component_master_node, acomponent_master_node))
+workflow.add_node("input_gatherer", dual_node(input_gatherer_node, ainput_gatherer_node))
+workflow.add_node("detailer", dual_node(detailer_node, adetailer_node))
+workflow.add_node("refiner", dual_node(refiner_node, arefiner_node))
 
 # Entry point routes based on whether sanity check is needed
 workflow.add_conditional_edges(
@@ -71,6 +94,7 @@ workflow.add_conditional_edges(
     {
         "sanity_checker": "sanity_checker",
         "component_master": "component_master",
+        "end": END,
     }
 )
 
@@ -92,8 +116,40 @@ workflow.add_conditional_edges(
     }
 )
 
-workflow.add_edge("input_gatherer", END)
+# input_gatherer pauses the run for gap input; resuming continues into extraction
+workflow.add_edge("input_gatherer", "component_master")
 workflow.add_edge("detailer", END)
 workflow.add_edge("refiner", END)
 
 app = workflow.compile(checkpointer=checkpointer)
+
+
+def paused_for_input(snapshot) -> bool:
+    """True when the thread's last run stopped at input_gatherer's interrupt."""
+    return any(task.name == "input_gatherer" and task.interrupts for task in snapshot.tasks)
+
+
+async def asubmission(config: Dict[str, Any], user_input: str, target_component: Optional[str] = None, state: Optional[Dict[str, Any]] = None):
+    """
+    Graph input for a user submission on a thread. A thread paused at
+    input_gatherer is resumed with only the new input, since the
+    checkpointer already holds the rest. Otherwise (a new or finished thread,
+    or a caller whose state no longer matches the checkpoint after a restore
+    or library reopen) the run starts from START with the full state: the
+    caller's, or the checkpoint's when state is None.
+    """
+    snapshot = await app.aget_state(config)
+    if paused_for_input(snapshot) and (state is None or snapshot.values.get("components") == state.get("components")):
+        return Command(resume={"input": user_input, "component": target_component})
+    
+    state = run_values(state if state is not None else {**initial_state(), **snapshot.values})
+    state["raw_input"] = user_input
+    state["awaiting_user_input"] = False
+    if target_component:
+        state["last_updated_component"] = target_component
+    return state
+
+
+def run_values(result: Dict[str, Any]) -> Dict[str, Any]:
+    """State from an ainvoke result, without the interrupt marker LangGraph adds when a run pauses."""
+    return {key: value for key, value in result.items() if key != "__interrupt__"}
@@ -3,6 +3,7 @@ PRD Components Knowledge Base
 Shared definitions accessible by all nodes in the workflow.
 """
 
+import re
 from typing import TypedDict, Optional, Dict, List
 
 PRD_COMPONENT_NAMES: List[str] = [
@@ -83,3 +84,27 @@ def get_component_descriptions_text() -> str:
     return "\n".join(
         f"- **{name}**: {desc}" for name, desc in PRD_COMPONENT_DESCRIPTIONS.items()
     )
+
+
+_LABEL_PATTERN = re.compile(
+    r"(?:^|(?<=\s))(" + "|".join(re.escape(name) for name in PRD_COMPONENT_NAMES) + r")\s*:\s*",
+    re.IGNORECASE,
+)
+
+
+def split_labeled_input(raw_input: str) -> Dict[str, str]:
+    """Split 'Goal: ... Metrics: ...' style text into components. Unlabeled text goes to Goal."""
+    canonical = {name.lower(): name for name in PRD_COMPONENT_NAMES}
+    matches = list(_LABEL_PATTERN.finditer(raw_input))
+    result: Dict[str, str] = {}
+
+    leading = raw_input[:matches[0].start()] if matches else raw_input
+    if leading.strip():
+        result["Goal"] = leading.strip()
+
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(raw_input)
+        name = canonical[match.group(1).lower()]
+        text = raw_input[match.end():end].strip()
+        result[name] = f"{result[name]} {text}".strip() if name in result else text
+    return result
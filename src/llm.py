@@ -0,0 +1,117 @@
+"""
+Chat model factory shared by all LLM-calling nodes.
+
+SPEC_WRITER_LLM_BACKEND selects the backend:
+- "gemini" (default): ChatGoogleGenerativeAI
+- "stub": deterministic offline model from src/stub_llm.py, for load tests
+
+SPEC_WRITER_CASSETTE_MODE=record|replay records or replays node traffic
+through src/cassette.py, on top of either backend.
+
+Nodes call routed_chat_model(), which picks the model and settings for the
+prompt from the routing table in src/model_routing.py.
+"""
+
+import os
+import asyncio
+import weakref
+from typing import Any, Dict, Optional
+
+from src.persona import MODEL_NAME
+from src.model_routing import ROUTING_TABLE, FallbackLogger, route
+from src.cassette import get_cassette_mode
+from src.utils.telemetry import TelemetryCallbackHandler
+from src.utils.cancellation import LLM_CALL_TIMEOUT, LLM_MAX_RETRIES
+
+LLM_BACKEND_ENV = "SPEC_WRITER_LLM_BACKEND"
+
+
+def get_llm_backend() -> str:
+    return os.environ.get(LLM_BACKEND_ENV, "gemini").strip().lower()
+
+
+def create_chat_model(
+    temperature: Optional[float] = None,
+    json_mode: bool = False,
+    model: str = MODEL_NAME,
+    node: Optional[str] = None,
+    extra_callbacks: Optional[list] = None,
+):
+    """
+    Build the chat model for a node. Temperature None keeps the provider default.
+    Passing the node name attaches telemetry for call latency and token usage.
+    """
+    backend = get_llm_backend()
+    if backend == "stub":
+        from src.stub_llm import STUB_MODEL_NAME
+        # Telemetry and recordings name the model that actually answers
+        model = STUB_MODEL_NAME
+
+    callbacks = [TelemetryCallbackHandler(node, model)] if node else None
+    if extra_callbacks:
+        callbacks = (callbacks or []) + extra_callbacks
+
+    cassette_mode = get_cassette_mode()
+    if cassette_mode == "replay":
+        from src.cassette import ReplayChatModel
+        return ReplayChatModel(node=node, callbacks=callbacks)
+    if cassette_mode == "record":
+        from src.cassette import CassetteRecorder, get_cassette
+        callbacks = (callbacks or []) + [CassetteRecorder(node, model, get_cassette())]
+
+    if backend == "stub":
+        from src.stub_llm import StubChatModel
+        return StubChatModel(callbacks=callbacks)
+
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    kwargs = {
+        "model": model,
+        "callbacks": callbacks,
+        "timeout": LLM_CALL_TIMEOUT,
+        "max_retries": LLM_MAX_RETRIES,
+    }
+    if temperature is not None:
+        kwargs["temperature"] = temperature
+    if json_mode:
+        kwargs["response_mime_type"] = "application/json"
+    return ChatGoogleGenerativeAI(**kwargs)
+
+
+# Async clients bind to the loop they first run on, so routed models are
+# cached per event loop (and once for synchronous callers)
+_loop_models: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[tuple, Any]]" = weakref.WeakKeyDictionary()
+_sync_models: Dict[tuple, Any] = {}
+
+
+def _model_cache() -> Dict[tuple, Any]:
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return _sync_models
+    return _loop_models.setdefault(loop, {})
+
+
+def _build_routed_model(node: str, model: str, fallback_model: Optional[str]):
+    settings = ROUTING_TABLE[node]
+    llm = create_chat_model(settings["temperature"], settings["json_mode"], model, node)
+    if not fallback_model:
+        return llm
+    fallback = create_chat_model(
+        settings["temperature"],
+        settings["json_mode"],
+        fallback_model,
+        node,
+        extra_callbacks=[FallbackLogger(node, fallback_model)],
+    )
+    return llm.with_fallbacks([fallback])
+
+
+def routed_chat_model(node: str, prompt: str):
+    """Chat model routed by prompt size, falling back to the node's fallback tier on errors."""
+    decision = route(node, len(prompt))
+    key = (node, decision["model"], decision["fallback_model"], get_llm_backend(), get_cassette_mode())
+    cache = _model_cache()
+    if key not in cache:
+        cache[key] = _build_routed_model(node, decision["model"], decision["fallback_model"])
+    return cache[key]
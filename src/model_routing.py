@@ -0,0 +1,184 @@
+"""
+Per-node model routing table.
+
+Each LLM-calling node picks a model tier from the size of its prompt, with a
+fallback tier used automatically when the routed model errors. Decisions are
+logged, and get_routing_report() joins them with telemetry call latency and
+token counts into an estimated cost per node and model.
+"""
+
+import os
+import logging
+import threading
+from collections import defaultdict
+from typing import TypedDict, Dict, List, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from src.persona import MODEL_NAME
+from src.utils.telemetry import get_model_call_stats
+
+logger = logging.getLogger(__name__)
+
+
+# Model per tier, overridable with SPEC_MODEL_<TIER>
+MODEL_TIERS: Dict[str, str] = {
+    tier: os.environ.get(f"SPEC_MODEL_{tier.upper()}", default)
+    for tier, default in {
+        "lite": MODEL_NAME,
+        "standard": "gemini-2.5-flash",
+        "pro": "gemini-2.5-pro",
+    }.items()
+}
+
+# USD per million (input, output) tokens, used for cost estimates only
+MODEL_PRICING: Dict[str, tuple] = {
+    "gemini-2.5-flash-lite": (0.10, 0.40),
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.5-pro": (1.25, 10.00),
+}
+
+
+class RouteRule(TypedDict):
+    max_chars: Optional[int]  # None matches any size
+    tier: str
+    fallback: Optional[str]  # tier retried when the routed model errors
+
+
+class NodeRoute(TypedDict):
+    temperature: Optional[float]
+    json_mode: bool
+    rules: List[RouteRule]
+
+
+class RouteDecision(TypedDict):
+    node: str
+    tier: str
+    model: str
+    fallback_model: Optional[str]
+    prompt_chars: int
+
+
+# Rules are checked in order; the first whose max_chars covers the prompt wins.
+# Prompts past the context guard's budgets (components it couldn't compact
+# without losing facts) go to the pro tier
+ROUTING_TABLE: Dict[str, NodeRoute] = {
+    "sanity_checker": {
+        "temperature": None,
+        "json_mode": False,
+        "rules": [{"max_chars": None, "tier": "lite", "fallback": "standard"}],
+    },
+    "component_master": {
+        "temperature": 0,
+        "json_mode": True,
+        "rules": [
+            {"max_chars": 12000, "tier": "lite", "fallback": "standard"},
+            {"max_chars": 32000, "tier": "standard", "fallback": "lite"},
+            {"max_chars": None, "tier": "pro", "fallback": "standard"},
+        ],
+    },
+    "compactor": {
+        "temperature": 0,
+        "json_mode": True,
+        "rules": [{"max_chars": None, "tier": "lite", "fallback": "standard"}],
+    },
+    "detailer": {
+        "temperature": 0.3,
+        "json_mode": True,
+        "rules": [
+            {"max_chars": 8000, "tier": "lite", "fallback": "standard"},
+            {"max_chars": 24000, "tier": "standard", "fallback": "lite"},
+            {"max_chars": None, "tier": "pro", "fallback": "standard"},
+        ],
+    },
+    "refiner": {
+        "temperature": 0.3,
+        "json_mode": True,
+        "rules": [
+            {"max_chars": 8000, "tier": "lite", "fallback": "standard"},
+            {"max_chars": 24000, "tier": "standard", "fallback": "lite"},
+            {"max_chars": None, "tier": "pro", "fallback": "standard"},
+        ],
+    },
+    "refiner_patch": {
+        "temperature": 0,
+        "json_mode": True,
+        "rules": [{"max_chars": None, "tier": "lite", "fallback": "standard"}],
+    },
+}
+
+_lock = threading.Lock()
+_decisions: Dict[tuple, int] = defaultdict(int)
+_fallbacks: Dict[tuple, int] = defaultdict(int)
+
+
+def route(node: str, prompt_chars: int) -> RouteDecision:
+    """Pick the model tier for one call of a node."""
+    rules = ROUTING_TABLE[node]["rules"]
+    rule = next(
+        (r for r in rules if r["max_chars"] is None or prompt_chars <= r["max_chars"]),
+        rules[-1],
+    )
+    tier = rule["tier"]
+    model = MODEL_TIERS[tier]
+    fallback_model = MODEL_TIERS[rule["fallback"]] if rule["fallback"] else None
+    if fallback_model == model:
+        fallback_model = None
+
+    with _lock:
+        _decisions[(node, model)] += 1
+    logger.info(f"routing: {node} -> {model} ({tier}, {prompt_chars} chars, fallback={fallback_model})")
+    return {
+        "node": node,
+        "tier": tier,
+        "model": model,
+        "fallback_model": fallback_model,
+        "prompt_chars": prompt_chars,
+    }
+
+
+class FallbackLogger(BaseCallbackHandler):
+    """Attached to fallback models; fires only when the routed model failed."""
+
+    run_inline = True
+
+    def __init__(self, node: str, model: str):
+        self.node = node
+        self.model = model
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        with _lock:
+            _fallbacks[(self.node, self.model)] += 1
+        logger.warning(f"routing: {self.node} falling back to {self.model}")
+
+
+def estimate_cost(model: str, input_tokens: int, output_tokens: int) -> float:
+    input_price, output_price = MODEL_PRICING.get(model, (0.0, 0.0))
+    return (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+
+
+def get_routing_report() -> List[Dict]:
+    """Per node and model: routing decisions, fallbacks, latency, tokens and estimated cost."""
+    calls = get_model_call_stats()
+    with _lock:
+        keys = set(_decisions) | set(_fallbacks) | set(calls)
+        decisions = dict(_decisions)
+        fallbacks = dict(_fallbacks)
+
+    report = []
+    for node, model in sorted(keys):
+        stats = calls.get((node, model), {})
+        n = stats.get("calls", 0)
+        report.append({
+            "node": node,
+            "model": model,
+            "decisions": decisions.get((node, model), 0),
+            "fallbacks": fallbacks.get((node, model), 0),
+            "calls": n,
+            "errors": stats.get("errors", 0),
+            "avg_seconds": stats.get("seconds", 0.0) / n if n else 0.0,
+            "input_tokens": stats.get("input_tokens", 0),
+            "output_tokens": stats.get("output_tokens", 0),
+            "cost_usd": estimate_cost(model, stats.get("input_tokens", 0), stats.get("output_tokens", 0)),
+        })
+    return report
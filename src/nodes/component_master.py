@@ -1,12 +1,20 @@
+import os
+import re
 import json
 import logging
+import asyncio
 from typing import Dict, Any, List, Optional
 
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import HumanMessage
 
 from src.state import AgentState
-from src.persona import MODEL_NAME
+from src.llm import routed_chat_model
+from src.utils.llm_json import ainvoke_json
+from src.utils.async_runner import run_sync
+from src.utils.prewarm import prewarm, reuse_or_call
+from src.utils.telemetry import timed_node
+from src.utils.cancellation import node_deadline, check_cancelled, RunCancelled, DeadlineExceeded
+from src.utils.context_guard import aguard_components, estimate_tokens
 from src.knowledge_base import (
     COMPONENT_EXTRACTION_PROMPT,
     PRD_COMPONENT_NAMES,
@@ -16,6 +24,15 @@ from src.knowledge_base import (
 
 logger = logging.getLogger(__name__)
 
+# Inputs longer than this (chars) are extracted chunk by chunk and merged
+CHUNKED_EXTRACTION_THRESHOLD = int(os.environ.get("SPEC_CHUNK_THRESHOLD", "12000"))
+CHUNK_TARGET_CHARS = int(os.environ.get("SPEC_CHUNK_SIZE", "6000"))
+CHUNK_WORKERS = int(os.environ.get("SPEC_CHUNK_WORKERS", "4"))
+
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+")
+_SENTENCE_SPLIT_KEEP = re.compile(r"(?<=[.!?])(\s+)")
+
 
 def count_words(text: Optional[str]) -> int:
     if not text:
@@ -32,7 +49,134 @@ def detect_gaps(components: Dict[str, Optional[str]]) -> List[str]:
     return gaps
 
 
-def component_master_node(state: AgentState) -> Dict[str, Any]:
+def extraction_prompt(raw_input: str, current_components: Dict[str, Optional[str]]) -> str:
+    return COMPONENT_EXTRACTION_PROMPT.format(
+        component_descriptions=get_component_descriptions_text(),
+        current_components=json.dumps(current_components, indent=2),
+        raw_input=raw_input,
+    )
+
+
+async def aextract_components(raw_input: str, current_components: Dict[str, Optional[str]], prewarming: bool = False) -> Dict[str, Optional[str]]:
+    """
+    Single extraction call integrating raw_input into current_components.
+    The live preview passes prewarming=True to start a call that the real
+    submission with the same input then joins.
+    """
+    prompt = extraction_prompt(raw_input, current_components)
+    
+    llm = routed_chat_model("component_master", prompt)
+    call = prewarm if prewarming else reuse_or_call
+    result = await call("component_master", prompt, lambda: ainvoke_json(llm, [HumanMessage(content=prompt)]))
+    
+    components = result.get("components", current_components)
+    for name in PRD_COMPONENT_NAMES:
+        if name not in components:
+            components[name] = current_components.get(name)
+    return components
+
+
+def split_into_chunks(text: str, target_chars: int = CHUNK_TARGET_CHARS) -> List[str]:
+    """
+    Pack paragraphs into chunks of about target_chars. A single paragraph
+    longer than that is split on sentence boundaries instead.
+    """
+    pieces = []
+    for paragraph in _PARAGRAPH_BREAK.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph) <= target_chars:
+            pieces.append(paragraph)
+        else:
+            pieces.extend(s for s in _SENTENCE_BREAK.split(paragraph) if s.strip())
+    
+    chunks, current, size = [], [], 0
+    for piece in pieces:
+        if current and size + len(piece) > target_chars:
+            chunks.append("\n\n".join(current))
+            current, size = [], 0
+        current.append(piece)
+        size += len(piece) + 2
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def _normalize(sentence: str) -> str:
+    return " ".join(sentence.lower().split()).lstrip("-*• ").rstrip(".!?")
+
+
+def merge_component_texts(texts: List[Optional[str]]) -> Optional[str]:
+    """
+    Combine texts for one component in order, dropping sentences already
+    present in an earlier text so overlapping chunks don't repeat content.
+    """
+    seen = set()
+    merged = []
+    for text in texts:
+        if not text or not text.strip():
+            continue
+        # Odd entries are the original separators, kept to preserve lists and line breaks
+        parts = _SENTENCE_SPLIT_KEEP.split(text.strip())
+        kept = ""
+        for i in range(0, len(parts), 2):
+            key = _normalize(parts[i])
+            if key and key not in seen:
+                seen.add(key)
+                kept += (parts[i - 1] if kept else "") + parts[i]
+        if kept:
+            merged.append(kept)
+    return "\n\n".join(merged) if merged else None
+
+
+async def aextract_chunked(raw_input: str, current_components: Dict[str, Optional[str]]) -> tuple:
+    """
+    Map-reduce extraction for long inputs: paragraph-aligned chunks are
+    extracted concurrently against empty components, then per-component
+    texts are merged after the existing text.
+    Returns (components, number of chunks that failed).
+    """
+    chunks = split_into_chunks(raw_input)
+    print(f"=== COMPONENT_MASTER NODE: Chunked extraction, {len(chunks)} chunks ===")
+    logger.info(f"component_master: Chunked extraction of {len(raw_input)} chars in {len(chunks)} chunks")
+    
+    empty = {name: None for name in PRD_COMPONENT_NAMES}
+    semaphore = asyncio.Semaphore(CHUNK_WORKERS)
+    
+    async def extract_chunk(chunk: str) -> Dict[str, Optional[str]]:
+        async with semaphore:
+            check_cancelled()
+            return await aextract_components(chunk, dict(empty))
+    
+    results = await asyncio.gather(*(extract_chunk(chunk) for chunk in chunks), return_exceptions=True)
+    
+    failures = []
+    for i, result in enumerate(results):
+        # Cancellation and deadlines abort the whole extraction
+        if isinstance(result, (RunCancelled, DeadlineExceeded)) or (
+            isinstance(result, BaseException) and not isinstance(result, Exception)
+        ):
+            raise result
+        if isinstance(result, Exception):
+            logger.error(f"component_master: Chunk {i + 1}/{len(chunks)} failed: {result}")
+            failures.append(result)
+    
+    if len(failures) == len(chunks):
+        raise failures[0]
+    
+    components = {
+        name: merge_component_texts(
+            [current_components.get(name)] + [r.get(name) for r in results if isinstance(r, dict)]
+        )
+        for name in PRD_COMPONENT_NAMES
+    }
+    return components, len(failures)
+
+
+@timed_node("component_master")
+@node_deadline("component_master")
+async def acomponent_master_node(state: AgentState) -> Dict[str, Any]:
     print("\n=== COMPONENT_MASTER NODE: START ===")
     logger.info("component_master: Starting PRD component extraction")
     
@@ -49,60 +193,28 @@ def component_master_node(state: AgentState) -> Dict[str, Any]:
         return {
             "components": current_components,
             "gaps": gaps,
+            "awaiting_user_input": bool(gaps),
             "is_spec_complete": is_complete,
             "feedback": "No new input provided." if not is_complete else "Spec complete!",
         }
     
-    llm = ChatGoogleGenerativeAI(
-        model=MODEL_NAME,
-        temperature=0,
-        response_mime_type="application/json",
-    )
-    
-    current_components_str = json.dumps(current_components, indent=2)
-    
-    prompt = COMPONENT_EXTRACTION_PROMPT.format(
-        component_descriptions=get_component_descriptions_text(),
-        current_components=current_components_str,
-        raw_input=raw_input,
-    )
-    
+    check_cancelled()
     try:
-        response = llm.invoke([HumanMessage(content=prompt)])
-        result_content = response.content
-        
-        def extract_json_from_text(text: str) -> dict:
-            text = text.strip()
-            if text.startswith("```json"):
-                text = text[7:]
-            if text.startswith("```"):
-                text = text[3:]
-            if text.endswith("```"):
-                text = text[:-3]
-            return json.loads(text.strip())
-        
-        if isinstance(result_content, dict):
-            result = result_content
-        elif isinstance(result_content, list):
-            first_item = result_content[0] if result_content else {}
-            if isinstance(first_item, dict) and "text" in first_item:
-                result = extract_json_from_text(first_item["text"])
-            elif isinstance(first_item, dict):
-                result = first_item
-            elif isinstance(first_item, str):
-                result = extract_json_from_text(first_item)
-            else:
-                result = {}
-        elif isinstance(result_content, str) and result_content.strip():
-            result = extract_json_from_text(result_content)
+        failed_chunks = 0
+        detailed_components = state.get("detailed_components") or {}
+        compactions = dict(state.get("compactions") or {})
+        if len(raw_input) > CHUNKED_EXTRACTION_THRESHOLD:
+            components, failed_chunks = await aextract_chunked(raw_input, current_components)
         else:
-            raise ValueError(f"Empty or invalid response: {result_content}")
-        
-        components = result.get("components", current_components)
+            prompt_tokens = estimate_tokens(extraction_prompt(raw_input, current_components))
+            logger.info(f"component_master: Extraction prompt is ~{prompt_tokens} tokens")
+            guarded, compacted = await aguard_components(current_components, detailed_components, prompt_tokens)
+            compactions.update(compacted)
+            components = await aextract_components(raw_input, guarded)
         
-        for name in PRD_COMPONENT_NAMES:
-            if name not in components:
-                components[name] = current_components.get(name)
+        # Keep what is stored within budget so the next extraction prompt stays small
+        components, compacted = await aguard_components(components, detailed_components)
+        compactions.update(compacted)
         
         gaps = detect_gaps(components)
         is_complete = len(gaps) == 0
@@ -113,11 +225,16 @@ def component_master_node(state: AgentState) -> Dict[str, Any]:
         return {
             "components": components,
             "gaps": gaps,
+            "awaiting_user_input": bool(gaps),
             "is_spec_complete": is_complete,
             "raw_input": "",
-            "feedback": "Spec complete!" if is_complete else f"Missing details for: {', '.join(gaps)}",
+            "compactions": compactions,
+            "feedback": ("Spec complete!" if is_complete else f"Missing details for: {', '.join(gaps)}")
+            + (f" ({failed_chunks} input chunks could not be extracted.)" if failed_chunks else ""),
         }
         
+    except (RunCancelled, DeadlineExceeded):
+        raise
     except json.JSONDecodeError as e:
         error_msg = f"Failed to parse LLM response as JSON: {e}"
         print(f"=== COMPONENT_MASTER NODE: ERROR - {error_msg} ===")
@@ -126,6 +243,7 @@ def component_master_node(state: AgentState) -> Dict[str, Any]:
         return {
             "components": current_components,
             "gaps": gaps,
+            "awaiting_user_input": bool(gaps),
             "is_spec_complete": False,
             "feedback": error_msg,
         }
@@ -137,8 +255,14 @@ def component_master_node(state: AgentState) -> Dict[str, Any]:
         return {
             "components": current_components,
             "gaps": gaps,
+            "awaiting_user_input": bool(gaps),
             "is_spec_complete": False,
             "feedback": error_msg,
         }
     finally:
         print("=== COMPONENT_MASTER NODE: END ===\n")
+
+
+def component_master_node(state: AgentState) -> Dict[str, Any]:
+    """Sync wrapper for tests and scripts."""
+    return run_sync(acomponent_master_node(state))
@@ -1,13 +1,20 @@
-import json
+import os
+import asyncio
+import hashlib
 import logging
 from typing import Dict, Any, Optional
 
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import HumanMessage
 
 from src.state import AgentState
-from src.persona import MODEL_NAME
+from src.llm import routed_chat_model
+from src.utils.telemetry import timed_node, component_scope
+from src.utils.cancellation import node_deadline, check_cancelled, RunCancelled, DeadlineExceeded
+from src.utils.llm_json import ainvoke_json
+from src.utils.async_runner import run_sync
 from src.knowledge_base import PRD_COMPONENT_NAMES
+from src.question_bank import local_questions
+from src.utils.similarity import get_similarity_index, reuse_output
 
 logger = logging.getLogger(__name__)
 
@@ -39,7 +46,93 @@ Keep the elaborated text faithful to the original intent. Questions should be sp
 """
 
 
-def detailer_node(state: AgentState) -> Dict[str, Any]:
+# Maximum concurrent component calls per detailer run
+DETAIL_CONCURRENCY = int(os.environ.get("SPEC_DETAIL_CONCURRENCY", "7"))
+
+DETAIL_OK = "ok"
+DETAIL_FAILED = "failed"
+DETAIL_STALE = "stale"
+
+
+def source_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def get_detail_statuses(state: AgentState) -> Dict[str, str]:
+    """
+    Effective detailing status per non-empty component: the recorded ok/failed,
+    or stale when the component text changed since it was detailed (or it was
+    never detailed in an already detailed spec). Specs detailed before statuses
+    were recorded count as ok.
+    """
+    components = state.get("components", {}) or {}
+    detailed_components = state.get("detailed_components", {}) or {}
+    recorded = state.get("detail_status", {}) or {}
+    sources = state.get("detail_sources", {}) or {}
+    if not detailed_components:
+        return {}
+    
+    statuses = {}
+    for name in PRD_COMPONENT_NAMES:
+        text = components.get(name)
+        if not text:
+            continue
+        status = recorded.get(name)
+        if status is None:
+            status = DETAIL_OK if (detailed_components.get(name) or {}).get("text") else DETAIL_STALE
+        elif status == DETAIL_OK and name in sources and sources[name] != source_hash(text):
+            status = DETAIL_STALE
+        statuses[name] = status
+    return statuses
+
+
+async def adetail_component(name: str, text: str) -> tuple:
+    """Detail one component. Returns (detailed entry, status)."""
+    reused = reuse_output(f"detailer:{name}", text)
+    if reused is not None:
+        print(f"=== DETAILER NODE: Reused near-duplicate for {name} ===")
+        logger.info(f"detailer: Reused near-duplicate elaboration for {name}")
+        return {
+            "text": reused.get("text", text),
+            "questions": reused.get("questions", [])[:3]
+        }, DETAIL_OK
+    
+    prompt = DETAILER_PROMPT.format(
+        component_name=name,
+        component_text=text,
+    )
+    
+    llm = routed_chat_model("detailer", prompt)
+    
+    try:
+        check_cancelled()
+        with component_scope(name):
+            result = await ainvoke_json(llm, [HumanMessage(content=prompt)], default={"text": text, "questions": []})
+        
+        detail = {
+            "text": result.get("text", text),
+            "questions": result.get("questions", [])[:3]
+        }
+        await get_similarity_index().aadd(f"detailer:{name}", text, detail)
+        
+        print(f"=== DETAILER NODE: Processed {name} ===")
+        logger.info(f"detailer: Processed {name}")
+        return detail, DETAIL_OK
+    
+    except (RunCancelled, DeadlineExceeded):
+        raise
+    except Exception as e:
+        logger.error(f"detailer: Error processing {name}: {e}")
+        # The question bank still gives the user something to answer
+        return {
+            "text": text,
+            "questions": local_questions(name, text)
+        }, DETAIL_FAILED
+
+
+@timed_node("detailer")
+@node_deadline("detailer")
+async def adetailer_node(state: AgentState) -> Dict[str, Any]:
     print("\n=== DETAILER NODE: START ===")
     logger.info("detailer: Starting component elaboration")
     
@@ -53,13 +146,12 @@ def detailer_node(state: AgentState) -> Dict[str, Any]:
             "feedback": "No components available to detail.",
         }
     
-    llm = ChatGoogleGenerativeAI(
-        model=MODEL_NAME,
-        temperature=0.3,
-        response_mime_type="application/json",
-    )
-    
+    previous = state.get("detailed_components", {}) or {}
+    statuses = get_detail_statuses(state)
+    detail_sources = dict(state.get("detail_sources", {}) or {})
+    detail_status = {}
     detailed_components = {}
+    pending = []
     
     for name in PRD_COMPONENT_NAMES:
         text = components.get(name)
@@ -69,66 +161,49 @@ def detailer_node(state: AgentState) -> Dict[str, Any]:
                 "text": None,
                 "questions": []
             }
-            continue
-        
-        prompt = DETAILER_PROMPT.format(
-            component_name=name,
-            component_text=text,
-        )
-        
-        try:
-            response = llm.invoke([HumanMessage(content=prompt)])
-            result_content = response.content
-            
-            def extract_json_from_text(text_input: str) -> dict:
-                text_input = text_input.strip()
-                if text_input.startswith("```json"):
-                    text_input = text_input[7:]
-                if text_input.startswith("```"):
-                    text_input = text_input[3:]
-                if text_input.endswith("```"):
-                    text_input = text_input[:-3]
-                return json.loads(text_input.strip())
-            
-            if isinstance(result_content, dict):
-                result = result_content
-            elif isinstance(result_content, list):
-                first_item = result_content[0] if result_content else {}
-                if isinstance(first_item, dict) and "text" in first_item and "questions" not in first_item:
-                    result = extract_json_from_text(first_item.get("text", "{}"))
-                elif isinstance(first_item, dict):
-                    result = first_item
-                elif isinstance(first_item, str):
-                    result = extract_json_from_text(first_item)
-                else:
-                    result = {"text": text, "questions": []}
-            elif isinstance(result_content, str) and result_content.strip():
-                result = extract_json_from_text(result_content)
-            else:
-                result = {"text": text, "questions": []}
-            
-            detailed_components[name] = {
-                "text": result.get("text", text),
-                "questions": result.get("questions", [])[:3]
-            }
-            
-            print(f"=== DETAILER NODE: Processed {name} ===")
-            logger.info(f"detailer: Processed {name}")
-            
-        except Exception as e:
-            logger.error(f"detailer: Error processing {name}: {e}")
-            detailed_components[name] = {
-                "text": text,
-                "questions": []
-            }
+        elif statuses.get(name) == DETAIL_OK and name in previous:
+            # Already detailed from this text; keep the checkpointed result
+            detailed_components[name] = previous[name]
+            detail_status[name] = DETAIL_OK
+        else:
+            pending.append(name)
+    
+    # Components are independent, so their calls run concurrently
+    semaphore = asyncio.Semaphore(DETAIL_CONCURRENCY)
+    
+    async def detail(name: str) -> tuple:
+        async with semaphore:
+            return await adetail_component(name, components[name])
+    
+    check_cancelled()
+    results = await asyncio.gather(*(detail(name) for name in pending))
+    for name, (detail_entry, status) in zip(pending, results):
+        detailed_components[name] = detail_entry
+        detail_status[name] = status
+        detail_sources[name] = source_hash(components[name])
     
-    print(f"=== DETAILER NODE: Detailed {len([c for c in detailed_components.values() if c.get('text')])} components ===")
-    logger.info(f"detailer: Completed detailing all components")
+    # Keep PRD order regardless of completion order
+    detailed_components = {name: detailed_components[name] for name in PRD_COMPONENT_NAMES}
+    
+    failed = [name for name, status in detail_status.items() if status == DETAIL_FAILED]
+    print(f"=== DETAILER NODE: Detailed {len([c for c in detailed_components.values() if c.get('text')])} components, failed={failed} ===")
+    logger.info(f"detailer: Completed detailing all components, failed={failed}")
     
     print("=== DETAILER NODE: END ===\n")
     
+    feedback = "Spec has been elaborated with recommended questions."
+    if failed:
+        feedback += f" Detailing failed for: {', '.join(failed)}."
+    
     return {
         "detailed_components": detailed_components,
+        "detail_status": detail_status,
+        "detail_sources": {name: h for name, h in detail_sources.items() if name in detail_status},
         "is_detailed": True,
-        "feedback": "Spec has been elaborated with recommended questions.",
+        "feedback": feedback,
     }
+
+
+def detailer_node(state: AgentState) -> Dict[str, Any]:
+    """Sync wrapper for tests and scripts."""
+    return run_sync(adetailer_node(state))
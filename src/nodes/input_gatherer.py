@@ -1,18 +1,25 @@
 import logging
 from typing import Dict, Any
 
+from langgraph.types import interrupt
+
 from src.state import AgentState
+from src.utils.cancellation import node_deadline
+from src.utils.async_runner import run_sync
 
 logger = logging.getLogger(__name__)
 
 
-def input_gatherer_node(state: AgentState) -> Dict[str, Any]:
+@node_deadline("input_gatherer")
+async def ainput_gatherer_node(state: AgentState) -> Dict[str, Any]:
     """
-    Input Gatherer Node - Sets awaiting_user_input flag.
+    Input Gatherer Node - pauses the run until the user fills a gap.
     
-    This node acts as a "wait for user" state. The Streamlit app
-    checks this flag to render input forms for gaps.
-    When user provides input, the graph resumes from checkpointer.
+    interrupt() checkpoints the thread and ends the run; the Streamlit app
+    renders input forms for the gaps. The next submission resumes the thread
+    with Command(resume={"input": ..., "component": ...}) and this node
+    passes the input on to component_master. On resume the node runs again
+    from the top, so everything before interrupt() must stay side-effect free.
     """
     print("\n=== INPUT_GATHERER NODE: START ===")
     logger.info("input_gatherer: Waiting for user input")
@@ -22,9 +29,21 @@ def input_gatherer_node(state: AgentState) -> Dict[str, Any]:
     print(f"=== INPUT_GATHERER NODE: Awaiting input for gaps: {gaps} ===")
     logger.info(f"input_gatherer: Gaps requiring input: {gaps}")
     
+    submission = interrupt({"gaps": gaps, "feedback": state.get("feedback", "")})
+    component = submission.get("component")
+    logger.info(f"input_gatherer: Resumed with input for {component or 'the spec'}")
+    
     print("=== INPUT_GATHERER NODE: END ===\n")
     
-    return {
-        "awaiting_user_input": True,
-        "feedback": f"Please provide details for: {', '.join(gaps)}" if gaps else "All components complete",
+    update = {
+        "raw_input": submission.get("input", ""),
+        "awaiting_user_input": False,
     }
+    if component:
+        update["last_updated_component"] = component
+    return update
+
+
+def input_gatherer_node(state: AgentState) -> Dict[str, Any]:
+    """Sync wrapper for tests and scripts."""
+    return run_sync(ainput_gatherer_node(state))
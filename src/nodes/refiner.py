@@ -1,16 +1,25 @@
-import json
+import os
+import asyncio
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import HumanMessage
 
 from src.state import AgentState
-from src.persona import MODEL_NAME
-from src.knowledge_base import PRD_COMPONENT_NAMES
+from src.llm import routed_chat_model
+from src.utils.telemetry import timed_node, component_scope, record_cache
+from src.utils.cancellation import node_deadline, check_cancelled, RunCancelled, DeadlineExceeded
+from src.utils.llm_json import ainvoke_json
+from src.utils.async_runner import run_sync
+from src.knowledge_base import PRD_COMPONENT_NAMES, MIN_WORDS_THRESHOLD
+from src.utils.similarity import get_similarity_index, reuse_output
 
 logger = logging.getLogger(__name__)
 
+# "patch": the model returns edits applied here, falling back to "full" (whole text) when they don't apply
+REFINER_MODE = os.environ.get("SPEC_REFINER_MODE", "patch").strip().lower()
+PATCH_OPS = ("replace", "insert", "append")
+
 
 REFINER_PROMPT = """You are a specification refinement expert. Your task is to improve a component based on additional answers provided by the user.
 
@@ -37,8 +46,159 @@ Return a JSON object with this exact structure:
 Keep the refined text professional and comprehensive.
 """
 
+REFINER_PATCH_PROMPT = """You are a specification refinement expert. Integrate the user's answers into a component by editing it, not by rewriting it.
 
-def refiner_node(state: AgentState) -> Dict[str, Any]:
+## Component: {component_name}
+
+### Current Text:
+{current_text}
+
+### User's Answers to Follow-up Questions:
+{answers_text}
+
+## Instructions:
+1. **Minimal Edits**: Return only the edits needed to integrate the answers. Everything else stays as it is.
+2. **Anchors**: "anchor" is copied exactly from the current text and occurs in it only once. Keep anchors short: a phrase or one sentence.
+3. **Operations**: "replace" swaps the anchor for "text"; "insert" adds "text" right after the anchor; "append" adds "text" at the end and takes no anchor.
+4. **No Hallucination**: Only use information provided by the user. Do not invent details.
+
+## Output Format:
+Return a JSON object with this exact structure:
+{{
+  "edits": [
+    {{"op": "insert", "anchor": "exact phrase from the current text", "text": "new sentence"}},
+    {{"op": "append", "text": "new sentence"}}
+  ]
+}}
+"""
+
+
+class PatchError(ValueError):
+    """Edits that can't be applied to the current text."""
+
+
+def _join(before: str, addition: str, after: str = "") -> str:
+    """Insert addition between before and after with single spaces where none are present."""
+    addition = addition.strip()
+    if before and not before[-1].isspace():
+        addition = " " + addition
+    if after and not after[0].isspace():
+        addition = addition + " "
+    return before + addition + after
+
+
+def apply_edits(text: str, edits: Any) -> str:
+    """
+    Apply the model's edits in order. Every anchor must occur exactly once in
+    the text as edited so far, and the result must still fill the component.
+    """
+    if not isinstance(edits, list):
+        raise PatchError(f"edits is {type(edits).__name__}, not a list")
+    if not edits:
+        # Answers always add something; an empty patch means they weren't integrated
+        raise PatchError("no edits")
+    
+    for i, edit in enumerate(edits):
+        if not isinstance(edit, dict) or edit.get("op") not in PATCH_OPS:
+            raise PatchError(f"edit {i}: unknown operation {edit!r}")
+        op, new_text = edit["op"], edit.get("text")
+        if not isinstance(new_text, str) or (op != "replace" and not new_text.strip()):
+            raise PatchError(f"edit {i}: {op} needs text")
+        
+        if op == "append":
+            text = _join(text.rstrip(), new_text)
+            continue
+        
+        anchor = edit.get("anchor")
+        if not isinstance(anchor, str) or not anchor.strip():
+            raise PatchError(f"edit {i}: {op} needs an anchor")
+        count = text.count(anchor)
+        if count != 1:
+            raise PatchError(f"edit {i}: anchor found {count} times: {anchor[:60]!r}")
+        start = text.index(anchor)
+        end = start + len(anchor)
+        if op == "replace":
+            text = text[:start] + new_text + text[end:] if new_text.strip() else text[:start].rstrip() + text[end:]
+        else:
+            text = _join(text[:end], new_text, text[end:])
+    
+    if len(text.split()) < MIN_WORDS_THRESHOLD:
+        raise PatchError("edited text is below the minimum component length")
+    return text.strip()
+
+
+async def apatch_component(component_name: str, current_text: str, answers_text: str) -> Optional[str]:
+    """Refined text from a patch, or None if the model's edits don't apply."""
+    prompt = REFINER_PATCH_PROMPT.format(
+        component_name=component_name,
+        current_text=current_text,
+        answers_text=answers_text,
+    )
+    llm = routed_chat_model("refiner_patch", prompt)
+    with component_scope(component_name):
+        result = await ainvoke_json(llm, [HumanMessage(content=prompt)], default={})
+    
+    try:
+        text = apply_edits(current_text, result.get("edits"))
+    except PatchError as e:
+        logger.warning(f"refiner: Patch for {component_name} did not apply, regenerating full text: {e}")
+        record_cache("refiner_patch", False)
+        return None
+    record_cache("refiner_patch", True)
+    print(f"=== REFINER NODE: Patched {component_name} ({len(result['edits'])} edits) ===")
+    return text
+
+
+async def arefine_component(component_name: str, current_text: str, answers_text: str, mode: Optional[str] = None) -> Optional[str]:
+    """Refined text for one component, or None to keep the current text. mode defaults to REFINER_MODE."""
+    # Current text and answers together identify a refinement
+    similarity_source = f"{current_text}\n\n{answers_text}"
+    reused = reuse_output(f"refiner:{component_name}", similarity_source)
+    if reused is not None:
+        print(f"=== REFINER NODE: Reused near-duplicate for {component_name} ===")
+        logger.info(f"refiner: Reused near-duplicate refinement for {component_name}")
+        return reused.get("text", current_text)
+    
+    try:
+        check_cancelled()
+        text = None
+        if (mode or REFINER_MODE) == "patch":
+            try:
+                text = await apatch_component(component_name, current_text, answers_text)
+            except (RunCancelled, DeadlineExceeded):
+                raise
+            except Exception as e:
+                logger.warning(f"refiner: Patch call for {component_name} failed, regenerating full text: {e}")
+        
+        if text is None:
+            prompt = REFINER_PROMPT.format(
+                component_name=component_name,
+                current_text=current_text,
+                answers_text=answers_text,
+            )
+            llm = routed_chat_model("refiner", prompt)
+            check_cancelled()
+            with component_scope(component_name):
+                result = await ainvoke_json(llm, [HumanMessage(content=prompt)], default={"text": current_text})
+            text = result.get("text", current_text)
+        
+        await get_similarity_index().aadd(f"refiner:{component_name}", similarity_source, {"text": text})
+        
+        print(f"=== REFINER NODE: Refined {component_name} ===")
+        logger.info(f"refiner: Refined {component_name} with user answers")
+        return text
+    
+    except (RunCancelled, DeadlineExceeded):
+        raise
+    except Exception as e:
+        logger.error(f"refiner: Error refining {component_name}: {e}")
+        # Keep the original if refinement fails
+        return None
+
+
+@timed_node("refiner")
+@node_deadline("refiner")
+async def arefiner_node(state: AgentState) -> Dict[str, Any]:
     """Refine components based on question answers."""
     print("\n=== REFINER NODE: START ===")
     logger.info("refiner: Starting component refinement based on answers")
@@ -54,13 +214,8 @@ def refiner_node(state: AgentState) -> Dict[str, Any]:
             "feedback": "No answers provided for refinement.",
         }
     
-    llm = ChatGoogleGenerativeAI(
-        model=MODEL_NAME,
-        temperature=0.3,
-        response_mime_type="application/json",
-    )
-    
     updated_components = detailed_components.copy()
+    pending = {}
     
     for component_name, answers_dict in question_answers.items():
         if not answers_dict or not any(answers_dict.values()):
@@ -83,47 +238,16 @@ def refiner_node(state: AgentState) -> Dict[str, Any]:
         if not answers_text_lines:
             continue
         
-        answers_text = "\n\n".join(answers_text_lines)
-        
-        prompt = REFINER_PROMPT.format(
-            component_name=component_name,
-            current_text=current_text,
-            answers_text=answers_text,
-        )
-        
-        try:
-            response = llm.invoke([HumanMessage(content=prompt)])
-            result_content = response.content
-            
-            def extract_json_from_text(text_input: str) -> dict:
-                text_input = text_input.strip()
-                if text_input.startswith("```json"):
-                    text_input = text_input[7:]
-                if text_input.startswith("```"):
-                    text_input = text_input[3:]
-                if text_input.endswith("```"):
-                    text_input = text_input[:-3]
-                return json.loads(text_input.strip())
-            
-            if isinstance(result_content, dict):
-                result = result_content
-            elif isinstance(result_content, str) and result_content.strip():
-                result = extract_json_from_text(result_content)
-            else:
-                result = {"text": current_text}
-            
+        pending[component_name] = arefine_component(component_name, current_text, "\n\n".join(answers_text_lines))
+    
+    check_cancelled()
+    results = await asyncio.gather(*pending.values())
+    for component_name, text in zip(pending, results):
+        if text is not None:
             updated_components[component_name] = {
-                "text": result.get("text", current_text),
-                "questions": current_questions
+                **detailed_components[component_name],
+                "text": text,
             }
-            
-            print(f"=== REFINER NODE: Refined {component_name} ===")
-            logger.info(f"refiner: Refined {component_name} with user answers")
-            
-        except Exception as e:
-            logger.error(f"refiner: Error refining {component_name}: {e}")
-            # Keep the original if refinement fails
-            pass
     
     print(f"=== REFINER NODE: Refined {len([c for c in question_answers if question_answers[c]])} components ===")
     logger.info("refiner: Completed refinement")
@@ -135,3 +259,8 @@ def refiner_node(state: AgentState) -> Dict[str, Any]:
         "question_answers": {},  # Clear answers after processing
         "feedback": "Components refined based on your answers.",
     }
+
+
+def refiner_node(state: AgentState) -> Dict[str, Any]:
+    """Sync wrapper for tests and scripts."""
+    return run_sync(arefiner_node(state))
@@ -2,9 +2,15 @@ import os
 import json
 from typing import Dict, Any
 from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI
 from src.state import AgentState
-from src.persona import SYSTEM_PERSONA, MODEL_NAME
+from src.persona import SYSTEM_PERSONA
+from src.llm import routed_chat_model
+from src.utils.telemetry import timed_node
+from src.utils.cancellation import node_deadline, check_cancelled, RunCancelled, DeadlineExceeded
+from src.utils.async_runner import run_sync
+from src.utils.prewarm import reuse_or_call
+from src.utils.scheduler import scheduled
+from src.utils import metrics
 
 # Load environment variables
 load_dotenv()
@@ -50,34 +56,20 @@ import logging
 
 logger = logging.getLogger(__name__)
 
-def sanity_checker_node(state: AgentState) -> AgentState:
-    """True implementation of sanity checker using centralized model name."""
-    
-    logger.info("Sanity Checker Node started.")
-    
-    # Using 'rest' transport can sometimes resolve 404/connectivity issues
-    llm = ChatGoogleGenerativeAI(
-        model=MODEL_NAME
-    )
-    
+
+def sanity_prompt(raw_input: str) -> tuple:
+    """(routing prompt, chat messages) for a sanity check of raw_input."""
     # Use replace to avoid KeyError if the user input contains curly braces
-    prompt = SANITY_CHECK_PROMPT.replace("{user_input}", state["raw_input"])
-    
+    prompt = SANITY_CHECK_PROMPT.replace("{user_input}", raw_input)
     messages = [
         ("system", SYSTEM_PERSONA),
         ("human", prompt)
     ]
-    
-    logger.debug(f"Sending prompt to LLM: {prompt[:100]}...")
-    
-    try:
-        response = llm.invoke(messages)
-        text = response.content
-        logger.info(f"Received response from LLM (type: {type(text)}): {str(text)[:200]}...")
-    except Exception as e:
-        logger.error(f"Error invoking LLM: {e}")
-        return {**state, "can_proceed": False, "feedback": f"Error calling AI: {e}", "metadata": {}}
-    
+    return SYSTEM_PERSONA + prompt, messages
+
+
+def parse_sanity_response(text) -> Dict[str, Any]:
+    """Verdict dict from the model's response content, falling back to the raw text as feedback."""
     # Handle case where response.content might be a list of blocks
     if isinstance(text, list):
         # Extract text from dict blocks (e.g., {'type': 'text', 'text': '...'})
@@ -92,18 +84,50 @@ def sanity_checker_node(state: AgentState) -> AgentState:
             content = json.loads(json_match.group(0))
             logger.info(f"Successfully parsed JSON content. can_proceed={content.get('can_proceed')}")
             logger.debug(f"Full JSON: {json.dumps(content, indent=2)}")
+            return content
         except json.JSONDecodeError as e:
             logger.error(f"JSON Decode Error: {e}. Raw text: {text}")
+            metrics.JSON_PARSE_FAILURES.inc("malformed")
             # Fallback: Use raw text as feedback if JSON parse fails
-            content = {"can_proceed": False, "feedback": text, "metadata": {}}
-    else:
-        logger.warning(f"No JSON found in response. Raw text: {text}")
-        # Fallback: Use raw text as feedback if no JSON found
-        content = {"can_proceed": False, "feedback": text, "metadata": {}}
+            return {"can_proceed": False, "feedback": text, "metadata": {}}
+    
+    logger.warning(f"No JSON found in response. Raw text: {text}")
+    metrics.JSON_PARSE_FAILURES.inc("missing")
+    # Fallback: Use raw text as feedback if no JSON found
+    return {"can_proceed": False, "feedback": text, "metadata": {}}
+
+
+@timed_node("sanity_checker")
+@node_deadline("sanity_checker")
+async def asanity_checker_node(state: AgentState) -> AgentState:
+    """True implementation of sanity checker using centralized model name."""
+    
+    logger.info("Sanity Checker Node started.")
+    
+    routing_prompt, messages = sanity_prompt(state["raw_input"])
+    llm = routed_chat_model("sanity_checker", routing_prompt)
+    
+    logger.debug(f"Sending prompt to LLM: {routing_prompt[:100]}...")
+    
+    check_cancelled()
+    try:
+        # Joins the live preview's call for this exact input, if it made one
+        response = await reuse_or_call("sanity_checker", routing_prompt, lambda: scheduled(lambda: llm.ainvoke(messages)))
+        text = response.content
+        logger.info(f"Received response from LLM (type: {type(text)}): {str(text)[:200]}...")
+    except (RunCancelled, DeadlineExceeded):
+        raise
+    except Exception as e:
+        logger.error(f"Error invoking LLM: {e}")
+        metrics.SANITY_DECISIONS.inc("error")
+        return {**state, "can_proceed": False, "feedback": f"Error calling AI: {e}", "metadata": {}}
+    
+    content = parse_sanity_response(text)
     
     can_proceed = content.get("can_proceed", False)
     feedback = content.get("feedback", "Sanity check failed to generate feedback.")
     logger.info(f"Sanity check result: can_proceed={can_proceed}, feedback={feedback}")
+    metrics.SANITY_DECISIONS.inc("accept" if can_proceed else "reject")
     
     return {
         **state,
@@ -111,4 +135,9 @@ def sanity_checker_node(state: AgentState) -> AgentState:
         "feedback": feedback,
         "metadata": content.get("metadata", {"maturity": None, "environment": None}),
         "messages": state.get("messages", []) + [{"role": "ai", "content": "Sanity check completed."}]
-    }
\ No newline at end of file
+    }
+
+
+def sanity_checker_node(state: AgentState) -> AgentState:
+    """Sync wrapper for tests and scripts."""
+    return run_sync(asanity_checker_node(state))
@@ -0,0 +1,87 @@
+"""
+Live extraction preview of a draft brief.
+
+preview_local() splits labeled sections ("Goal: ...") instantly, with no
+model call. apreview() waits out a typing pause, then prewarms the sanity
+check and the extraction with exactly the prompts the real submission will
+send, so submitting the same draft joins those calls instead of starting
+over (see src/utils/prewarm.py). Cancelling a stale preview releases its
+calls unless a submission has already joined them. Preview calls run at
+background priority, so speculative work never holds up a real run's calls.
+"""
+
+import os
+import asyncio
+import logging
+from typing import TypedDict, Dict, Optional
+
+from src.llm import routed_chat_model
+from src.knowledge_base import PRD_COMPONENT_NAMES, split_labeled_input
+from src.nodes.sanity_checker import sanity_prompt, parse_sanity_response
+from src.nodes.component_master import (
+    CHUNKED_EXTRACTION_THRESHOLD,
+    aextract_components,
+    extraction_prompt,
+)
+from src.utils.prewarm import prewarm, release
+from src.utils.scheduler import priority_scope, scheduled
+
+logger = logging.getLogger(__name__)
+
+PREVIEW_DEBOUNCE = float(os.environ.get("SPEC_PREVIEW_DEBOUNCE", "0.8"))
+# Drafts shorter than this only get the local preview
+PREVIEW_MIN_WORDS = int(os.environ.get("SPEC_PREVIEW_MIN_WORDS", "8"))
+
+
+class PreviewResult(TypedDict):
+    draft: str
+    components: Dict[str, Optional[str]]
+    source: str  # "local" | "model"
+    can_proceed: Optional[bool]
+    feedback: Optional[str]
+
+
+def preview_local(draft: str) -> PreviewResult:
+    components = {name: None for name in PRD_COMPONENT_NAMES}
+    components.update(split_labeled_input(draft))
+    return {"draft": draft, "components": components, "source": "local", "can_proceed": None, "feedback": None}
+
+
+def wants_model_preview(draft: str) -> bool:
+    """Long drafts take the chunked extraction path, which isn't prewarmed."""
+    return len(draft.split()) >= PREVIEW_MIN_WORDS and len(draft) <= CHUNKED_EXTRACTION_THRESHOLD
+
+
+async def apreview(draft: str) -> PreviewResult:
+    """Debounced model preview of a draft, sharing its calls with a later submission of the same text."""
+    await asyncio.sleep(PREVIEW_DEBOUNCE)
+
+    empty = {name: None for name in PRD_COMPONENT_NAMES}
+    routing_prompt, messages = sanity_prompt(draft)
+    llm = routed_chat_model("sanity_checker", routing_prompt)
+    logger.info(f"preview: Prewarming sanity check and extraction for a {len(draft)} char draft")
+
+    try:
+        # The prewarmed tasks copy this context, so they keep background priority
+        with priority_scope("background"):
+            response, components = await asyncio.gather(
+                prewarm("sanity_checker", routing_prompt, lambda: scheduled(lambda: llm.ainvoke(messages))),
+                aextract_components(draft, dict(empty), prewarming=True),
+                return_exceptions=True,
+            )
+    except asyncio.CancelledError:
+        release("sanity_checker", routing_prompt)
+        release("component_master", extraction_prompt(draft, empty))
+        raise
+
+    result = preview_local(draft)
+    if isinstance(components, Exception):
+        logger.warning(f"preview: Extraction failed, keeping the local preview: {components}")
+    else:
+        result["components"] = components
+        result["source"] = "model"
+    if not isinstance(response, Exception):
+        verdict = parse_sanity_response(response.content)
+        result["can_proceed"] = verdict.get("can_proceed", False)
+        result["feedback"] = verdict.get("feedback")
+    return result
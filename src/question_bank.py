@@ -0,0 +1,146 @@
+"""
+Local follow-up question bank, one entry per PRD component.
+
+Each component lists the signals its description in PRD_COMPONENT_DESCRIPTIONS
+calls for (a timeline for Goal, numbers for Metrics, channels for GTM, ...).
+local_questions() checks a component's text for those signals and asks about
+the missing ones, instantly and without a model call. merge_questions()
+folds the detailer's questions in once they arrive, keeping any local
+question the user has already answered in place.
+"""
+
+import re
+from typing import TypedDict, Dict, Iterable, List, Optional
+
+MAX_QUESTIONS = 3
+
+_NUMBER = r"\d|\bone\b|\btwo\b|\bthree\b|\bfour\b|\bfive\b|\bten\b|\bdozen|\bhundred|\bthousand|\bmillion|\bhalf\b|\bdouble\b|percent|%"
+_TIMELINE = r"\b(by|within|before|until)\b.{0,30}\b(week|month|quarter|year|day|launch|release|20\d\d)|\bq[1-4]\b|\bdeadline|\bmilestone|\b(january|february|march|april|may|june|july|august|september|october|november|december)\b"
+
+
+class Signal(TypedDict):
+    name: str
+    pattern: str  # regex searched case-insensitively; a match means the signal is present
+    question: str
+
+
+QUESTION_BANK: Dict[str, List[Signal]] = {
+    "Goal": [
+        {"name": "timeline", "pattern": _TIMELINE,
+         "question": "By when should this goal be reached (a date, quarter or milestone)?"},
+        {"name": "target", "pattern": _NUMBER,
+         "question": "What measurable target tells you the goal has been achieved?"},
+        {"name": "beneficiary", "pattern": r"\b(users?|customers?|teams?|people|clients?|businesses|owners?|staff|members?|patients?|families|households)\b",
+         "question": "Who benefits most directly when this goal is met?"},
+    ],
+    "Problem Statement": [
+        {"name": "affected", "pattern": r"\b(users?|customers?|teams?|people|clients?|businesses|owners?|staff|members?|patients?|families|households|managers?|employees)\b",
+         "question": "Who experiences this problem, and in what situation?"},
+        {"name": "impact", "pattern": _NUMBER + r"|\b(cost|lose|lost|waste|hours|revenue|churn|delay)",
+         "question": "How often does the problem occur, and what does it cost in time or money?"},
+        {"name": "workaround", "pattern": r"\b(today|currently|now|manual(ly)?|spreadsheets?|workarounds?|paper|email|existing)\b",
+         "question": "How do people deal with this today, and why is that not good enough?"},
+    ],
+    "User Cohort": [
+        {"name": "segment", "pattern": _NUMBER + r"|\b(small|mid-size|large|enterprise|smb|startups?|independent)\b",
+         "question": "How large is this cohort, and which segment or company size do you target first?"},
+        {"name": "priority", "pattern": r"\b(primary|first|initial|early adopters?|beta|pilot|secondary|start with)\b",
+         "question": "Which of these users are the primary cohort for the first release?"},
+        {"name": "behavior", "pattern": r"\b(who|that|which)\b.{0,40}\b(use|uses|need|needs|want|wants|manage|manages|run|runs|buy|buys|work|works)\b",
+         "question": "What behaviour or need defines someone in this cohort?"},
+    ],
+    "Metrics": [
+        {"name": "target", "pattern": _NUMBER,
+         "question": "What numeric target should each metric reach?"},
+        {"name": "baseline", "pattern": r"\b(baseline|currently|today|from\b.{0,20}\bto\b|compared to|versus|vs\.?)\b",
+         "question": "What is the current baseline for these metrics?"},
+        {"name": "window", "pattern": r"\b(per|each|every)\s+(day|week|month|quarter|year|user|team)|\b(daily|weekly|monthly|quarterly|annual(ly)?)\b|" + _TIMELINE,
+         "question": "Over what time window will each metric be measured?"},
+    ],
+    "Solutions": [
+        {"name": "scope", "pattern": r"\b(mvp|first release|v1|phase|initial|start with|minimum|pilot|beta)\b",
+         "question": "What is in scope for the first release, and what is deliberately left out?"},
+        {"name": "dependencies", "pattern": r"\b(integrat\w*|api|sdk|platform|partner|existing|sync|import)\b",
+         "question": "Which systems or integrations does this solution depend on?"},
+        {"name": "alternatives", "pattern": r"\b(instead of|rather than|alternative|compared to|versus|vs\.?|unlike)\b",
+         "question": "What alternatives did you consider, and why is this approach better?"},
+    ],
+    "Risks": [
+        {"name": "mitigation", "pattern": r"\b(mitigat\w*|fallback|contingency|reduce|address|plan|avoid|prevent|monitor)\b",
+         "question": "How will each risk be mitigated, and what is the fallback if it happens?"},
+        {"name": "severity", "pattern": r"\b(high|medium|low|likely|unlikely|likelihood|severity|impact|critical|major|minor)\b",
+         "question": "Which risk is most likely or most severe?"},
+        {"name": "owner", "pattern": r"\b(owner|owned|responsible|team|lead|accountable)\b",
+         "question": "Who owns tracking and mitigating these risks?"},
+    ],
+    "GTM": [
+        {"name": "channels", "pattern": r"\b(channels?|marketplace|ads?|advertising|seo|search|partner\w*|sales|referral\w*|email|social|content|app stores?|webinars?|communit\w+|influencers?|associations?|events?|fairs?)\b",
+         "question": "Through which channels will you reach the first customers?"},
+        {"name": "pricing", "pattern": r"\b(pric\w*|free|tier|subscriptions?|plans?|per (seat|user|month|year)|commission|fee)\b|\$",
+         "question": "What is the pricing model at launch?"},
+        {"name": "rollout", "pattern": r"\b(launch|beta|pilot|phase|rollout|roll out|waitlist|general availability|ga)\b|" + _TIMELINE,
+         "question": "What are the rollout phases and their dates?"},
+    ],
+    "Others": [
+        {"name": "compliance", "pattern": r"\b(legal|complian\w*|gdpr|hipaa|soc ?2|privacy|regulat\w*|licens\w*|terms)\b",
+         "question": "Are there legal, privacy or compliance requirements to plan for?"},
+        {"name": "budget", "pattern": r"\b(budget|cost|funding|spend|headcount|resourc\w*)\b|\$",
+         "question": "What budget or resources are available for this work?"},
+    ],
+}
+
+_COMPILED = {
+    component: [(signal, re.compile(signal["pattern"], re.IGNORECASE)) for signal in signals]
+    for component, signals in QUESTION_BANK.items()
+}
+
+
+def missing_signals(component: str, text: Optional[str]) -> List[Signal]:
+    text = text or ""
+    return [signal for signal, pattern in _COMPILED.get(component, []) if not pattern.search(text)]
+
+
+def local_questions(component: str, text: Optional[str], limit: int = MAX_QUESTIONS) -> List[str]:
+    """Questions for the signals missing from a component's text, in bank order."""
+    if not text or not text.strip():
+        return []
+    return [signal["question"] for signal in missing_signals(component, text)][:limit]
+
+
+def _tokens(question: str) -> set:
+    return set(re.findall(r"[a-z]{4,}", question.lower()))
+
+
+def _similar(a: str, b: str, threshold: float = 0.5) -> bool:
+    ta, tb = _tokens(a), _tokens(b)
+    if not ta or not tb:
+        return a.strip().lower() == b.strip().lower()
+    return len(ta & tb) / len(ta | tb) >= threshold
+
+
+def merge_questions(
+    local: List[str],
+    model: List[str],
+    answered: Iterable[int] = (),
+    limit: int = MAX_QUESTIONS,
+) -> List[str]:
+    """
+    Model questions replace the local ones, except local questions the user
+    has answered: those keep their index, since answer widgets are keyed by
+    it. Near-duplicates of kept questions are dropped; if the model asked too
+    few to reach a kept index, unanswered local questions pad the gap.
+    """
+    kept = {i: local[i] for i in answered if 0 <= i < len(local)}
+    fresh = iter([q for q in model if not any(_similar(q, k) for k in kept.values())])
+    padding = iter([q for i, q in enumerate(local) if i not in kept])
+    last_kept = max(kept) if kept else -1
+
+    merged = []
+    for i in range(max(limit, last_kept + 1)):
+        question = kept.get(i) or next(fresh, None)
+        if question is None and i < last_kept:
+            question = next(padding)
+        if question is None:
+            break
+        merged.append(question)
+    return merged
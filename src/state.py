@@ -1,5 +1,7 @@
 from typing import TypedDict, List, Dict, Any, Optional
 
+from src.knowledge_base import PRD_COMPONENT_NAMES
+
 
 class AgentState(TypedDict):
     raw_input: str
@@ -7,6 +9,7 @@ class AgentState(TypedDict):
     can_proceed: bool
     metadata: Dict[str, Optional[str]]
     feedback: str
+    edge_verdict: Optional[Dict[str, Any]]  # decisive on-device sanity verdict, tagged with the hash of the input it judged
     ui_queue: List[Dict[str, Any]]
     messages: List[Dict[str, Any]]
     
@@ -14,9 +17,37 @@ class AgentState(TypedDict):
     gaps: List[str]
     last_updated_component: Optional[str]
     is_spec_complete: bool
+    compactions: Dict[str, int]  # component_name -> version history entry holding its full text
     
     awaiting_user_input: bool
     
     detailed_components: Dict[str, Dict[str, Any]]
+    detail_status: Dict[str, str]  # component_name -> "ok" | "failed"
+    detail_sources: Dict[str, str]  # component_name -> hash of the component text that was detailed
     is_detailed: bool
     question_answers: Dict[str, Dict[int, str]]  # component_name -> {question_idx: answer}
+
+
+def initial_state() -> AgentState:
+    """State of a new spec thread, before any input."""
+    return {
+        "raw_input": "",
+        "current_spec": "",
+        "can_proceed": False,
+        "metadata": {},
+        "feedback": "",
+        "edge_verdict": None,
+        "ui_queue": [],
+        "messages": [],
+        "components": {name: None for name in PRD_COMPONENT_NAMES},
+        "gaps": PRD_COMPONENT_NAMES.copy(),
+        "last_updated_component": None,
+        "is_spec_complete": False,
+        "compactions": {},
+        "awaiting_user_input": True,
+        "detailed_components": {},
+        "detail_status": {},
+        "detail_sources": {},
+        "is_detailed": False,
+        "question_answers": {},
+    }
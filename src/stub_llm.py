@@ -0,0 +1,154 @@
+"""
+Deterministic offline chat model used when SPEC_WRITER_LLM_BACKEND=stub.
+
+Recognises each node's prompt and answers with well-formed JSON so the full
+graph can run without a Gemini key (load tests, local profiling).
+SPEC_WRITER_STUB_LATENCY adds a per-call delay in seconds, and
+SPEC_WRITER_STUB_TOKEN_LATENCY a delay per output token, like decoding time.
+"""
+
+import os
+import re
+import json
+import time
+import asyncio
+from typing import Any, Dict, List, Optional
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from src.knowledge_base import PRD_COMPONENT_NAMES, split_labeled_input
+
+LATENCY_ENV = "SPEC_WRITER_STUB_LATENCY"
+TOKEN_LATENCY_ENV = "SPEC_WRITER_STUB_TOKEN_LATENCY"
+# Model label for telemetry and cassette entries, so stub numbers aren't read as Gemini's
+STUB_MODEL_NAME = "spec-writer-stub"
+
+
+def _section(prompt: str, header: str, next_header: str) -> str:
+    start = prompt.find(header)
+    if start == -1:
+        return ""
+    start += len(header)
+    end = prompt.find(next_header, start)
+    return prompt[start:end if end != -1 else None].strip()
+
+
+def _extraction_response(prompt: str) -> Dict[str, Any]:
+    try:
+        current = json.loads(_section(prompt, "## Current Components State:", "## New User Input to Integrate:"))
+    except json.JSONDecodeError:
+        current = {}
+    raw_input = _section(prompt, "## New User Input to Integrate:", "## Output Format:")
+
+    components = {name: current.get(name) for name in PRD_COMPONENT_NAMES}
+    for name, text in split_labeled_input(raw_input).items():
+        # Gap fills resend the current text, so a labeled section replaces it
+        components[name] = text
+    return {"components": components}
+
+
+def _detail_response(prompt: str) -> Dict[str, Any]:
+    name = _section(prompt, "## Component to Detail:", "Current Text:").strip("* \n")
+    text = _section(prompt, "Current Text:", "## Output Format:")
+    return {
+        "text": text,
+        "questions": [
+            f"What constraints apply to the {name.lower()}?",
+            f"Who owns the {name.lower()} decisions?",
+        ],
+    }
+
+
+def _answers(prompt: str) -> List[str]:
+    return re.findall(r"^A: (.*)$", _section(prompt, "### User's Answers to Follow-up Questions:", "## Instructions:"), re.MULTILINE)
+
+
+def _refine_response(prompt: str) -> Dict[str, Any]:
+    text = _section(prompt, "### Current Text:", "### User's Answers")
+    return {"text": " ".join([text] + _answers(prompt))}
+
+
+def _patch_response(prompt: str) -> Dict[str, Any]:
+    # Same resulting text as _refine_response, sent as an edit
+    return {"edits": [{"op": "append", "text": " ".join(_answers(prompt))}]}
+
+
+def _compact_response(prompt: str) -> Dict[str, Any]:
+    text = _section(prompt, "## Current Text:", "## Instructions:")
+    target = int(re.search(r"Target length: about (\d+) words", prompt).group(1))
+    kept, seen = [], set()
+    for sentence in re.split(r"(?<=[.!?])\s+", text):
+        if sentence.lower() not in seen:
+            seen.add(sentence.lower())
+            kept.append(sentence)
+    return {"text": " ".join(" ".join(kept).split()[:target])}
+
+
+def respond(prompt: str) -> str:
+    """Produce the JSON reply a node expects for its prompt."""
+    if "## New User Input to Integrate:" in prompt:
+        payload = _extraction_response(prompt)
+    elif "## Component to Detail:" in prompt:
+        payload = _detail_response(prompt)
+    elif "## Component to Compact:" in prompt:
+        payload = _compact_response(prompt)
+    elif "User's Answers to Follow-up Questions" in prompt and '"edits"' in prompt:
+        payload = _patch_response(prompt)
+    elif "User's Answers to Follow-up Questions" in prompt:
+        payload = _refine_response(prompt)
+    elif "can_proceed" in prompt:
+        payload = {
+            "can_proceed": True,
+            "feedback": "Stub backend accepts all input.",
+            "metadata": {"maturity": "Greenfield", "environment": "Web"},
+        }
+    else:
+        payload = {"text": prompt[-200:]}
+    return json.dumps(payload)
+
+
+class StubChatModel(BaseChatModel):
+    latency: float = 0.0
+    token_latency: float = 0.0
+
+    def __init__(self, **kwargs: Any):
+        kwargs.setdefault("latency", float(os.environ.get(LATENCY_ENV, "0") or 0))
+        kwargs.setdefault("token_latency", float(os.environ.get(TOKEN_LATENCY_ENV, "0") or 0))
+        super().__init__(**kwargs)
+
+    @property
+    def _llm_type(self) -> str:
+        return STUB_MODEL_NAME
+
+    def _result(self, messages: List[BaseMessage]) -> ChatResult:
+        prompt = messages[-1].content if messages else ""
+        if not isinstance(prompt, str):
+            prompt = json.dumps(prompt)
+        content = respond(prompt)
+        prompt_chars = sum(len(str(m.content)) for m in messages)
+        usage = {
+            "input_tokens": prompt_chars // 4,
+            "output_tokens": len(content) // 4,
+            "total_tokens": (prompt_chars + len(content)) // 4,
+        }
+        message = AIMessage(content=content, usage_metadata=usage)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _delay(self, result: ChatResult) -> float:
+        return self.latency + self.token_latency * result.generations[0].message.usage_metadata["output_tokens"]
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        result = self._result(messages)
+        delay = self._delay(result)
+        if delay:
+            time.sleep(delay)
+        return result
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        result = self._result(messages)
+        delay = self._delay(result)
+        if delay:
+            await asyncio.sleep(delay)
+        return result
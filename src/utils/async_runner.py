@@ -0,0 +1,60 @@
+"""
+Process-wide background event loop for graph runs.
+
+Streamlit script threads submit coroutines here instead of driving a shared
+loop with run_until_complete, so concurrent sessions never collide on the
+same loop and a run survives the script rerun that renders its Cancel button.
+"""
+
+import asyncio
+import threading
+import concurrent.futures
+from typing import Any, Coroutine, Optional
+
+
+class BackgroundLoop:
+    def __init__(self, name: str = "spec-graph-loop"):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._name = name
+        self._lock = threading.Lock()
+
+    def _ensure_started(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None or self._loop.is_closed():
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name=self._name, daemon=True)
+                self._thread.start()
+            return self._loop
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        return self._ensure_started()
+
+    def submit(self, coro: Coroutine) -> concurrent.futures.Future:
+        """Schedule a coroutine; cancelling the returned future cancels the task."""
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_started())
+
+    def run(self, coro: Coroutine, timeout: Optional[float] = None) -> Any:
+        """Blocking helper for scripts and tests."""
+        return self.submit(coro).result(timeout)
+
+
+_background_loop = BackgroundLoop()
+
+
+def get_background_loop() -> BackgroundLoop:
+    return _background_loop
+
+
+def run_sync(coro: Coroutine) -> Any:
+    """
+    Run a coroutine to completion from synchronous code (tests, scripts,
+    executor threads). Must not be called from a thread with a running loop.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    coro.close()
+    raise RuntimeError("run_sync() called from a running event loop; await the coroutine instead")
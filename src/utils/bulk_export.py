@@ -0,0 +1,222 @@
+"""
+Bulk export of many specs into one zip archive.
+
+Rendering (ReportLab PDF layout above all) is CPU-bound, so specs are
+rendered on a process pool and written into the archive in completion
+order, one spec's files at a time. A spec that fails, or a format that
+fails for one spec, is recorded in the archive's manifest.json and the
+export carries on with the rest.
+"""
+
+import os
+import re
+import json
+import time
+import logging
+import zipfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import TypedDict, Any, BinaryIO, Callable, Dict, Iterable, List, Optional, Union
+
+from src.utils.exporter import EXPORT_FORMATS, export_formats
+from src.utils.document import DEFAULT_TITLE
+
+logger = logging.getLogger(__name__)
+
+BULK_EXPORT_WORKERS = int(os.environ.get("SPEC_BULK_EXPORT_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Formats that are already compressed gain nothing from deflate
+_STORED_FORMATS = {"pdf", "docx"}
+
+
+class BulkSpec(TypedDict):
+    spec_id: str
+    title: str
+    components: Dict[str, Optional[str]]
+    detailed_components: Dict[str, Dict[str, Any]]
+
+
+class BulkExportProgress(TypedDict):
+    done: int
+    total: int
+    spec_id: str
+    title: str
+    error: Optional[str]
+
+
+class BulkExportResult(TypedDict):
+    exported: List[str]
+    failed: Dict[str, str]
+    files: int
+    seconds: float
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_export_pool() -> ProcessPoolExecutor:
+    """Process-wide render pool, started on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a process that runs Streamlit or the API loop thread is unsafe
+            _pool = ProcessPoolExecutor(max_workers=BULK_EXPORT_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _discard_pool(pool: ProcessPoolExecutor) -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def load_spec(spec_id: str) -> Optional[BulkSpec]:
+    """A stored spec from the library, else the thread's latest checkpoint."""
+    from src.utils.spec_library import get_spec_library, derive_title
+
+    stored = get_spec_library().get_spec(spec_id)
+    if stored is not None:
+        return {
+            "spec_id": spec_id,
+            "title": stored["title"],
+            "components": stored["components"],
+            "detailed_components": stored.get("detailed_components") or {},
+        }
+
+    from src.graph import app
+    from src.utils import memory_budget
+
+    memory_budget.ensure_resident(spec_id)
+    values = app.get_state({"configurable": {"thread_id": spec_id}}).values
+    if not values or not any((values.get("components") or {}).values()):
+        return None
+    return {
+        "spec_id": spec_id,
+        "title": derive_title(values["components"]),
+        "components": values["components"],
+        "detailed_components": values.get("detailed_components") if values.get("is_detailed") else {},
+    }
+
+
+def render_spec(spec: BulkSpec, formats: List[str]) -> Dict[str, Any]:
+    """Worker side: {"files": {fmt: bytes}, "errors": {fmt: message}}. Runs in a pool process."""
+    rendered = export_formats(spec["components"], spec["detailed_components"] or None, formats, title=spec["title"] or DEFAULT_TITLE)
+    files, errors = {}, {}
+    for fmt, content in rendered.items():
+        if isinstance(content, Exception):
+            # Exceptions from renderers may not pickle; send the message back
+            errors[fmt] = f"{type(content).__name__}: {content}"
+        else:
+            files[fmt] = content.encode("utf-8") if isinstance(content, str) else content
+    return {"files": files, "errors": errors}
+
+
+def archive_stem(spec: BulkSpec) -> str:
+    slug = re.sub(r"[^a-z0-9]+", "-", (spec["title"] or "spec").lower()).strip("-")[:60] or "spec"
+    return f"{slug}-{re.sub(r'[^A-Za-z0-9]', '', spec['spec_id'])[-8:]}"
+
+
+def bulk_export(
+    specs: Iterable[Union[str, BulkSpec]],
+    formats: Iterable[str] = ("markdown", "pdf"),
+    out: Union[str, BinaryIO] = "specs.zip",
+    on_progress: Optional[Callable[[BulkExportProgress], None]] = None,
+    parallel: bool = True,
+) -> BulkExportResult:
+    """
+    Render each spec (a thread/spec id, or a BulkSpec) in every format and
+    write them to a zip at out (a path or writable binary file).
+    on_progress is called in the calling thread as each spec is written.
+    parallel=False renders in this process instead of on the pool.
+    """
+    formats = list(formats)
+    unknown = [fmt for fmt in formats if fmt not in EXPORT_FORMATS]
+    if unknown:
+        raise ValueError(f"Unknown export formats: {', '.join(unknown)}")
+
+    started = time.perf_counter()
+    result: BulkExportResult = {"exported": [], "failed": {}, "files": 0, "seconds": 0.0}
+    manifest: List[Dict[str, Any]] = []
+    jobs: List[BulkSpec] = []
+    specs = list(specs)
+    total = len(specs)
+
+    def report(spec_id: str, title: str, error: Optional[str]) -> None:
+        if on_progress is not None:
+            done = len(result["exported"]) + len(result["failed"])
+            on_progress({"done": done, "total": total, "spec_id": spec_id, "title": title, "error": error})
+
+    def fail(spec_id: str, title: str, error: str) -> None:
+        result["failed"][spec_id] = error
+        manifest.append({"spec_id": spec_id, "title": title, "files": [], "error": error})
+        logger.warning(f"bulk_export: {spec_id} failed: {error}")
+        report(spec_id, title, error)
+
+    with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        def write(spec: BulkSpec, rendered: Dict[str, Any]) -> None:
+            stem = archive_stem(spec)
+            names = []
+            for fmt, data in rendered["files"].items():
+                name = f"{stem}.{EXPORT_FORMATS[fmt][2]}"
+                compression = zipfile.ZIP_STORED if fmt in _STORED_FORMATS else zipfile.ZIP_DEFLATED
+                archive.writestr(name, data, compress_type=compression)
+                names.append(name)
+            result["files"] += len(names)
+            error = "; ".join(f"{fmt}: {message}" for fmt, message in rendered["errors"].items()) or None
+            manifest.append({"spec_id": spec["spec_id"], "title": spec["title"], "files": names, "error": error})
+            if names:
+                result["exported"].append(spec["spec_id"])
+            else:
+                result["failed"][spec["spec_id"]] = error or "nothing rendered"
+            report(spec["spec_id"], spec["title"], error)
+
+        for item in specs:
+            if isinstance(item, str):
+                try:
+                    spec = load_spec(item)
+                except Exception as e:
+                    fail(item, "", f"could not load: {e}")
+                    continue
+                if spec is None:
+                    fail(item, "", "no stored spec or thread with this id")
+                    continue
+                jobs.append(spec)
+            else:
+                jobs.append(item)
+
+        # A single spec isn't worth the round trip to the pool
+        if not parallel or BULK_EXPORT_WORKERS <= 1 or len(jobs) <= 1:
+            for spec in jobs:
+                try:
+                    write(spec, render_spec(spec, formats))
+                except Exception as e:
+                    fail(spec["spec_id"], spec["title"], f"{type(e).__name__}: {e}")
+        else:
+            pool = get_export_pool()
+            pending = {pool.submit(render_spec, spec, formats): spec for spec in jobs}
+            for future in as_completed(pending):
+                spec = pending[future]
+                try:
+                    rendered = future.result()
+                except BrokenProcessPool:
+                    _discard_pool(pool)
+                    fail(spec["spec_id"], spec["title"], "export worker process died")
+                    continue
+                except Exception as e:
+                    fail(spec["spec_id"], spec["title"], f"{type(e).__name__}: {e}")
+                    continue
+                write(spec, rendered)
+
+        archive.writestr("manifest.json", json.dumps({"formats": formats, "specs": manifest}, indent=2))
+
+    result["seconds"] = time.perf_counter() - started
+    logger.info(
+        f"bulk_export: {len(result['exported'])}/{total} specs, {result['files']} files "
+        f"in {result['seconds']:.2f}s ({len(result['failed'])} failed)"
+    )
+    return result
@@ -0,0 +1,124 @@
+"""
+Deadlines and cooperative cancellation for graph runs.
+
+A CancelToken is bound to the current context for the duration of a run.
+Nodes call check_cancelled() between LLM calls; it raises once the run is
+cancelled or the current node's deadline has passed. Async nodes are also
+bounded with asyncio.wait_for so a stalled await is interrupted directly.
+"""
+
+import os
+import time
+import asyncio
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+
+def _env_seconds(name: str, default: float) -> float:
+    return float(os.environ.get(name, default))
+
+
+# Per-node deadlines in seconds, overridable with SPEC_DEADLINE_<NODE>
+NODE_DEADLINES: Dict[str, float] = {
+    node: _env_seconds(f"SPEC_DEADLINE_{node.upper()}", default)
+    for node, default in {
+        "sanity_checker": 30,
+        "component_master": 90,
+        "input_gatherer": 5,
+        "detailer": 180,
+        "refiner": 120,
+    }.items()
+}
+
+# Per LLM call timeout (passed to the chat model) and whole-run deadline
+LLM_CALL_TIMEOUT = _env_seconds("SPEC_LLM_TIMEOUT", 45)
+LLM_MAX_RETRIES = int(os.environ.get("SPEC_LLM_MAX_RETRIES", "2"))
+RUN_DEADLINE = _env_seconds("SPEC_RUN_DEADLINE", 300)
+
+
+class RunCancelled(Exception):
+    """The user cancelled the in-flight run."""
+
+
+class DeadlineExceeded(Exception):
+    """A node or run exceeded its configured deadline."""
+
+
+class CancelToken:
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self) -> None:
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+
+_current_token: contextvars.ContextVar[Optional[CancelToken]] = contextvars.ContextVar("spec_cancel", default=None)
+_node_deadline: contextvars.ContextVar[Optional[tuple]] = contextvars.ContextVar("spec_node_deadline", default=None)
+
+
+@contextmanager
+def cancellation_scope(token: CancelToken):
+    """Bind a token to this context; executor threads started inside inherit it."""
+    reset = _current_token.set(token)
+    try:
+        yield token
+    finally:
+        _current_token.reset(reset)
+
+
+def check_cancelled() -> None:
+    """Raise if the current run was cancelled or the node deadline passed."""
+    token = _current_token.get()
+    if token is not None and token.cancelled:
+        raise RunCancelled("Run cancelled by user")
+    deadline = _node_deadline.get()
+    if deadline is not None and time.monotonic() > deadline[1]:
+        raise DeadlineExceeded(f"{deadline[0]} exceeded its {NODE_DEADLINES[deadline[0]]:.0f}s deadline")
+
+
+def node_deadline(name: str):
+    """Decorator applying NODE_DEADLINES[name] to a sync or async node."""
+    def decorator(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                seconds = NODE_DEADLINES[name]
+                reset = _node_deadline.set((name, time.monotonic() + seconds))
+                try:
+                    check_cancelled()
+                    return await asyncio.wait_for(fn(*args, **kwargs), seconds)
+                except asyncio.TimeoutError:
+                    raise DeadlineExceeded(f"{name} exceeded its {seconds:.0f}s deadline")
+                finally:
+                    _node_deadline.reset(reset)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            reset = _node_deadline.set((name, time.monotonic() + NODE_DEADLINES[name]))
+            try:
+                check_cancelled()
+                return fn(*args, **kwargs)
+            finally:
+                _node_deadline.reset(reset)
+        return wrapper
+    return decorator
+
+
+async def bounded_run(coro, token: CancelToken):
+    """Apply the run deadline and propagate cancellation to executor threads."""
+    try:
+        return await asyncio.wait_for(coro, RUN_DEADLINE)
+    except asyncio.TimeoutError:
+        token.cancel()
+        raise DeadlineExceeded(f"Run exceeded its {RUN_DEADLINE:.0f}s deadline")
+    except asyncio.CancelledError:
+        token.cancel()
+        raise
@@ -0,0 +1,174 @@
+"""
+Token budget for the component extraction prompt.
+
+Extraction merges new input into the current components and is told to
+preserve what is there, so components only grow and every later prompt gets
+larger. Before the prompt is sent its size is estimated, and components over
+COMPONENT_TOKEN_BUDGET (or the largest ones, while the whole prompt is over
+EXTRACTION_TOKEN_BUDGET) are compacted into dense summaries of about
+COMPACTION_TARGET_TOKENS. Extraction results are checked the same way, so
+the stored components stay within budget for the next prompt.
+
+The full text is recorded in the thread's version history before it is
+replaced, so exports can still be made from the original. If the model's
+summary is unusable, only repeated sentences are dropped; a component that
+doesn't shrink that way is left as it is rather than truncated.
+"""
+
+import os
+import math
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.messages import HumanMessage
+
+from src.knowledge_base import PRD_COMPONENT_DESCRIPTIONS, MIN_WORDS_THRESHOLD
+from src.utils.llm_json import ainvoke_json
+from src.utils.cancellation import RunCancelled, DeadlineExceeded
+
+logger = logging.getLogger(__name__)
+
+CHARS_PER_TOKEN = float(os.environ.get("SPEC_CHARS_PER_TOKEN", "4"))
+COMPONENT_TOKEN_BUDGET = int(os.environ.get("SPEC_COMPONENT_TOKEN_BUDGET", "800"))
+COMPACTION_TARGET_TOKENS = int(os.environ.get("SPEC_COMPACTION_TARGET_TOKENS", str(COMPONENT_TOKEN_BUDGET // 2)))
+EXTRACTION_TOKEN_BUDGET = int(os.environ.get("SPEC_EXTRACTION_TOKEN_BUDGET", "8000"))
+
+COMPACTION_PROMPT = """You are a PRD editor. Rewrite one component of a product spec as a dense summary.
+
+## Component to Compact: {component_name}
+Definition: {component_description}
+
+## Current Text:
+{text}
+
+## Instructions:
+1. Keep every distinct fact: numbers, dates, targets, names, segments, constraints and decisions.
+2. Remove repetition, filler and restated points. Merge overlapping sentences.
+3. Do not add anything that is not in the current text.
+4. Target length: about {target_words} words.
+
+## Output Format:
+Return a JSON object: {{"text": "the compacted component text"}}
+"""
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """Rough token count (Gemini averages about 4 characters per token)."""
+    if not text:
+        return 0
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def components_to_compact(prompt_tokens: int, components: Dict[str, Optional[str]]) -> List[str]:
+    """
+    Components over the per-component budget, then the largest remaining
+    ones until the estimated prompt fits EXTRACTION_TOKEN_BUDGET.
+    """
+    sizes = {name: estimate_tokens(text) for name, text in components.items()}
+    selected = [name for name, size in sizes.items() if size > COMPONENT_TOKEN_BUDGET]
+    projected = prompt_tokens - sum(sizes[name] - COMPACTION_TARGET_TOKENS for name in selected)
+    for name in sorted(sizes, key=sizes.get, reverse=True):
+        if projected <= EXTRACTION_TOKEN_BUDGET:
+            break
+        if name in selected or sizes[name] <= COMPACTION_TARGET_TOKENS:
+            continue
+        selected.append(name)
+        projected -= sizes[name] - COMPACTION_TARGET_TOKENS
+    return selected
+
+
+def local_compaction(text: str) -> Optional[str]:
+    """Lossless fallback: the text without repeated sentences, or None if nothing repeats."""
+    from src.nodes.component_master import merge_component_texts
+
+    deduplicated = (merge_component_texts([text]) or "").strip()
+    return deduplicated if deduplicated and len(deduplicated) < len(text.strip()) else None
+
+
+async def acompact_component(name: str, text: str) -> Optional[str]:
+    """
+    Dense summary of one component, or the local fallback if the model's is
+    unusable. None when neither shortens it without dropping facts.
+    """
+    from src.llm import routed_chat_model
+
+    target_words = max(MIN_WORDS_THRESHOLD * 2, int(COMPACTION_TARGET_TOKENS * CHARS_PER_TOKEN / 6))
+    prompt = COMPACTION_PROMPT.format(
+        component_name=name,
+        component_description=PRD_COMPONENT_DESCRIPTIONS.get(name, ""),
+        text=text,
+        target_words=target_words,
+    )
+    try:
+        llm = routed_chat_model("compactor", prompt)
+        compacted = (await ainvoke_json(llm, [HumanMessage(content=prompt)], default={})).get("text") or ""
+    except (RunCancelled, DeadlineExceeded):
+        raise
+    except Exception as e:
+        logger.warning(f"context_guard: Compacting {name} failed, using local compaction: {e}")
+        compacted = ""
+
+    # A summary that didn't shrink, or shrank below the gap threshold, isn't kept
+    if not isinstance(compacted, str) or len(compacted.split()) < MIN_WORDS_THRESHOLD or len(compacted) >= len(text):
+        logger.warning(f"context_guard: No usable summary of {name}; dropping repeated sentences only")
+        return local_compaction(text)
+    return compacted.strip()
+
+
+def _thread_id() -> Optional[str]:
+    from langgraph.config import get_config
+
+    try:
+        return get_config().get("configurable", {}).get("thread_id")
+    except RuntimeError:
+        return None
+
+
+def _record_originals(thread_id: str, components: Dict[str, Optional[str]], detailed_components: Dict, names: List[str]) -> int:
+    from src.utils.versioning import get_version_store
+
+    store = get_version_store(thread_id)
+    version = store.record(components, detailed_components, label=f"Before compaction: {', '.join(names)}")
+    # Unchanged since the last recorded version, which already holds the full text
+    return version if version is not None else len(store) - 1
+
+
+async def aguard_components(
+    components: Dict[str, Optional[str]],
+    detailed_components: Optional[Dict] = None,
+    prompt_tokens: Optional[int] = None,
+) -> Tuple[Dict[str, Optional[str]], Dict[str, int]]:
+    """
+    Compact the components that are over budget. prompt_tokens is the
+    estimated size of the prompt the components are about to be sent in.
+    Returns (components, {name: version holding the full text}). Without a
+    thread (direct node calls) there is no history to keep the originals,
+    so nothing is compacted.
+    """
+    names = components_to_compact(prompt_tokens or 0, components)
+    if not names:
+        return components, {}
+
+    thread_id = _thread_id()
+    if thread_id is None:
+        logger.warning(f"context_guard: {', '.join(names)} over budget but no thread to keep the originals; not compacting")
+        return components, {}
+
+    print(f"=== CONTEXT GUARD: Compacting {', '.join(names)} ===")
+    results = await asyncio.gather(*(acompact_component(name, components[name]) for name in names))
+    compacted = {name: text for name, text in zip(names, results) if text}
+    for name in set(names) - set(compacted):
+        logger.warning(f"context_guard: {name} left at {estimate_tokens(components[name])} tokens; it can't be shortened without losing facts")
+    if not compacted:
+        return components, {}
+
+    version = await asyncio.to_thread(_record_originals, thread_id, components, detailed_components or {}, list(compacted))
+    guarded = dict(components)
+    for name, text in compacted.items():
+        logger.info(
+            f"context_guard: {name} compacted {estimate_tokens(components[name])} -> {estimate_tokens(text)} tokens "
+            f"(original in v{version})"
+        )
+        guarded[name] = text
+    return guarded, {name: version for name in compacted}
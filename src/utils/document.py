@@ -0,0 +1,112 @@
+"""
+Intermediate document model shared by every export format.
+
+The detailed-vs-raw selection over PRD_COMPONENT_NAMES happens once here;
+renderers in exporter.py only walk the resulting sections.
+"""
+
+import json
+import hashlib
+from collections import OrderedDict
+from datetime import datetime
+from typing import TypedDict, Dict, Any, List, Optional
+
+from src.knowledge_base import PRD_COMPONENT_NAMES
+from src.utils.telemetry import record_cache
+
+DEFAULT_TITLE = "Product Requirements Document"
+
+# Number of spec versions kept in the document cache
+DOCUMENT_CACHE_SIZE = 64
+
+
+class SpecSection(TypedDict):
+    name: str
+    text: Optional[str]
+    questions: List[str]
+
+
+class SpecDocument(TypedDict):
+    title: str
+    generated_at: str
+    is_detailed: bool
+    fingerprint: str
+    sections: List[SpecSection]
+
+
+_document_cache: "OrderedDict[str, SpecDocument]" = OrderedDict()
+_cache_stats = {"hits": 0, "misses": 0}
+
+
+def spec_fingerprint(
+    components: Dict[str, Optional[str]],
+    detailed_components: Optional[Dict[str, Dict[str, Any]]] = None,
+    title: str = DEFAULT_TITLE,
+) -> str:
+    """Stable hash identifying one version of a spec."""
+    payload = json.dumps(
+        {"title": title, "components": components, "detailed": detailed_components or {}},
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def _build_sections(
+    components: Dict[str, Optional[str]],
+    detailed_components: Optional[Dict[str, Dict[str, Any]]],
+) -> List[SpecSection]:
+    sections = []
+    for name in PRD_COMPONENT_NAMES:
+        if detailed_components and name in detailed_components:
+            detail = detailed_components[name]
+            text = detail.get("text") or components.get(name)
+            questions = list(detail.get("questions", []))
+        else:
+            text = components.get(name)
+            questions = []
+        sections.append({"name": name, "text": text, "questions": questions})
+    return sections
+
+
+def build_spec_document(
+    components: Dict[str, Optional[str]],
+    detailed_components: Optional[Dict[str, Dict[str, Any]]] = None,
+    title: str = DEFAULT_TITLE,
+) -> SpecDocument:
+    """
+    Build the document model for a spec version.
+    Results are cached by fingerprint, so exporting several formats of the
+    same version only traverses the components once.
+    """
+    fingerprint = spec_fingerprint(components, detailed_components, title)
+    cached = _document_cache.get(fingerprint)
+    if cached is not None:
+        _document_cache.move_to_end(fingerprint)
+        _cache_stats["hits"] += 1
+        record_cache("document", True)
+        return cached
+
+    _cache_stats["misses"] += 1
+    record_cache("document", False)
+    document: SpecDocument = {
+        "title": title,
+        "generated_at": datetime.now().strftime("%Y-%m-%d %H:%M"),
+        "is_detailed": bool(detailed_components),
+        "fingerprint": fingerprint,
+        "sections": _build_sections(components, detailed_components),
+    }
+    _document_cache[fingerprint] = document
+    while len(_document_cache) > DOCUMENT_CACHE_SIZE:
+        _document_cache.popitem(last=False)
+    return document
+
+
+def get_document_cache_stats() -> Dict[str, int]:
+    return {**_cache_stats, "size": len(_document_cache)}
+
+
+def clear_document_cache() -> None:
+    _document_cache.clear()
+    _cache_stats["hits"] = 0
+    _cache_stats["misses"] = 0
@@ -1,193 +1,332 @@
 """
-Export utilities for PRD spec to Markdown and PDF formats.
+Export utilities for PRD spec to Markdown, PDF, HTML, JSON and DOCX formats.
+Every format renders from the shared SpecDocument model in document.py.
 """
 
-from typing import Dict, Any, Optional
-from datetime import datetime
+import json
+from collections import OrderedDict
+from html import escape
+from typing import Dict, Any, Optional, Callable, Iterable, Union
 from io import BytesIO
 
-from src.knowledge_base import PRD_COMPONENT_NAMES
+from src.utils.document import SpecDocument, build_spec_document, DEFAULT_TITLE
+from src.utils.telemetry import record_cache
 
 
-def export_to_markdown(
-    components: Dict[str, Optional[str]],
-    detailed_components: Optional[Dict[str, Dict[str, Any]]] = None,
-    title: str = "Product Requirements Document"
-) -> str:
-    """
-    Export components to a clean Markdown document.
-    Uses detailed_components if available, otherwise uses raw components.
-    """
+def render_markdown(document: SpecDocument) -> str:
     lines = []
-    
-    lines.append(f"# {title}")
+
+    lines.append(f"# {document['title']}")
     lines.append("")
-    lines.append(f"*Generated on {datetime.now().strftime('%Y-%m-%d %H:%M')}*")
+    lines.append(f"*Generated on {document['generated_at']}*")
     lines.append("")
     lines.append("---")
     lines.append("")
-    
-    for name in PRD_COMPONENT_NAMES:
-        if detailed_components and name in detailed_components:
-            detail = detailed_components[name]
-            text = detail.get("text") or components.get(name)
-            questions = detail.get("questions", [])
-        else:
-            text = components.get(name)
-            questions = []
-        
-        lines.append(f"## {name}")
+
+    for section in document["sections"]:
+        lines.append(f"## {section['name']}")
         lines.append("")
-        
-        if text:
-            lines.append(text)
+
+        if section["text"]:
+            lines.append(section["text"])
         else:
             lines.append("*No information provided.*")
-        
+
         lines.append("")
-        
-        if questions:
+
+        if section["questions"]:
             lines.append("### Recommended Next Steps")
             lines.append("")
-            for i, q in enumerate(questions, 1):
+            for i, q in enumerate(section["questions"], 1):
                 lines.append(f"{i}. {q}")
             lines.append("")
-        
+
         lines.append("---")
         lines.append("")
-    
+
     return "\n".join(lines)
 
 
-def export_to_pdf(
-    components: Dict[str, Optional[str]],
-    detailed_components: Optional[Dict[str, Dict[str, Any]]] = None,
-    title: str = "Product Requirements Document"
-) -> bytes:
-    """
-    Export components to a PDF document.
-    Uses detailed_components if available, otherwise uses raw components.
-    Returns PDF as bytes.
-    """
-    try:
-        from fpdf import FPDF
-    except ImportError:
-        from reportlab.lib.pagesizes import letter
-        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-        from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-        from reportlab.lib.units import inch
-        
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=letter, topMargin=0.75*inch, bottomMargin=0.75*inch)
-        styles = getSampleStyleSheet()
-        
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=20,
-            spaceAfter=20,
-        )
-        heading_style = ParagraphStyle(
-            'CustomHeading',
-            parent=styles['Heading2'],
-            fontSize=14,
-            spaceBefore=15,
-            spaceAfter=8,
-            textColor='#6b21a8',
-        )
-        body_style = ParagraphStyle(
-            'CustomBody',
-            parent=styles['Normal'],
-            fontSize=11,
-            leading=16,
-        )
-        question_style = ParagraphStyle(
-            'Question',
-            parent=styles['Normal'],
-            fontSize=10,
-            leftIndent=20,
-            textColor='#4b5563',
-        )
-        
-        story = []
-        
-        story.append(Paragraph(title, title_style))
-        story.append(Paragraph(f"<i>Generated on {datetime.now().strftime('%Y-%m-%d %H:%M')}</i>", styles['Normal']))
-        story.append(Spacer(1, 20))
-        
-        for name in PRD_COMPONENT_NAMES:
-            if detailed_components and name in detailed_components:
-                detail = detailed_components[name]
-                text = detail.get("text") or components.get(name)
-                questions = detail.get("questions", [])
-            else:
-                text = components.get(name)
-                questions = []
-            
-            story.append(Paragraph(name, heading_style))
-            
-            if text:
-                clean_text = text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
-                story.append(Paragraph(clean_text, body_style))
-            else:
-                story.append(Paragraph("<i>No information provided.</i>", body_style))
-            
-            if questions:
-                story.append(Spacer(1, 8))
-                story.append(Paragraph("<b>Recommended Next Steps:</b>", question_style))
-                for i, q in enumerate(questions, 1):
-                    clean_q = q.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
-                    story.append(Paragraph(f"{i}. {clean_q}", question_style))
-            
-            story.append(Spacer(1, 15))
-        
-        doc.build(story)
-        buffer.seek(0)
-        return buffer.read()
-    
+def render_html(document: SpecDocument) -> str:
+    parts = [
+        "<!DOCTYPE html>",
+        "<html>",
+        "<head>",
+        '<meta charset="utf-8">',
+        f"<title>{escape(document['title'])}</title>",
+        "</head>",
+        "<body>",
+        f"<h1>{escape(document['title'])}</h1>",
+        f"<p><em>Generated on {escape(document['generated_at'])}</em></p>",
+        "<hr>",
+    ]
+
+    for section in document["sections"]:
+        parts.append(f"<h2>{escape(section['name'])}</h2>")
+        if section["text"]:
+            parts.append(f"<p>{escape(section['text'])}</p>")
+        else:
+            parts.append("<p><em>No information provided.</em></p>")
+
+        if section["questions"]:
+            parts.append("<h3>Recommended Next Steps</h3>")
+            parts.append("<ol>")
+            parts.extend(f"<li>{escape(q)}</li>" for q in section["questions"])
+            parts.append("</ol>")
+
+        parts.append("<hr>")
+
+    parts.extend(["</body>", "</html>"])
+    return "\n".join(parts)
+
+
+def render_json(document: SpecDocument) -> str:
+    return json.dumps(
+        {
+            "title": document["title"],
+            "generated_at": document["generated_at"],
+            "is_detailed": document["is_detailed"],
+            "sections": document["sections"],
+        },
+        indent=2,
+    )
+
+
+def _render_pdf_reportlab(document: SpecDocument) -> bytes:
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+    from reportlab.lib.units import inch
+
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter, topMargin=0.75*inch, bottomMargin=0.75*inch)
+    styles = getSampleStyleSheet()
+
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=20,
+        spaceAfter=20,
+    )
+    heading_style = ParagraphStyle(
+        'CustomHeading',
+        parent=styles['Heading2'],
+        fontSize=14,
+        spaceBefore=15,
+        spaceAfter=8,
+        textColor='#6b21a8',
+    )
+    body_style = ParagraphStyle(
+        'CustomBody',
+        parent=styles['Normal'],
+        fontSize=11,
+        leading=16,
+    )
+    question_style = ParagraphStyle(
+        'Question',
+        parent=styles['Normal'],
+        fontSize=10,
+        leftIndent=20,
+        textColor='#4b5563',
+    )
+
+    story = []
+
+    story.append(Paragraph(document["title"], title_style))
+    story.append(Paragraph(f"<i>Generated on {document['generated_at']}</i>", styles['Normal']))
+    story.append(Spacer(1, 20))
+
+    for section in document["sections"]:
+        story.append(Paragraph(section["name"], heading_style))
+
+        if section["text"]:
+            story.append(Paragraph(escape(section["text"], quote=False), body_style))
+        else:
+            story.append(Paragraph("<i>No information provided.</i>", body_style))
+
+        if section["questions"]:
+            story.append(Spacer(1, 8))
+            story.append(Paragraph("<b>Recommended Next Steps:</b>", question_style))
+            for i, q in enumerate(section["questions"], 1):
+                story.append(Paragraph(f"{i}. {escape(q, quote=False)}", question_style))
+
+        story.append(Spacer(1, 15))
+
+    doc.build(story)
+    buffer.seek(0)
+    return buffer.read()
+
+
+def _render_pdf_fpdf(document: SpecDocument, FPDF) -> bytes:
     pdf = FPDF()
     pdf.set_auto_page_break(auto=True, margin=15)
     pdf.add_page()
-    
+
     pdf.set_font("Helvetica", "B", 20)
-    pdf.cell(0, 15, title, ln=True, align="C")
-    
+    pdf.cell(0, 15, document["title"], ln=True, align="C")
+
     pdf.set_font("Helvetica", "I", 10)
-    pdf.cell(0, 8, f"Generated on {datetime.now().strftime('%Y-%m-%d %H:%M')}", ln=True, align="C")
+    pdf.cell(0, 8, f"Generated on {document['generated_at']}", ln=True, align="C")
     pdf.ln(10)
-    
-    for name in PRD_COMPONENT_NAMES:
-        if detailed_components and name in detailed_components:
-            detail = detailed_components[name]
-            text = detail.get("text") or components.get(name)
-            questions = detail.get("questions", [])
-        else:
-            text = components.get(name)
-            questions = []
-        
+
+    for section in document["sections"]:
         pdf.set_font("Helvetica", "B", 14)
         pdf.set_text_color(107, 33, 168)
-        pdf.cell(0, 10, name, ln=True)
-        
+        pdf.cell(0, 10, section["name"], ln=True)
+
         pdf.set_font("Helvetica", "", 11)
         pdf.set_text_color(0, 0, 0)
-        
-        if text:
-            pdf.multi_cell(0, 6, text)
+
+        if section["text"]:
+            pdf.multi_cell(0, 6, section["text"])
         else:
             pdf.set_font("Helvetica", "I", 11)
             pdf.cell(0, 6, "No information provided.", ln=True)
-        
-        if questions:
+
+        if section["questions"]:
             pdf.ln(3)
             pdf.set_font("Helvetica", "B", 10)
             pdf.set_text_color(75, 85, 99)
             pdf.cell(0, 6, "Recommended Next Steps:", ln=True)
             pdf.set_font("Helvetica", "", 10)
-            for i, q in enumerate(questions, 1):
+            for i, q in enumerate(section["questions"], 1):
                 pdf.multi_cell(0, 5, f"  {i}. {q}")
-        
+
         pdf.set_text_color(0, 0, 0)
         pdf.ln(8)
-    
+
     return pdf.output(dest='S').encode('latin-1')
+
+
+def render_pdf(document: SpecDocument) -> bytes:
+    """Render with FPDF when installed, otherwise ReportLab."""
+    try:
+        from fpdf import FPDF
+    except ImportError:
+        return _render_pdf_reportlab(document)
+    return _render_pdf_fpdf(document, FPDF)
+
+
+def render_docx(document: SpecDocument) -> bytes:
+    """Render a Word document. Requires python-docx."""
+    from docx import Document
+
+    doc = Document()
+    doc.add_heading(document["title"], level=0)
+    doc.add_paragraph().add_run(f"Generated on {document['generated_at']}").italic = True
+
+    for section in document["sections"]:
+        doc.add_heading(section["name"], level=1)
+        if section["text"]:
+            doc.add_paragraph(section["text"])
+        else:
+            doc.add_paragraph().add_run("No information provided.").italic = True
+
+        if section["questions"]:
+            doc.add_heading("Recommended Next Steps", level=2)
+            for q in section["questions"]:
+                doc.add_paragraph(q, style="List Number")
+
+    buffer = BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+# format -> (renderer, mime type, file extension)
+EXPORT_FORMATS: Dict[str, tuple] = {
+    "markdown": (render_markdown, "text/markdown", "md"),
+    "pdf": (render_pdf, "application/pdf", "pdf"),
+    "html": (render_html, "text/html", "html"),
+    "json": (render_json, "application/json", "json"),
+    "docx": (
+        render_docx,
+        "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+        "docx",
+    ),
+}
+
+
+# Rendered output per (document fingerprint, format); Streamlit reruns re-export
+# the same spec version many times between edits.
+RENDER_CACHE_SIZE = 32
+_render_cache: "OrderedDict[tuple, Union[str, bytes]]" = OrderedDict()
+
+
+def export_formats(
+    components: Dict[str, Optional[str]],
+    detailed_components: Optional[Dict[str, Dict[str, Any]]] = None,
+    formats: Iterable[str] = ("markdown", "pdf"),
+    title: str = DEFAULT_TITLE,
+) -> Dict[str, Union[str, bytes, Exception]]:
+    """
+    Render several formats from a single document build.
+    A renderer that fails stores its exception instead of aborting the rest.
+    """
+    document = build_spec_document(components, detailed_components, title)
+    results = {}
+    for fmt in formats:
+        cache_key = (document["fingerprint"], fmt)
+        if cache_key in _render_cache:
+            results[fmt] = _render_cache[cache_key]
+            record_cache("export", True)
+            continue
+        record_cache("export", False)
+        renderer: Callable[[SpecDocument], Any] = EXPORT_FORMATS[fmt][0]
+        try:
+            results[fmt] = renderer(document)
+        except Exception as e:
+            results[fmt] = e
+            continue
+        _render_cache[cache_key] = results[fmt]
+        while len(_render_cache) > RENDER_CACHE_SIZE:
+            _render_cache.popitem(last=False)
+    return results
+
+
+def export_to_markdown(
+    components: Dict[str, Optional[str]],
+    detailed_components: Optional[Dict[str, Dict[str, Any]]] = None,
+    title: str = DEFAULT_TITLE
+) -> str:
+    """
+    Export components to a clean Markdown document.
+    Uses detailed_components if available, otherwise uses raw components.
+    """
+    return render_markdown(build_spec_document(components, detailed_components, title))
+
+
+def export_to_pdf(
+    components: Dict[str, Optional[str]],
+    detailed_components: Optional[Dict[str, Dict[str, Any]]] = None,
+    title: str = DEFAULT_TITLE
+) -> bytes:
+    """
+    Export components to a PDF document.
+    Uses detailed_components if available, otherwise uses raw components.
+    Returns PDF as bytes.
+    """
+    return render_pdf(build_spec_document(components, detailed_components, title))
+
+
+def export_to_html(
+    components: Dict[str, Optional[str]],
+    detailed_components: Optional[Dict[str, Dict[str, Any]]] = None,
+    title: str = DEFAULT_TITLE
+) -> str:
+    return render_html(build_spec_document(components, detailed_components, title))
+
+
+def export_to_json(
+    components: Dict[str, Optional[str]],
+    detailed_components: Optional[Dict[str, Dict[str, Any]]] = None,
+    title: str = DEFAULT_TITLE
+) -> str:
+    return render_json(build_spec_document(components, detailed_components, title))
+
+
+def export_to_docx(
+    components: Dict[str, Optional[str]],
+    detailed_components: Optional[Dict[str, Dict[str, Any]]] = None,
+    title: str = DEFAULT_TITLE
+) -> bytes:
+    return render_docx(build_spec_document(components, detailed_components, title))
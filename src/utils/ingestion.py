@@ -0,0 +1,244 @@
+"""
+Ingestion of uploaded briefs (Markdown, plain text, PDF, DOCX).
+
+Parsers stream blocks (page or paragraph at a time) into a chunker, so the
+parsed text is never held twice; chunks carry page and section references
+that are kept in the extraction input. Results are cached by content hash,
+and parsing runs on a small worker pool rather than the Streamlit script
+thread.
+"""
+
+import io
+import os
+import re
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TypedDict, BinaryIO, Iterator, List, Optional, Tuple
+
+from src.utils.telemetry import record_cache
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_EXTENSIONS = {
+    "md": "markdown",
+    "markdown": "markdown",
+    "txt": "text",
+    "pdf": "pdf",
+    "docx": "docx",
+}
+
+INGEST_CHUNK_CHARS = int(os.environ.get("SPEC_INGEST_CHUNK_SIZE", "4000"))
+# Parsing stops once this much text has been collected
+MAX_INGEST_CHARS = int(os.environ.get("SPEC_INGEST_MAX_CHARS", "500000"))
+INGEST_CACHE_SIZE = 16
+HASH_BLOCK_SIZE = 1 << 20
+
+
+class DocumentChunk(TypedDict):
+    index: int
+    text: str
+    page: Optional[int]
+    section: Optional[str]
+
+
+class IngestedDocument(TypedDict):
+    filename: str
+    kind: str
+    content_hash: str
+    chunks: List[DocumentChunk]
+    pages: Optional[int]
+    char_count: int
+    truncated: bool
+
+
+class UnsupportedFileType(ValueError):
+    pass
+
+
+# (page, section, text) blocks produced by the parsers
+Block = Tuple[Optional[int], Optional[str], str]
+
+_MARKDOWN_HEADING = re.compile(r"^\s{0,3}#{1,6}\s+(.*?)\s*#*\s*$")
+_HYPHENATED_BREAK = re.compile(r"(\w)-\n(\w)")
+_CONTROL_CHARS = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]")
+_INLINE_SPACE = re.compile(r"[ \t ]+")
+_BLANK_LINES = re.compile(r"\n{3,}")
+
+_cache: "OrderedDict[str, IngestedDocument]" = OrderedDict()
+_cache_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="spec-ingest")
+
+
+def file_kind(filename: str) -> str:
+    extension = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+    if extension not in SUPPORTED_EXTENSIONS:
+        raise UnsupportedFileType(f"Unsupported file type: .{extension or '?'}")
+    return SUPPORTED_EXTENSIONS[extension]
+
+
+def content_hash(stream: BinaryIO) -> str:
+    """SHA-256 of a seekable stream, read in blocks."""
+    digest = hashlib.sha256()
+    stream.seek(0)
+    for block in iter(lambda: stream.read(HASH_BLOCK_SIZE), b""):
+        digest.update(block)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+def normalize_text(text: str) -> str:
+    """Unicode-normalize, rejoin hyphenated line breaks and collapse whitespace."""
+    text = unicodedata.normalize("NFKC", text).replace("\r\n", "\n").replace("\r", "\n")
+    text = _CONTROL_CHARS.sub("", text)
+    text = _HYPHENATED_BREAK.sub(r"\1\2", text)
+    text = "\n".join(_INLINE_SPACE.sub(" ", line).strip() for line in text.split("\n"))
+    return _BLANK_LINES.sub("\n\n", text).strip()
+
+
+def _iter_text_blocks(stream: BinaryIO, markdown: bool) -> Iterator[Block]:
+    section = None
+    paragraph: List[str] = []
+    reader = io.TextIOWrapper(stream, encoding="utf-8", errors="replace", newline=None)
+    try:
+        for line in reader:
+            heading = _MARKDOWN_HEADING.match(line) if markdown else None
+            if heading or not line.strip():
+                if paragraph:
+                    yield None, section, "".join(paragraph)
+                    paragraph = []
+                if heading:
+                    section = heading.group(1)
+                continue
+            paragraph.append(line)
+        if paragraph:
+            yield None, section, "".join(paragraph)
+    finally:
+        # Don't let the wrapper close the caller's stream
+        reader.detach()
+
+
+def _iter_pdf_blocks(stream: BinaryIO) -> Iterator[Block]:
+    from pypdf import PdfReader
+
+    reader = PdfReader(stream)
+    for number, page in enumerate(reader.pages, start=1):
+        text = page.extract_text() or ""
+        for paragraph in re.split(r"\n\s*\n", text):
+            if paragraph.strip():
+                yield number, None, paragraph
+
+
+def _iter_docx_blocks(stream: BinaryIO) -> Iterator[Block]:
+    from docx import Document
+
+    section = None
+    for paragraph in Document(stream).paragraphs:
+        text = paragraph.text
+        if not text.strip():
+            continue
+        style = paragraph.style.name if paragraph.style is not None else ""
+        if style.startswith("Heading") or style == "Title":
+            section = text.strip()
+            continue
+        yield None, section, text
+
+
+def iter_blocks(stream: BinaryIO, kind: str) -> Iterator[Block]:
+    if kind == "pdf":
+        return _iter_pdf_blocks(stream)
+    if kind == "docx":
+        return _iter_docx_blocks(stream)
+    return _iter_text_blocks(stream, markdown=kind == "markdown")
+
+
+def chunk_blocks(blocks: Iterator[Block], max_chars: int = INGEST_CHUNK_CHARS) -> Iterator[DocumentChunk]:
+    """
+    Pack normalized blocks into chunks of up to max_chars. A chunk never spans
+    a page or section change, so each one has a single reference.
+    """
+    index = 0
+    parts: List[str] = []
+    size = 0
+    ref: Tuple[Optional[int], Optional[str]] = (None, None)
+
+    for page, section, text in blocks:
+        text = normalize_text(text)
+        if not text:
+            continue
+        if parts and ((page, section) != ref or size + len(text) > max_chars):
+            yield {"index": index, "text": "\n\n".join(parts), "page": ref[0], "section": ref[1]}
+            index += 1
+            parts, size = [], 0
+        ref = (page, section)
+        parts.append(text)
+        size += len(text) + 2
+
+    if parts:
+        yield {"index": index, "text": "\n\n".join(parts), "page": ref[0], "section": ref[1]}
+
+
+def chunk_reference(document: IngestedDocument, chunk: DocumentChunk) -> str:
+    ref = document["filename"]
+    if chunk["page"] is not None:
+        ref += f", p. {chunk['page']}"
+    if chunk["section"]:
+        ref += f", § {chunk['section']}"
+    return ref
+
+
+def ingest(filename: str, stream: BinaryIO) -> IngestedDocument:
+    """Parse an uploaded file into referenced chunks, reusing cached results for identical content."""
+    kind = file_kind(filename)
+    digest = content_hash(stream)
+
+    with _cache_lock:
+        cached = _cache.get(digest)
+        if cached is not None:
+            _cache.move_to_end(digest)
+    if cached is not None:
+        record_cache("ingestion", True)
+        logger.info(f"ingestion: Cache hit for {filename}")
+        return {**cached, "filename": filename}
+    record_cache("ingestion", False)
+
+    chunks: List[DocumentChunk] = []
+    char_count = 0
+    truncated = False
+    for chunk in chunk_blocks(iter_blocks(stream, kind)):
+        if char_count + len(chunk["text"]) > MAX_INGEST_CHARS:
+            truncated = True
+            break
+        chunks.append(chunk)
+        char_count += len(chunk["text"])
+
+    pages = [c["page"] for c in chunks if c["page"] is not None]
+    document: IngestedDocument = {
+        "filename": filename,
+        "kind": kind,
+        "content_hash": digest,
+        "chunks": chunks,
+        "pages": max(pages) if pages else None,
+        "char_count": char_count,
+        "truncated": truncated,
+    }
+    logger.info(f"ingestion: Parsed {filename} ({kind}) into {len(chunks)} chunks, {char_count} chars")
+
+    with _cache_lock:
+        _cache[digest] = document
+        while len(_cache) > INGEST_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return document
+
+
+def submit_ingestion(filename: str, data: bytes) -> Future[IngestedDocument]:
+    """Parse on the ingestion worker pool, off the calling thread."""
+    return _executor.submit(ingest, filename, io.BytesIO(data))
+
+
+def document_to_input(document: IngestedDocument) -> str:
+    """Extraction input with each chunk prefixed by its source reference."""
+    return "\n\n".join(f"[{chunk_reference(document, c)}]\n{c['text']}" for c in document["chunks"])
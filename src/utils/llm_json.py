@@ -0,0 +1,65 @@
+"""
+JSON handling for chat model responses, shared by the JSON-mode nodes.
+
+Gemini may return a plain string (optionally fenced in ```json), a parsed
+dict, or a list of content blocks; parse_json_content() accepts all three.
+"""
+
+import json
+from typing import Any, Dict, Optional
+
+from src.utils import metrics
+from src.utils.scheduler import scheduled
+
+# Keys of a LangChain text content block, as opposed to a JSON payload
+_CONTENT_BLOCK_KEYS = {"type", "text", "index", "extras", "id"}
+
+_NO_DEFAULT = object()
+
+
+def extract_json_from_text(text: str) -> dict:
+    text = text.strip()
+    if text.startswith("```json"):
+        text = text[7:]
+    if text.startswith("```"):
+        text = text[3:]
+    if text.endswith("```"):
+        text = text[:-3]
+    return json.loads(text.strip())
+
+
+def parse_json_content(content: Any, default: Any = _NO_DEFAULT) -> Dict[str, Any]:
+    """
+    Parse a response's content into a dict. Empty content returns default,
+    or raises ValueError when no default is given; malformed JSON raises
+    json.JSONDecodeError.
+    """
+    if isinstance(content, dict):
+        return content
+    if isinstance(content, list) and content:
+        first_item = content[0]
+        if isinstance(first_item, dict):
+            if "text" in first_item and set(first_item) <= _CONTENT_BLOCK_KEYS:
+                return extract_json_from_text(first_item.get("text") or "{}")
+            return first_item
+        if isinstance(first_item, str):
+            return extract_json_from_text(first_item)
+    if isinstance(content, str) and content.strip():
+        return extract_json_from_text(content)
+
+    if default is _NO_DEFAULT:
+        raise ValueError(f"Empty or invalid response: {content}")
+    return default
+
+
+async def ainvoke_json(llm, messages, default: Any = _NO_DEFAULT) -> Optional[Dict[str, Any]]:
+    """Await the model (once the scheduler grants a slot) and parse its JSON response."""
+    response = await scheduled(lambda: llm.ainvoke(messages))
+    try:
+        return parse_json_content(response.content, default)
+    except json.JSONDecodeError:
+        metrics.JSON_PARSE_FAILURES.inc("malformed")
+        raise
+    except ValueError:
+        metrics.JSON_PARSE_FAILURES.inc("empty")
+        raise
@@ -0,0 +1,385 @@
+"""
+Per-session memory accounting with budget-based eviction of idle threads.
+
+Each Streamlit session reports an estimate of its state (workflow_state,
+thinking_logs, widget values) at the end of every rerun, and checkpoint
+history is measured per thread in the shared MemorySaver. When the total
+exceeds SPEC_MEMORY_BUDGET_MB, idle threads are evicted coldest first:
+- "disk" (default): session state and checkpoints are pickled to
+  SPEC_EVICTION_DIR and restored on the session's next rerun or graph run
+- "drop": they are discarded; the session starts over on its next rerun
+
+Threads whose session is gone (closed tabs, reset specs) only hold
+checkpoints and are evicted first.
+
+Each thread's loaded version history (src/utils/versioning.py) and run
+telemetry (src/utils/telemetry.py) count toward the budget too, and are
+released when the thread is evicted: the version store reloads from its
+history directory, while the telemetry runs are dropped.
+"""
+
+import os
+import re
+import sys
+import time
+import pickle
+import logging
+import threading
+import weakref
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from src.utils import metrics, telemetry, versioning
+from src.utils.cancellation import RUN_DEADLINE
+
+logger = logging.getLogger(__name__)
+
+MEMORY_BUDGET_MB = float(os.environ.get("SPEC_MEMORY_BUDGET_MB", "512"))
+# A session is idle after this long without a rerun; never shorter than a run may take
+SESSION_IDLE_SECONDS = max(float(os.environ.get("SPEC_SESSION_IDLE_SECONDS", "900")), RUN_DEADLINE)
+EVICTION_MODE = os.environ.get("SPEC_EVICTION_MODE", "disk").strip().lower()
+EVICTION_DIR = os.environ.get("SPEC_EVICTION_DIR", ".spec_evicted")
+# Checkpoint sizes are re-measured at most this often
+MEMORY_CHECK_SECONDS = float(os.environ.get("SPEC_MEMORY_CHECK_SECONDS", "10"))
+
+_lock = threading.Lock()
+_sessions: "weakref.WeakSet[SessionMemory]" = weakref.WeakSet()
+_last_active: Dict[str, float] = {}  # thread_id -> last rerun of any session on it
+_on_disk: Dict[str, str] = {}  # evicted thread_id -> path
+_stats = {"evictions": 0, "evicted_bytes": 0, "restores": 0}
+_snapshot: Dict[str, Any] = {"at": 0.0, "checkpoints": {}, "history": {}}
+
+
+class SessionMemory:
+    """Per-session accounting record, kept in st.session_state so it lives as long as the session."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.thread_id: Optional[str] = None
+        self.last_active = time.time()
+        self.sizes: Dict[str, int] = {}
+        self.evicted: Optional[str] = None  # eviction mode, until the session resumes
+        # The objects measured last, so eviction can release them in place
+        self.workflow_state: Optional[dict] = None
+        self.thinking_logs: Optional[list] = None
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(self.sizes.values())
+
+
+def deep_sizeof(obj: Any) -> int:
+    """Approximate retained size of an object graph, counting shared objects once."""
+    seen = set()
+    stack = [obj]
+    total = 0
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        total += sys.getsizeof(item, 0)
+        if isinstance(item, (str, bytes, bytearray, int, float, bool, type(None))):
+            continue
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset, deque)):
+            stack.extend(item)
+        elif hasattr(item, "__dict__"):
+            stack.append(vars(item))
+    return total
+
+
+def measure_checkpoints(checkpointer) -> Dict[str, Dict[str, int]]:
+    """Bytes and checkpoint count per thread in a MemorySaver."""
+    threads: Dict[str, Dict[str, int]] = {}
+
+    def entry(thread_id: str) -> Dict[str, int]:
+        return threads.setdefault(thread_id, {"bytes": 0, "checkpoints": 0})
+
+    # list() copies are atomic under the GIL while graph runs write from the loop thread
+    for thread_id, namespaces in list(checkpointer.storage.items()):
+        for checkpoints in list(namespaces.values()):
+            checkpoints = list(checkpoints.values())
+            entry(thread_id)["checkpoints"] += len(checkpoints)
+            entry(thread_id)["bytes"] += deep_sizeof(checkpoints)
+    for key, value in list(checkpointer.writes.items()):
+        entry(key[0])["bytes"] += deep_sizeof(value)
+    for key, value in list(checkpointer.blobs.items()):
+        entry(key[0])["bytes"] += deep_sizeof(value)
+    return threads
+
+
+def measure_history() -> Dict[str, Dict[str, int]]:
+    """Bytes of loaded version history and run telemetry per thread."""
+    threads: Dict[str, Dict[str, int]] = {}
+    for kind, sizes in (("versions", versioning.version_store_sizes()), ("telemetry", telemetry.session_sizes(deep_sizeof))):
+        for thread_id, size in sizes.items():
+            threads.setdefault(thread_id, {"versions": 0, "telemetry": 0})[kind] = size
+    return threads
+
+
+def _history_bytes(history: Dict[str, Dict[str, int]], thread_id: str) -> int:
+    return sum(history.get(thread_id, {}).values())
+
+
+def _checkpoints(now: float, refresh: bool = False) -> Dict[str, Dict[str, int]]:
+    """Checkpoint sizes per thread; also refreshes the history sizes in _snapshot["history"]."""
+    if refresh or now - _snapshot["at"] >= MEMORY_CHECK_SECONDS:
+        from src.graph import get_checkpointer
+        _snapshot["checkpoints"] = measure_checkpoints(get_checkpointer())
+        _snapshot["history"] = measure_history()
+        _snapshot["at"] = now
+    return _snapshot["checkpoints"]
+
+
+def _eviction_path(thread_id: str) -> str:
+    return os.path.join(EVICTION_DIR, re.sub(r"[^A-Za-z0-9_.-]", "_", thread_id) + ".pkl")
+
+
+def _take_checkpoints(checkpointer, thread_id: str) -> Dict[str, Any]:
+    """Remove a thread's checkpoints from the saver and return them."""
+    saved = {
+        "storage": {ns: dict(checkpoints) for ns, checkpoints in list(checkpointer.storage.get(thread_id, {}).items())},
+        "writes": {k: v for k, v in list(checkpointer.writes.items()) if k[0] == thread_id},
+        "blobs": {k: v for k, v in list(checkpointer.blobs.items()) if k[0] == thread_id},
+    }
+    checkpointer.delete_thread(thread_id)
+    return saved
+
+
+def _put_checkpoints(checkpointer, saved: Dict[str, Any], thread_id: str) -> None:
+    for ns, checkpoints in saved["storage"].items():
+        checkpointer.storage[thread_id][ns].update(checkpoints)
+    checkpointer.writes.update(saved["writes"])
+    checkpointer.blobs.update(saved["blobs"])
+
+
+def _evict(thread_id: str, session: Optional[SessionMemory], mode: str) -> None:
+    """Release one thread's checkpoints, history and, if given, its session state. Caller holds session.lock."""
+    from src.graph import get_checkpointer
+
+    versioning.release_version_store(thread_id)
+    telemetry.drop_session(thread_id)
+    checkpoints = _take_checkpoints(get_checkpointer(), thread_id)
+    state = None
+    if session is not None:
+        state = {
+            "workflow_state": dict(session.workflow_state or {}),
+            "thinking_logs": list(session.thinking_logs or []),
+        }
+    if mode == "disk" and (state is not None or any(checkpoints.values())):
+        os.makedirs(EVICTION_DIR, exist_ok=True)
+        path = _eviction_path(thread_id)
+        with open(path, "wb") as f:
+            pickle.dump({"thread_id": thread_id, "checkpoints": checkpoints, "session": state}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        _on_disk[thread_id] = path
+    if session is not None:
+        # Clear in place: st.session_state still references these objects
+        if session.workflow_state is not None:
+            session.workflow_state.clear()
+        if session.thinking_logs is not None:
+            session.thinking_logs.clear()
+        session.workflow_state = session.thinking_logs = None
+        session.evicted = mode
+        session.sizes = {}
+
+
+def enforce_budget(now: Optional[float] = None) -> List[str]:
+    """Evict idle threads, coldest first, until the estimate is under budget. Returns evicted thread ids."""
+    now = now or time.time()
+    budget = int(MEMORY_BUDGET_MB * 1024 * 1024)
+    with _lock:
+        checkpoints = _checkpoints(now)
+        history = _snapshot["history"]
+        sessions = {s.thread_id: s for s in list(_sessions) if s.thread_id and not s.evicted}
+        total = (
+            sum(s.total_bytes for s in sessions.values())
+            + sum(c["bytes"] for c in checkpoints.values())
+            + sum(sum(h.values()) for h in history.values())
+        )
+        if total <= budget:
+            return []
+
+        candidates = []
+        for thread_id in set(checkpoints) | set(sessions) | set(history):
+            session = sessions.get(thread_id)
+            last_active = session.last_active if session else _last_active.get(thread_id, 0.0)
+            if now - last_active >= SESSION_IDLE_SECONDS:
+                candidates.append((last_active, thread_id))
+
+        evicted = []
+        for _, thread_id in sorted(candidates):
+            if total <= budget:
+                break
+            session = sessions.get(thread_id)
+            freed = checkpoints.get(thread_id, {}).get("bytes", 0) + _history_bytes(history, thread_id)
+            if session is None:
+                _evict(thread_id, None, EVICTION_MODE)
+            else:
+                with session.lock:
+                    # Re-check: the session may have rerun since it was listed
+                    if now - session.last_active < SESSION_IDLE_SECONDS:
+                        continue
+                    freed += session.total_bytes
+                    _evict(thread_id, session, EVICTION_MODE)
+            checkpoints.pop(thread_id, None)
+            history.pop(thread_id, None)
+            total -= freed
+            _stats["evictions"] += 1
+            _stats["evicted_bytes"] += freed
+            evicted.append(thread_id)
+            logger.info(f"memory: Evicted {thread_id} ({freed // 1024} KB, {EVICTION_MODE})")
+
+    if evicted and total > budget:
+        logger.warning(f"memory: Still {total // 1024} KB over a {budget // 1024} KB budget; remaining threads are active")
+    return evicted
+
+
+def ensure_resident(thread_id: str) -> None:
+    """Reload a thread's checkpoints evicted to disk. Called before running the graph on it."""
+    with _lock:
+        path = _on_disk.pop(thread_id, None)
+        if path is None:
+            return
+        try:
+            with open(path, "rb") as f:
+                saved = pickle.load(f)
+        except (OSError, pickle.UnpicklingError) as e:
+            logger.warning(f"memory: Could not restore {thread_id} from {path}: {e}")
+            return
+        from src.graph import get_checkpointer
+        _put_checkpoints(get_checkpointer(), saved["checkpoints"], thread_id)
+        os.remove(path)
+        _stats["restores"] += 1
+    logger.info(f"memory: Restored {thread_id} from disk")
+
+
+def resume_session(session: SessionMemory) -> Optional[Dict[str, Any]]:
+    """
+    Mark the session active at the start of a rerun. If it was evicted, returns
+    {"mode": ..., "session": saved state or None}; the caller reinstates it.
+    """
+    with session.lock:
+        session.last_active = time.time()
+        mode, session.evicted = session.evicted, None
+    if mode is None:
+        return None
+
+    state = None
+    if mode == "disk" and session.thread_id:
+        path = _on_disk.get(session.thread_id)
+        if path and os.path.exists(path):
+            with open(path, "rb") as f:
+                state = pickle.load(f).get("session")
+            ensure_resident(session.thread_id)
+    return {"mode": mode, "session": state}
+
+
+def account_session(session: SessionMemory, thread_id: str, items: Dict[str, Any]) -> None:
+    """Record a session's state sizes at the end of a rerun, then enforce the budget."""
+    workflow_state = items.get("workflow_state")
+    thinking_logs = items.get("thinking_logs")
+    other = {k: v for k, v in items.items() if k not in ("workflow_state", "thinking_logs") and v is not session}
+    sizes = {
+        "workflow_state": deep_sizeof(workflow_state),
+        "thinking_logs": deep_sizeof(thinking_logs),
+        "other": deep_sizeof(other),
+    }
+    now = time.time()
+    with session.lock:
+        session.thread_id = thread_id
+        session.last_active = now
+        session.sizes = sizes
+        session.workflow_state = workflow_state
+        session.thinking_logs = thinking_logs
+    with _lock:
+        _sessions.add(session)
+        _last_active[thread_id] = now
+    enforce_budget(now)
+
+
+def process_rss_kb() -> Optional[int]:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def get_memory_report(limit: int = 5) -> Dict[str, Any]:
+    """Budget, estimated totals and the largest threads by session state, checkpoints and history."""
+    now = time.time()
+    with _lock:
+        checkpoints = _checkpoints(now)
+        history = _snapshot["history"]
+        sessions = {s.thread_id: s for s in list(_sessions) if s.thread_id}
+        threads = []
+        for thread_id in set(checkpoints) | set(sessions) | set(history):
+            session = sessions.get(thread_id)
+            cp = checkpoints.get(thread_id, {"bytes": 0, "checkpoints": 0})
+            session_bytes = session.total_bytes if session else 0
+            history_bytes = _history_bytes(history, thread_id)
+            last_active = session.last_active if session else _last_active.get(thread_id)
+            threads.append({
+                "thread_id": thread_id,
+                "session_bytes": session_bytes,
+                "thinking_log_bytes": session.sizes.get("thinking_logs", 0) if session else 0,
+                "checkpoint_bytes": cp["bytes"],
+                "checkpoints": cp["checkpoints"],
+                "history_bytes": history_bytes,
+                "total_bytes": session_bytes + cp["bytes"] + history_bytes,
+                "idle_seconds": now - last_active if last_active else None,
+                "live_session": session is not None,
+            })
+        stats = dict(_stats)
+        on_disk = len(_on_disk)
+
+    threads.sort(key=lambda t: t["total_bytes"], reverse=True)
+    return {
+        "budget_bytes": int(MEMORY_BUDGET_MB * 1024 * 1024),
+        "total_bytes": sum(t["total_bytes"] for t in threads),
+        "threads": len(threads),
+        "largest": threads[:limit],
+        "on_disk": on_disk,
+        "rss_kb": process_rss_kb(),
+        **stats,
+    }
+
+
+def collect_metrics() -> List[metrics.Family]:
+    """Scrape-time gauges: sessions, checkpointer and history size, evictions and RSS."""
+    now = time.time()
+    with _lock:
+        checkpoints = _checkpoints(now)
+        history = list(_snapshot["history"].values())
+        sessions = [s for s in list(_sessions) if s.thread_id]
+        stats = dict(_stats)
+        on_disk = len(_on_disk)
+    active = sum(1 for s in sessions if now - s.last_active < SESSION_IDLE_SECONDS)
+    rss_kb = process_rss_kb()
+    families = [
+        ("spec_sessions", "gauge", "Sessions holding state, by activity.",
+         [("", {"state": "active"}, active), ("", {"state": "idle"}, len(sessions) - active)]),
+        ("spec_checkpointer_bytes", "gauge", "Estimated size of the in-memory checkpointer.",
+         [("", {}, sum(cp["bytes"] for cp in checkpoints.values()))]),
+        ("spec_checkpointer_threads", "gauge", "Threads with checkpoints in memory.", [("", {}, len(checkpoints))]),
+        ("spec_checkpoints", "gauge", "Checkpoints held in memory.",
+         [("", {}, sum(cp["checkpoints"] for cp in checkpoints.values()))]),
+        ("spec_thread_history_bytes", "gauge", "Estimated size of loaded version history and run telemetry.",
+         [("", {"kind": kind}, sum(h[kind] for h in history)) for kind in ("versions", "telemetry")]),
+        ("spec_evicted_threads", "gauge", "Threads evicted to disk and not yet restored.", [("", {}, on_disk)]),
+        ("spec_evictions", "counter", "Threads evicted under the memory budget.", [("_total", {}, stats["evictions"])]),
+        ("spec_memory_budget_bytes", "gauge", "Memory budget for session state and checkpoints.",
+         [("", {}, int(MEMORY_BUDGET_MB * 1024 * 1024))]),
+    ]
+    if rss_kb is not None:
+        families.append(("spec_process_resident_memory_bytes", "gauge", "Resident set size of the process.", [("", {}, rss_kb * 1024)]))
+    return families
+
+
+metrics.register_collector(collect_metrics)
@@ -0,0 +1,222 @@
+"""
+Prometheus metrics for operational monitoring.
+
+Counters and histograms live in process memory; the hot path only bumps a
+number under a per-metric lock. Gauges that are costly to compute (sessions,
+checkpointer size) are read by collectors at scrape time. The text
+exposition format is served on a separate local port (SPEC_METRICS_PORT) or
+written atomically to a node_exporter textfile collector path
+(SPEC_METRICS_TEXTFILE) every SPEC_METRICS_INTERVAL seconds. Both are off
+unless configured.
+"""
+
+import os
+import math
+import time
+import bisect
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+METRICS_PORT = int(os.environ.get("SPEC_METRICS_PORT", "0"))
+METRICS_HOST = os.environ.get("SPEC_METRICS_HOST", "127.0.0.1")
+METRICS_TEXTFILE = os.environ.get("SPEC_METRICS_TEXTFILE", "")
+METRICS_INTERVAL = float(os.environ.get("SPEC_METRICS_INTERVAL", "15"))
+
+# Seconds; graph runs and LLM calls range from milliseconds to the run deadline
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# (name, type, help, [(suffix, labels, value)])
+Family = Tuple[str, str, str, List[Tuple[str, Dict[str, str], float]]]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def collect(self) -> Family:
+        with self._lock:
+            values = dict(self._values)
+        samples = [("_total", dict(zip(self.labelnames, key)), value) for key, value in sorted(values.items())]
+        return self.name, "counter", self.documentation, samples
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (last is +Inf), sum]
+        self._values: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def collect(self) -> Family:
+        with self._lock:
+            values = {key: (list(counts), total) for key, (counts, total) in self._values.items()}
+        samples = []
+        for key, (counts, total) in sorted(values.items()):
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                samples.append(("_bucket", {**labels, "le": _format_value(bound)}, cumulative))
+            samples.append(("_sum", labels, total))
+            samples.append(("_count", labels, cumulative))
+        return self.name, "histogram", self.documentation, samples
+
+
+_metrics: List = []
+_collectors: List[Callable[[], Iterable[Family]]] = []
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    metric = Counter(name, documentation, labelnames)
+    _metrics.append(metric)
+    return metric
+
+
+def histogram(name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+    metric = Histogram(name, documentation, labelnames, buckets)
+    _metrics.append(metric)
+    return metric
+
+
+def register_collector(collector: Callable[[], Iterable[Family]]) -> None:
+    """Add a function that returns metric families when scraped, for values too costly to keep current."""
+    _collectors.append(collector)
+
+
+GRAPH_RUNS = counter("spec_graph_runs", "Graph runs by outcome.", ("status",))
+GRAPH_RUN_SECONDS = histogram("spec_graph_run_seconds", "Wall time of graph runs.")
+NODE_SECONDS = histogram("spec_node_seconds", "Wall time of graph nodes.", ("node",))
+LLM_CALL_SECONDS = histogram("spec_llm_call_seconds", "Latency of chat model calls.", ("node", "model"))
+LLM_ERRORS = counter("spec_llm_errors", "Failed chat model calls by exception type.", ("node", "error_type"))
+LLM_TOKENS = counter("spec_llm_tokens", "Tokens reported by chat model calls.", ("node", "direction"))
+JSON_PARSE_FAILURES = counter("spec_json_parse_failures", "Model responses that could not be parsed as JSON.", ("reason",))
+SANITY_DECISIONS = counter("spec_sanity_decisions", "Sanity check verdicts.", ("decision",))
+CACHE_REQUESTS = counter("spec_cache_requests", "Cache lookups by cache and result.", ("cache", "result"))
+EDGE_SANITY_VERDICTS = counter("spec_edge_sanity_verdicts", "On-device sanity verdicts by outcome.", ("verdict",))
+EDGE_SANITY_SAVED_TOKENS = counter(
+    "spec_edge_sanity_saved_tokens", "Estimated Gemini tokens saved by decisive on-device sanity verdicts.", ("direction",)
+)
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    families = [metric.collect() for metric in _metrics]
+    for collector in _collectors:
+        try:
+            families.extend(collector())
+        except Exception as e:
+            logger.warning(f"metrics: Collector {getattr(collector, '__name__', collector)} failed: {e}")
+
+    lines = []
+    for name, kind, documentation, samples in families:
+        lines.append(f"# HELP {name} {_escape(documentation)}")
+        lines.append(f"# TYPE {name} {kind}")
+        for suffix, labels, value in samples:
+            lines.append(f"{name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(f"metrics: {self.address_string()} {format % args}")
+
+
+def write_textfile(path: str) -> None:
+    """Write the exposition atomically, as the textfile collector requires."""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(render())
+    os.replace(tmp, path)
+
+
+def _write_textfile_forever(path: str, interval: float) -> None:
+    while True:
+        try:
+            write_textfile(path)
+        except OSError as e:
+            logger.warning(f"metrics: Could not write {path}: {e}")
+        time.sleep(interval)
+
+
+_exporters: Dict[str, object] = {}
+_exporters_lock = threading.Lock()
+
+
+def start_exporters(port: int = METRICS_PORT, textfile: str = METRICS_TEXTFILE, host: str = METRICS_HOST) -> Optional[int]:
+    """
+    Start the configured exporters once per process. Safe to call on every
+    Streamlit rerun. Returns the bound port when the HTTP exporter runs.
+    """
+    with _exporters_lock:
+        if port and "server" not in _exporters:
+            try:
+                server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            except OSError as e:
+                # Another process (app or API) already serves this port
+                logger.warning(f"metrics: Not serving on {host}:{port}: {e}")
+                _exporters["server"] = None
+            else:
+                server.daemon_threads = True
+                threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+                _exporters["server"] = server
+                logger.info(f"metrics: Serving on http://{host}:{server.server_address[1]}/metrics")
+        if textfile and "textfile" not in _exporters:
+            thread = threading.Thread(target=_write_textfile_forever, args=(textfile, METRICS_INTERVAL), name="metrics-textfile", daemon=True)
+            thread.start()
+            _exporters["textfile"] = thread
+            logger.info(f"metrics: Writing {textfile} every {METRICS_INTERVAL:.0f}s")
+        server = _exporters.get("server")
+        return server.server_address[1] if server else None
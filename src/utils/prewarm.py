@@ -0,0 +1,108 @@
+"""
+Shared LLM calls started ahead of a graph run.
+
+The live preview prewarms a draft's sanity check and extraction with exactly
+the prompts the real submission will send. When the submission's node makes
+the same call it joins the prewarmed task (finished or still in flight)
+instead of calling the model again. Only prewarmed calls are stored; a node
+call with no prewarmed match goes straight to the model.
+
+Tasks are bound to the loop they run on, so the store is kept per event loop.
+"""
+
+import os
+import copy
+import time
+import asyncio
+import hashlib
+import logging
+import weakref
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable
+
+from src.utils.telemetry import record_cache
+
+logger = logging.getLogger(__name__)
+
+PREWARM_TTL = float(os.environ.get("SPEC_PREWARM_TTL", "300"))
+PREWARM_CACHE_SIZE = int(os.environ.get("SPEC_PREWARM_CACHE_SIZE", "16"))
+
+
+class _Entry:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.created = time.monotonic()
+        self.waiters = 0
+
+
+_stores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, OrderedDict]" = weakref.WeakKeyDictionary()
+
+
+def _store() -> "OrderedDict[str, _Entry]":
+    return _stores.setdefault(asyncio.get_running_loop(), OrderedDict())
+
+
+def prewarm_key(node: str, prompt: str) -> str:
+    return f"{node}:{hashlib.sha256(prompt.encode('utf-8')).hexdigest()}"
+
+
+def _usable(entry: _Entry) -> bool:
+    if time.monotonic() - entry.created > PREWARM_TTL:
+        return False
+    task = entry.task
+    return not task.done() or (not task.cancelled() and task.exception() is None)
+
+
+async def _join(entry: _Entry) -> Any:
+    entry.waiters += 1
+    try:
+        return copy.deepcopy(await asyncio.shield(entry.task))
+    finally:
+        entry.waiters -= 1
+
+
+async def prewarm(node: str, prompt: str, make_call: Callable[[], Awaitable[Any]]) -> Any:
+    """Start (or join) the shared call for this prompt and wait for its result."""
+    store = _store()
+    key = prewarm_key(node, prompt)
+    entry = store.get(key)
+    if entry is None or not _usable(entry):
+        entry = _Entry(asyncio.ensure_future(make_call()))
+        store[key] = entry
+        while len(store) > PREWARM_CACHE_SIZE:
+            _, evicted = store.popitem(last=False)
+            if evicted.waiters == 0 and not evicted.task.done():
+                evicted.task.cancel()
+    store.move_to_end(key)
+    return await _join(entry)
+
+
+async def reuse_or_call(node: str, prompt: str, make_call: Callable[[], Awaitable[Any]]) -> Any:
+    """Join a prewarmed call for this prompt if there is one, otherwise call the model directly."""
+    store = _store()
+    key = prewarm_key(node, prompt)
+    entry = store.get(key)
+    if entry is not None and _usable(entry):
+        record_cache("prewarm", True)
+        logger.info(f"prewarm: {node} joined a {'finished' if entry.task.done() else 'running'} prewarmed call")
+        try:
+            return await _join(entry)
+        finally:
+            # Each prewarmed call serves one submission
+            if store.get(key) is entry:
+                del store[key]
+    if store:
+        # Only counted while prewarming is in use, so plain runs don't report misses
+        record_cache("prewarm", False)
+    return await make_call()
+
+
+def release(node: str, prompt: str) -> None:
+    """Cancel a prewarmed call nobody is waiting on, e.g. when its draft went stale."""
+    store = _store()
+    key = prewarm_key(node, prompt)
+    entry = store.get(key)
+    if entry is not None and entry.waiters == 0:
+        del store[key]
+        if not entry.task.done():
+            entry.task.cancel()
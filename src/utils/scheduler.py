@@ -0,0 +1,197 @@
+"""
+Priority scheduler for LLM calls.
+
+Every node's model call takes a slot here first, so interactive submissions,
+background work and batch runs share one process-wide budget of concurrent
+calls (the Gemini quota) without background load queueing interactive calls.
+
+- Priority classes, in order: interactive, background, batch. The class
+  comes from priority_scope() around a run; calls outside one are
+  interactive.
+- SPEC_LLM_CONCURRENCY caps calls in flight across classes; background and
+  batch have lower caps of their own, so some slots are always left for
+  interactive calls.
+- Waiters are served in class order, but gain one class per
+  SPEC_LLM_AGING_SECONDS of waiting, so a steady stream of interactive
+  calls can't starve the others. Aging reorders the queue; it never lifts a
+  class cap.
+
+Queue depth, calls in flight and queue wait per class are exported through
+src/utils/metrics.py.
+"""
+
+import os
+import time
+import asyncio
+import logging
+import threading
+import contextvars
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from src.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+PRIORITIES = ("interactive", "background", "batch")
+
+LLM_CONCURRENCY = int(os.environ.get("SPEC_LLM_CONCURRENCY", "16"))
+CLASS_CONCURRENCY: Dict[str, int] = {
+    "interactive": LLM_CONCURRENCY,
+    "background": int(os.environ.get("SPEC_LLM_CONCURRENCY_BACKGROUND", str(max(1, LLM_CONCURRENCY // 2)))),
+    "batch": int(os.environ.get("SPEC_LLM_CONCURRENCY_BATCH", str(max(1, LLM_CONCURRENCY // 4)))),
+}
+AGING_SECONDS = float(os.environ.get("SPEC_LLM_AGING_SECONDS", "5"))
+
+QUEUE_WAIT_SECONDS = metrics.histogram(
+    "spec_llm_queue_wait_seconds", "Time LLM calls waited for a scheduler slot.", ("priority",)
+)
+
+_priority: contextvars.ContextVar[str] = contextvars.ContextVar("spec_llm_priority", default="interactive")
+
+
+@contextmanager
+def priority_scope(priority: str):
+    """Run LLM calls made in this block (and tasks started from it) at the given priority."""
+    if priority not in PRIORITIES:
+        raise ValueError(f"Unknown priority '{priority}'; expected one of {', '.join(PRIORITIES)}")
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> str:
+    return _priority.get()
+
+
+class _Waiter:
+    __slots__ = ("priority", "rank", "enqueued", "seq", "loop", "future")
+
+    def __init__(self, priority: str, seq: int):
+        self.priority = priority
+        self.rank = PRIORITIES.index(priority)
+        self.enqueued = time.monotonic()
+        self.seq = seq
+        self.loop = asyncio.get_running_loop()
+        self.future = self.loop.create_future()
+
+
+class LLMScheduler:
+    """
+    Slots for concurrent LLM calls. Thread-safe: the app's background loop,
+    the API's loop and scripts' own loops can all share one scheduler.
+    """
+
+    def __init__(self, limit: int = LLM_CONCURRENCY, class_limits: Optional[Dict[str, int]] = None, aging_seconds: float = AGING_SECONDS):
+        self.limit = limit
+        self.class_limits = {p: min(limit, n) for p, n in (class_limits or CLASS_CONCURRENCY).items()}
+        self.aging_seconds = aging_seconds
+        self._lock = threading.Lock()
+        self._waiting: List[_Waiter] = []
+        self._in_flight: Dict[str, int] = {p: 0 for p in PRIORITIES}
+        self._seq = 0
+
+    def _eligible(self, priority: str) -> bool:
+        return sum(self._in_flight.values()) < self.limit and self._in_flight[priority] < self.class_limits[priority]
+
+    def _next(self, now: float) -> Optional[_Waiter]:
+        best, best_key = None, None
+        for waiter in self._waiting:
+            if not self._eligible(waiter.priority):
+                continue
+            key = (waiter.rank - (now - waiter.enqueued) / self.aging_seconds if self.aging_seconds > 0 else waiter.rank, waiter.seq)
+            if best_key is None or key < best_key:
+                best, best_key = waiter, key
+        return best
+
+    def _grant(self) -> None:
+        """Hand free slots to the best eligible waiters. Called with the lock held."""
+        now = time.monotonic()
+        while self._waiting:
+            waiter = self._next(now)
+            if waiter is None:
+                return
+            self._waiting.remove(waiter)
+            self._in_flight[waiter.priority] += 1
+            waiter.loop.call_soon_threadsafe(_resolve, waiter.future)
+
+    async def acquire(self, priority: str) -> None:
+        with self._lock:
+            self._seq += 1
+            waiter = _Waiter(priority, self._seq)
+            self._waiting.append(waiter)
+            # Free slots go to us right away unless a better-ranked waiter can use them;
+            # waiters held back by their class cap don't block other classes
+            self._grant()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter in self._waiting:
+                    self._waiting.remove(waiter)
+                    raise
+            # Granted as we were cancelled: give the slot back
+            self.release(priority)
+            raise
+        QUEUE_WAIT_SECONDS.observe(time.monotonic() - waiter.enqueued, priority)
+
+    def release(self, priority: str) -> None:
+        with self._lock:
+            self._in_flight[priority] -= 1
+            self._grant()
+
+    @asynccontextmanager
+    async def slot(self, priority: Optional[str] = None):
+        priority = priority or current_priority()
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release(priority)
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {
+                p: {
+                    "queued": sum(1 for w in self._waiting if w.priority == p),
+                    "in_flight": self._in_flight[p],
+                    "limit": self.class_limits[p],
+                }
+                for p in PRIORITIES
+            }
+
+
+def _resolve(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+    # A future cancelled before this ran was granted anyway; acquire() returns the slot
+
+
+_scheduler = LLMScheduler()
+
+
+def get_scheduler() -> LLMScheduler:
+    return _scheduler
+
+
+async def scheduled(make_call: Callable[[], Awaitable[Any]]) -> Any:
+    """Run one LLM call once the current priority class gets a slot."""
+    async with _scheduler.slot():
+        return await make_call()
+
+
+def collect_metrics() -> List[metrics.Family]:
+    snapshot = _scheduler.snapshot()
+    return [
+        ("spec_llm_queue_depth", "gauge", "LLM calls waiting for a scheduler slot.",
+         [("", {"priority": p}, s["queued"]) for p, s in snapshot.items()]),
+        ("spec_llm_in_flight", "gauge", "LLM calls holding a scheduler slot.",
+         [("", {"priority": p}, s["in_flight"]) for p, s in snapshot.items()]),
+        ("spec_llm_concurrency_limit", "gauge", "Scheduler slots per priority class.",
+         [("", {"priority": p}, s["limit"]) for p, s in snapshot.items()]),
+    ]
+
+
+metrics.register_collector(collect_metrics)
@@ -0,0 +1,251 @@
+"""
+Near-duplicate detection for component texts using MinHash + LSH.
+
+Stores previously generated LLM outputs keyed by their source text so nodes
+can reuse (or lightly adapt) an earlier result when a new component is
+almost identical to one already processed. The index is an append-only
+JSONL file and is rebuilt incrementally on load.
+"""
+
+import os
+import re
+import json
+import random
+import asyncio
+import difflib
+import hashlib
+import logging
+import threading
+from collections import defaultdict, deque
+from typing import Dict, Any, List, Optional, Tuple
+
+from src.utils.telemetry import record_cache
+
+logger = logging.getLogger(__name__)
+
+INDEX_PATH = os.environ.get("SPEC_SIMILARITY_INDEX", ".spec_similarity.jsonl")
+SIMILARITY_THRESHOLD = float(os.environ.get("SPEC_SIMILARITY_THRESHOLD", "0.8"))
+
+NUM_PERM = 128
+BANDS = 32
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 2
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+_rng = random.Random(1337)
+_PERMUTATIONS = [
+    (_rng.randint(1, _MERSENNE_PRIME - 1), _rng.randint(0, _MERSENNE_PRIME - 1))
+    for _ in range(NUM_PERM)
+]
+
+
+def tokenize(text: str) -> List[str]:
+    return re.findall(r"\w+", text.lower())
+
+
+def shingles(text: str) -> set:
+    tokens = tokenize(text)
+    if len(tokens) < SHINGLE_SIZE:
+        return set(tokens)
+    return {" ".join(tokens[i:i + SHINGLE_SIZE]) for i in range(len(tokens) - SHINGLE_SIZE + 1)}
+
+
+def minhash_signature(text: str) -> List[int]:
+    hashed = [
+        int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "big")
+        for s in shingles(text)
+    ]
+    if not hashed:
+        return [_MAX_HASH] * NUM_PERM
+    return [
+        min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashed)
+        for a, b in _PERMUTATIONS
+    ]
+
+
+def jaccard(a: set, b: set) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def adapt_text(old_source: str, new_source: str, old_output: str) -> Optional[str]:
+    """
+    Carry word-level replacements between two source texts over to an output
+    generated from the old source. Phrases are matched as whole tokens, so
+    "in" never rewrites "integration". Returns None if any change (insertion,
+    deletion, or a replaced phrase that isn't in the output exactly once)
+    can't be mapped.
+    """
+    if old_source == new_source:
+        return old_output
+
+    old_words = old_source.split()
+    new_words = new_source.split()
+    adapted = old_output
+    matcher = difflib.SequenceMatcher(None, old_words, new_words, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        if tag != "replace":
+            return None
+        old_phrase = " ".join(old_words[i1:i2])
+        new_phrase = " ".join(new_words[j1:j2])
+        pattern = re.compile(r"(?<!\w)" + re.escape(old_phrase) + r"(?!\w)")
+        if len(pattern.findall(adapted)) != 1:
+            return None
+        adapted = pattern.sub(lambda _: new_phrase, adapted)
+    return adapted
+
+
+class SimilarityIndex:
+    """MinHash/LSH index of (namespace, source text) -> stored output."""
+
+    def __init__(self, path: Optional[str] = INDEX_PATH, threshold: float = SIMILARITY_THRESHOLD):
+        self.path = path
+        self.threshold = threshold
+        self._entries: List[Dict[str, Any]] = []
+        self._buckets: Dict[Tuple, List[int]] = defaultdict(list)
+        self._exact: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.recent: deque = deque(maxlen=50)
+        if path:
+            self._load()
+
+    def _band_keys(self, namespace: str, signature: List[int]) -> List[Tuple]:
+        return [(namespace, band, tuple(signature[band * ROWS:(band + 1) * ROWS])) for band in range(BANDS)]
+
+    def _exact_key(self, namespace: str, text: str) -> str:
+        return hashlib.sha1(f"{namespace}\x00{text}".encode("utf-8")).hexdigest()
+
+    def _insert(self, entry: Dict[str, Any]) -> None:
+        idx = len(self._entries)
+        self._entries.append(entry)
+        self._exact[self._exact_key(entry["namespace"], entry["source"])] = idx
+        for key in self._band_keys(entry["namespace"], entry["signature"]):
+            self._buckets[key].append(idx)
+
+    def add(self, namespace: str, source: str, output: Dict[str, Any]) -> None:
+        """Index an LLM output for a source text and append it to disk."""
+        with self._lock:
+            if self._exact_key(namespace, source) in self._exact:
+                return
+            entry = {
+                "namespace": namespace,
+                "source": source,
+                "signature": minhash_signature(source),
+                "output": output,
+            }
+            self._insert(entry)
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry) + "\n")
+
+    async def aadd(self, namespace: str, source: str, output: Dict[str, Any]) -> None:
+        """add() with the file append run off the event loop."""
+        await asyncio.to_thread(self.add, namespace, source, output)
+
+    def query(self, namespace: str, source: str) -> Tuple[Optional[Dict[str, Any]], float]:
+        """
+        Return (best stored entry, estimated similarity). The entry is None
+        when nothing reaches the threshold; the score is still reported.
+        """
+        with self._lock:
+            exact = self._exact.get(self._exact_key(namespace, source))
+            if exact is not None:
+                return self._entries[exact], 1.0
+
+            signature = minhash_signature(source)
+            candidates = set()
+            for key in self._band_keys(namespace, signature):
+                candidates.update(self._buckets.get(key, ()))
+
+            # LSH only proposes candidates; score them on exact shingle overlap
+            source_shingles = shingles(source)
+            best, best_score = None, 0.0
+            for idx in candidates:
+                score = jaccard(source_shingles, shingles(self._entries[idx]["source"]))
+                if score > best_score:
+                    best, best_score = self._entries[idx], score
+
+        if best is not None and best_score >= self.threshold:
+            return best, best_score
+        return None, best_score
+
+    def record(self, namespace: str, similarity: float, hit: bool) -> None:
+        """Track per-call outcome for hit-rate reporting."""
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            self.recent.append({"namespace": namespace, "similarity": round(similarity, 3), "hit": hit})
+        record_cache("similarity", hit)
+        logger.info(f"similarity: {namespace} similarity={similarity:.2f} hit={hit}")
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "recent": list(self.recent),
+        }
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    try:
+                        self._insert(json.loads(line))
+                    except (json.JSONDecodeError, KeyError) as e:
+                        logger.warning(f"similarity: Skipping corrupt index line: {e}")
+
+
+_index: Optional[SimilarityIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_similarity_index() -> SimilarityIndex:
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = SimilarityIndex()
+        return _index
+
+
+def reuse_output(namespace: str, source: str) -> Optional[Dict[str, Any]]:
+    """
+    Look up a near-duplicate and adapt its stored output to the new source.
+    The "text" field must adapt cleanly; list fields (e.g. questions) are
+    adapted where possible and otherwise kept as stored. Records the outcome
+    on the shared index. Returns None on a miss.
+    """
+    index = get_similarity_index()
+    entry, similarity = index.query(namespace, source)
+    if entry is None:
+        index.record(namespace, similarity, hit=False)
+        return None
+
+    output = dict(entry["output"])
+    if isinstance(output.get("text"), str):
+        adapted = adapt_text(entry["source"], source, output["text"])
+        if adapted is None:
+            index.record(namespace, similarity, hit=False)
+            return None
+        output["text"] = adapted
+    for field, value in output.items():
+        if isinstance(value, list):
+            output[field] = [
+                (adapt_text(entry["source"], source, item) or item) if isinstance(item, str) else item
+                for item in value
+            ]
+
+    index.record(namespace, similarity, hit=True)
+    return output
@@ -0,0 +1,184 @@
+"""
+Persistent spec library with a SQLite FTS5 full-text index.
+
+Completed specs are stored with their sanity-check metadata and indexed per
+PRD component, so past specs can be searched by keyword and reopened
+without any LLM calls.
+"""
+
+import os
+import re
+import json
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+from src.knowledge_base import PRD_COMPONENT_NAMES
+
+logger = logging.getLogger(__name__)
+
+LIBRARY_PATH = os.environ.get("SPEC_LIBRARY_PATH", ".spec_library.db")
+
+
+def component_column(name: str) -> str:
+    """FTS column name for a PRD component, e.g. 'Problem Statement' -> 'problem_statement'."""
+    return re.sub(r"\W+", "_", name.strip().lower())
+
+
+COMPONENT_COLUMNS: Dict[str, str] = {name: component_column(name) for name in PRD_COMPONENT_NAMES}
+
+
+def derive_title(components: Dict[str, Optional[str]], max_length: int = 80) -> str:
+    """Use the first sentence of the Goal (or any component) as the spec title."""
+    source = components.get("Goal") or next((v for v in components.values() if v), "") or "Untitled spec"
+    first = re.split(r"(?<=[.!?])\s", source.strip(), maxsplit=1)[0]
+    return first if len(first) <= max_length else first[:max_length - 1].rstrip() + "…"
+
+
+def build_match_query(query: str, component: Optional[str] = None) -> str:
+    """Turn free text into a safe FTS5 MATCH expression with prefix matching."""
+    terms = re.findall(r"\w+", query.lower())
+    if not terms:
+        return ""
+    expression = " ".join(f'"{term}"*' for term in terms)
+    if component:
+        return f"{COMPONENT_COLUMNS[component]} : ({expression})"
+    return expression
+
+
+class SpecLibrary:
+    """SQLite-backed store of finished specs. One connection shared behind a lock."""
+
+    def __init__(self, path: str = LIBRARY_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._create_schema()
+
+    def _create_schema(self) -> None:
+        columns = ", ".join(COMPONENT_COLUMNS.values())
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS specs (
+                    spec_id TEXT PRIMARY KEY,
+                    title TEXT NOT NULL,
+                    maturity TEXT,
+                    environment TEXT,
+                    is_detailed INTEGER NOT NULL DEFAULT 0,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL,
+                    payload TEXT NOT NULL
+                )
+            """)
+            self._conn.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS spec_index USING fts5("
+                f"spec_id UNINDEXED, title, {columns}, tokenize='porter unicode61')"
+            )
+
+    def save_spec(
+        self,
+        spec_id: str,
+        components: Dict[str, Optional[str]],
+        detailed_components: Optional[Dict[str, Dict[str, Any]]] = None,
+        metadata: Optional[Dict[str, Optional[str]]] = None,
+        title: Optional[str] = None,
+    ) -> None:
+        """Insert or replace a spec and its index row."""
+        metadata = metadata or {}
+        detailed_components = detailed_components or {}
+        title = title or derive_title(components)
+        now = datetime.now().isoformat(timespec="seconds")
+        payload = json.dumps({
+            "components": components,
+            "detailed_components": detailed_components,
+            "metadata": metadata,
+        })
+
+        # Index the detailed text when present, it is what the user exported
+        indexed = []
+        for name in PRD_COMPONENT_NAMES:
+            detail = detailed_components.get(name) or {}
+            indexed.append(detail.get("text") or components.get(name) or "")
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                INSERT INTO specs (spec_id, title, maturity, environment, is_detailed, created_at, updated_at, payload)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(spec_id) DO UPDATE SET
+                    title=excluded.title, maturity=excluded.maturity, environment=excluded.environment,
+                    is_detailed=excluded.is_detailed, updated_at=excluded.updated_at, payload=excluded.payload
+                """,
+                (spec_id, title, metadata.get("maturity"), metadata.get("environment"),
+                 int(bool(detailed_components)), now, now, payload),
+            )
+            self._conn.execute("DELETE FROM spec_index WHERE spec_id = ?", (spec_id,))
+            placeholders = ", ".join("?" for _ in range(len(indexed) + 2))
+            self._conn.execute(f"INSERT INTO spec_index VALUES ({placeholders})", (spec_id, title, *indexed))
+
+        logger.info(f"spec_library: Saved {spec_id} ({title})")
+
+    def search(self, query: str, component: Optional[str] = None, limit: int = 20) -> List[Dict[str, Any]]:
+        """Rank specs by BM25 relevance. Optionally restrict matches to one component."""
+        match = build_match_query(query, component)
+        if not match:
+            return []
+
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT s.spec_id, s.title, s.maturity, s.environment, s.is_detailed, s.updated_at,
+                       snippet(spec_index, -1, '**', '**', '…', 12) AS snippet,
+                       bm25(spec_index) AS rank
+                FROM spec_index
+                JOIN specs s ON s.spec_id = spec_index.spec_id
+                WHERE spec_index MATCH ?
+                ORDER BY rank
+                LIMIT ?
+                """,
+                (match, limit),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def list_recent(self, limit: int = 10) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT spec_id, title, maturity, environment, is_detailed, updated_at "
+                "FROM specs ORDER BY updated_at DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def get_spec(self, spec_id: str) -> Optional[Dict[str, Any]]:
+        """Return {"components", "detailed_components", "metadata", "title"} or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT title, payload FROM specs WHERE spec_id = ?", (spec_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"title": row["title"], **json.loads(row["payload"])}
+
+    def delete_spec(self, spec_id: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM specs WHERE spec_id = ?", (spec_id,))
+            self._conn.execute("DELETE FROM spec_index WHERE spec_id = ?", (spec_id,))
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM specs").fetchone()[0]
+
+
+_library: Optional[SpecLibrary] = None
+_library_lock = threading.Lock()
+
+
+def get_spec_library(path: str = LIBRARY_PATH) -> SpecLibrary:
+    global _library
+    with _library_lock:
+        if _library is None or _library.path != path:
+            _library = SpecLibrary(path)
+        return _library
@@ -0,0 +1,291 @@
+"""
+In-process performance counters for graph runs.
+
+Nodes, LLM calls and caches report here with cheap in-memory updates; the
+sidebar performance panel reads the per-run breakdown and per-session
+totals without triggering any LLM work. The same updates feed the
+process-wide Prometheus metrics in src/utils/metrics.py.
+"""
+
+import time
+import asyncio
+import functools
+import threading
+import contextvars
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Any, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from src.utils import metrics
+
+RUNS_PER_SESSION = 20
+
+# Exception types that end a run, by metrics status; anything else is "error"
+_RUN_STATUSES = {"RunCancelled": "cancelled", "CancelledError": "cancelled", "DeadlineExceeded": "timeout"}
+
+_current_run: contextvars.ContextVar[Optional["RunStats"]] = contextvars.ContextVar("spec_run", default=None)
+_current_component: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("spec_component", default=None)
+
+_lock = threading.Lock()
+
+
+class RunStats:
+    """Breakdown of one graph invocation."""
+
+    def __init__(self, session_id: str, label: str):
+        self.session_id = session_id
+        self.label = label
+        self.started_at = time.time()
+        self.duration = 0.0
+        self.nodes: Dict[str, float] = defaultdict(float)
+        self.llm_calls: List[Dict[str, Any]] = []
+        self.cache: Dict[str, Dict[str, int]] = defaultdict(lambda: {"hits": 0, "misses": 0})
+
+    @property
+    def input_tokens(self) -> int:
+        return sum(c["input_tokens"] for c in self.llm_calls)
+
+    @property
+    def output_tokens(self) -> int:
+        return sum(c["output_tokens"] for c in self.llm_calls)
+
+
+class SessionStats:
+    def __init__(self):
+        self.runs: deque = deque(maxlen=RUNS_PER_SESSION)
+        self.totals = {
+            "runs": 0, "seconds": 0.0, "llm_calls": 0, "llm_errors": 0,
+            "llm_seconds": 0.0, "input_tokens": 0, "output_tokens": 0,
+        }
+        self.node_seconds: Dict[str, float] = defaultdict(float)
+        self.component_seconds: Dict[str, float] = defaultdict(float)
+        self.cache: Dict[str, Dict[str, int]] = defaultdict(lambda: {"hits": 0, "misses": 0})
+
+
+_sessions: Dict[str, SessionStats] = defaultdict(SessionStats)
+# Process-wide totals for activity outside a tracked run
+_global_cache: Dict[str, Dict[str, int]] = defaultdict(lambda: {"hits": 0, "misses": 0})
+# Process-wide LLM call totals per (node, model), read by the model router
+_model_calls: Dict[tuple, Dict[str, float]] = defaultdict(
+    lambda: {"calls": 0, "errors": 0, "seconds": 0.0, "input_tokens": 0, "output_tokens": 0}
+)
+
+
+@contextmanager
+def track_run(session_id: str, label: str = ""):
+    """Attribute node, LLM and cache activity in this context to one run."""
+    run = RunStats(session_id, label)
+    token = _current_run.set(run)
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield run
+    except BaseException as e:
+        status = _RUN_STATUSES.get(type(e).__name__, "error")
+        raise
+    finally:
+        run.duration = time.perf_counter() - start
+        _current_run.reset(token)
+        metrics.GRAPH_RUNS.inc(status)
+        metrics.GRAPH_RUN_SECONDS.observe(run.duration)
+        with _lock:
+            session = _sessions[session_id]
+            session.runs.append(run)
+            session.totals["runs"] += 1
+            session.totals["seconds"] += run.duration
+
+
+@contextmanager
+def component_scope(name: str):
+    """Tag LLM calls made inside this block with a PRD component name."""
+    token = _current_component.set(name)
+    try:
+        yield
+    finally:
+        _current_component.reset(token)
+
+
+def record_node(node: str, seconds: float) -> None:
+    metrics.NODE_SECONDS.observe(seconds, node)
+    run = _current_run.get()
+    if run is None:
+        return
+    with _lock:
+        run.nodes[node] += seconds
+        _sessions[run.session_id].node_seconds[node] += seconds
+
+
+def record_llm_call(
+    node: str,
+    seconds: float,
+    input_tokens: int = 0,
+    output_tokens: int = 0,
+    component: Optional[str] = None,
+    error: Optional[str] = None,
+    model: Optional[str] = None,
+) -> None:
+    call = {
+        "node": node,
+        "model": model,
+        "component": component,
+        "seconds": seconds,
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "error": error,
+    }
+    with _lock:
+        totals = _model_calls[(node, model)]
+        totals["calls"] += 1
+        totals["errors"] += 1 if error else 0
+        totals["seconds"] += seconds
+        totals["input_tokens"] += input_tokens
+        totals["output_tokens"] += output_tokens
+    metrics.LLM_CALL_SECONDS.observe(seconds, node, model or "")
+    if error:
+        metrics.LLM_ERRORS.inc(node, error)
+    if input_tokens:
+        metrics.LLM_TOKENS.inc(node, "input", amount=input_tokens)
+    if output_tokens:
+        metrics.LLM_TOKENS.inc(node, "output", amount=output_tokens)
+    run = _current_run.get()
+    if run is None:
+        return
+    with _lock:
+        run.llm_calls.append(call)
+        totals = _sessions[run.session_id].totals
+        totals["llm_calls"] += 1
+        totals["llm_seconds"] += seconds
+        totals["input_tokens"] += input_tokens
+        totals["output_tokens"] += output_tokens
+        if error:
+            totals["llm_errors"] += 1
+        if component:
+            _sessions[run.session_id].component_seconds[component] += seconds
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    field = "hits" if hit else "misses"
+    metrics.CACHE_REQUESTS.inc(cache, "hit" if hit else "miss")
+    run = _current_run.get()
+    with _lock:
+        _global_cache[cache][field] += 1
+        if run is not None:
+            run.cache[cache][field] += 1
+            _sessions[run.session_id].cache[cache][field] += 1
+
+
+def timed_node(name: str):
+    """Decorator recording wall time of a graph node (sync or async)."""
+    def decorator(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    record_node(name, time.perf_counter() - start)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record_node(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+class TelemetryCallbackHandler(BaseCallbackHandler):
+    """LangChain callback timing each chat model call and reading token usage."""
+
+    # Cheap and thread-safe, so async calls run it inline instead of in an executor
+    run_inline = True
+
+    def __init__(self, node: str, model: Optional[str] = None):
+        self.node = node
+        self.model = model
+        self._pending: Dict[UUID, tuple] = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs):
+        self._pending[run_id] = (time.perf_counter(), _current_run.get(), _current_component.get())
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs):
+        self._finish(run_id, response=response)
+
+    def on_llm_error(self, error, *, run_id: UUID, **kwargs):
+        self._finish(run_id, error=type(error).__name__)
+
+    def _finish(self, run_id: UUID, response=None, error: Optional[str] = None):
+        pending = self._pending.pop(run_id, None)
+        if pending is None:
+            return
+        start, run, component = pending
+        input_tokens = output_tokens = 0
+        if response is not None:
+            for generations in response.generations:
+                for generation in generations:
+                    usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                    input_tokens += usage.get("input_tokens", 0)
+                    output_tokens += usage.get("output_tokens", 0)
+
+        # Callbacks may fire on another thread; restore the run they started in
+        token = _current_run.set(run)
+        try:
+            record_llm_call(
+                self.node,
+                time.perf_counter() - start,
+                input_tokens,
+                output_tokens,
+                component=component,
+                error=error,
+                model=self.model,
+            )
+        finally:
+            _current_run.reset(token)
+
+
+def get_session_stats(session_id: str) -> Optional[SessionStats]:
+    with _lock:
+        return _sessions.get(session_id)
+
+
+def session_sizes(measure: Callable[[Any], int]) -> Dict[str, int]:
+    """Size of each session's stats as given by measure, e.g. memory_budget.deep_sizeof."""
+    with _lock:
+        return {session_id: measure(session) for session_id, session in _sessions.items()}
+
+
+def drop_session(session_id: str) -> bool:
+    """Forget a session's runs and totals, e.g. when its thread is evicted. False if it had none."""
+    with _lock:
+        return _sessions.pop(session_id, None) is not None
+
+
+def get_last_run(session_id: str) -> Optional[RunStats]:
+    with _lock:
+        session = _sessions.get(session_id)
+        return session.runs[-1] if session and session.runs else None
+
+
+def slowest_components(session_id: str, limit: int = 3) -> List[tuple]:
+    with _lock:
+        session = _sessions.get(session_id)
+        if not session:
+            return []
+        return sorted(session.component_seconds.items(), key=lambda kv: kv[1], reverse=True)[:limit]
+
+
+def get_global_cache_stats() -> Dict[str, Dict[str, int]]:
+    with _lock:
+        return {name: dict(counts) for name, counts in _global_cache.items()}
+
+
+def get_model_call_stats() -> Dict[tuple, Dict[str, float]]:
+    with _lock:
+        return {key: dict(totals) for key, totals in _model_calls.items()}
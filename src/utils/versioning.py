@@ -0,0 +1,301 @@
+"""
+Spec version history with delta-compressed storage.
+
+Each thread keeps its first version in full and later versions as
+compressed line deltas against the previous version, with a full snapshot
+every SNAPSHOT_INTERVAL versions so lookups never replay a long chain.
+Texts are serialized one sentence per line, so a small edit stores a small
+delta rather than the whole component again.
+
+Stores live in a process-wide LRU of SPEC_VERSION_STORES threads. Stores
+evicted from it (or released by memory_budget) reload from disk on next
+use; stores without a history directory only drop their cached documents.
+"""
+
+import os
+import re
+import json
+import zlib
+import base64
+import difflib
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_INTERVAL = 10
+RECONSTRUCTED_CACHE_SIZE = 8
+VERSION_STORE_LIMIT = int(os.environ.get("SPEC_VERSION_STORES", "64"))
+HISTORY_DIR = os.environ.get("SPEC_HISTORY_DIR", ".spec_history")
+
+# A text split into sentences is stored as {LINES_KEY: [pieces]}; joining the pieces restores it exactly
+LINES_KEY = "_lines"
+_SENTENCE_END = re.compile(r"(?<=[.!?]\s)|(?<=\n)")
+
+
+def _split_texts(value: Any) -> Any:
+    if isinstance(value, str):
+        pieces = [piece for piece in _SENTENCE_END.split(value) if piece]
+        return {LINES_KEY: pieces} if len(pieces) > 1 else value
+    if isinstance(value, dict):
+        return {key: _split_texts(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_split_texts(item) for item in value]
+    return value
+
+
+def _join_texts(value: Any) -> Any:
+    if isinstance(value, dict):
+        if set(value) == {LINES_KEY}:
+            return "".join(value[LINES_KEY])
+        return {key: _join_texts(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_join_texts(item) for item in value]
+    return value
+
+
+def serialize_spec(
+    components: Dict[str, Optional[str]],
+    detailed_components: Optional[Dict[str, Dict[str, Any]]] = None,
+) -> str:
+    """Canonical line-oriented text form of a spec version (one sentence per line), used for deltas and diffs."""
+    return json.dumps(
+        _split_texts({"components": components, "detailed_components": detailed_components or {}}),
+        indent=1,
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+
+
+def deserialize_spec(text: str) -> Dict[str, Any]:
+    """Inverse of serialize_spec; also reads versions stored before texts were split."""
+    return _join_texts(json.loads(text))
+
+
+def _compress(payload: Any) -> bytes:
+    return zlib.compress(json.dumps(payload, ensure_ascii=False).encode("utf-8"), 9)
+
+
+def _decompress(data: bytes) -> Any:
+    return json.loads(zlib.decompress(data).decode("utf-8"))
+
+
+def make_delta(base_lines: List[str], new_lines: List[str]) -> List[list]:
+    """Encode new_lines as copy ranges from base_lines plus inserted lines."""
+    ops = []
+    matcher = difflib.SequenceMatcher(None, base_lines, new_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append(["c", i1, i2])
+        elif j2 > j1:
+            ops.append(["i", new_lines[j1:j2]])
+    return ops
+
+
+def apply_delta(base_lines: List[str], ops: List[list]) -> List[str]:
+    lines = []
+    for op in ops:
+        if op[0] == "c":
+            lines.extend(base_lines[op[1]:op[2]])
+        else:
+            lines.extend(op[1])
+    return lines
+
+
+class SpecVersionStore:
+    """Version history for one thread. Safe to share across Streamlit reruns."""
+
+    def __init__(self, thread_id: str, directory: Optional[str] = None):
+        self.thread_id = thread_id
+        self.directory = directory
+        self._entries: List[Dict[str, Any]] = []
+        self._cache: "OrderedDict[int, List[str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        if directory:
+            self._load()
+
+    @property
+    def path(self) -> Optional[str]:
+        if not self.directory:
+            return None
+        safe_id = "".join(c if c.isalnum() or c in "-_" else "_" for c in self.thread_id)
+        return os.path.join(self.directory, f"{safe_id}.jsonl")
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def record(
+        self,
+        components: Dict[str, Optional[str]],
+        detailed_components: Optional[Dict[str, Dict[str, Any]]] = None,
+        label: str = "",
+    ) -> Optional[int]:
+        """Store a new version. Returns its number, or None if unchanged."""
+        text = serialize_spec(components, detailed_components)
+        new_lines = text.splitlines()
+
+        with self._lock:
+            version = len(self._entries)
+            if version:
+                previous = self._lines(version - 1)
+                if previous == new_lines:
+                    return None
+
+            if version % SNAPSHOT_INTERVAL == 0:
+                entry = {"kind": "full", "data": _compress(new_lines)}
+            else:
+                entry = {"kind": "delta", "data": _compress(make_delta(previous, new_lines))}
+
+            entry.update({
+                "version": version,
+                "label": label,
+                "timestamp": datetime.now().isoformat(timespec="seconds"),
+            })
+            self._entries.append(entry)
+            self._remember(version, new_lines)
+            self._append_to_disk(entry)
+
+        logger.info(f"versioning: Recorded {self.thread_id} v{version} ({entry['kind']}, {len(entry['data'])} bytes)")
+        return version
+
+    def list_versions(self) -> List[Dict[str, Any]]:
+        return [
+            {k: e[k] for k in ("version", "label", "timestamp", "kind")} | {"size": len(e["data"])}
+            for e in self._entries
+        ]
+
+    def get(self, version: int) -> Dict[str, Any]:
+        """Return {"components", "detailed_components"} for a version."""
+        with self._lock:
+            return deserialize_spec("\n".join(self._lines(version)))
+
+    def get_text(self, version: int) -> str:
+        with self._lock:
+            return "\n".join(self._lines(version))
+
+    def diff(self, from_version: int, to_version: int, context: int = 3) -> str:
+        """Unified diff between two versions of the serialized spec."""
+        with self._lock:
+            a = self._lines(from_version)
+            b = self._lines(to_version)
+        return "\n".join(difflib.unified_diff(
+            a, b,
+            fromfile=f"v{from_version}",
+            tofile=f"v{to_version}",
+            n=context,
+            lineterm="",
+        ))
+
+    def storage_bytes(self) -> int:
+        return sum(len(e["data"]) for e in self._entries)
+
+    def memory_bytes(self) -> int:
+        """Approximate resident size: stored entries plus cached reconstructed documents."""
+        with self._lock:
+            cached = sum(len(line) for lines in self._cache.values() for line in lines)
+            return self.storage_bytes() + cached
+
+    def clear_cache(self) -> int:
+        """Drop cached reconstructed documents. Returns the number dropped."""
+        with self._lock:
+            dropped = len(self._cache)
+            self._cache.clear()
+            return dropped
+
+    def _lines(self, version: int) -> List[str]:
+        if version < 0 or version >= len(self._entries):
+            raise IndexError(f"No version {version} for thread {self.thread_id}")
+
+        cached = self._cache.get(version)
+        if cached is not None:
+            self._cache.move_to_end(version)
+            return cached
+
+        # Walk back to the nearest snapshot (or cached version) then replay forward
+        start = version
+        while self._entries[start]["kind"] != "full" and start not in self._cache:
+            start -= 1
+        lines = self._cache[start] if start in self._cache else _decompress(self._entries[start]["data"])
+        for v in range(start + 1, version + 1):
+            lines = apply_delta(lines, _decompress(self._entries[v]["data"]))
+
+        self._remember(version, lines)
+        return lines
+
+    def _remember(self, version: int, lines: List[str]) -> None:
+        self._cache[version] = lines
+        self._cache.move_to_end(version)
+        while len(self._cache) > RECONSTRUCTED_CACHE_SIZE:
+            self._cache.popitem(last=False)
+
+    def _append_to_disk(self, entry: Dict[str, Any]) -> None:
+        if not self.path:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        record = {**entry, "data": base64.b64encode(entry["data"]).decode("ascii")}
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+
+    def _load(self) -> None:
+        if not self.path or not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    record["data"] = base64.b64decode(record["data"])
+                    self._entries.append(record)
+
+
+_stores: "OrderedDict[str, SpecVersionStore]" = OrderedDict()
+_stores_lock = threading.Lock()
+
+
+def _release(thread_id: str) -> bool:
+    """Drop a store reloadable from disk, or clear the cache of one that isn't. Called with the lock held."""
+    store = _stores.get(thread_id)
+    if store is None:
+        return False
+    if store.path:
+        del _stores[thread_id]
+    else:
+        store.clear_cache()
+    return True
+
+
+def get_version_store(thread_id: str, directory: Optional[str] = HISTORY_DIR) -> SpecVersionStore:
+    """Process-wide store per thread_id, loaded from disk on first use."""
+    with _stores_lock:
+        store = _stores.get(thread_id)
+        if store is None:
+            store = SpecVersionStore(thread_id, directory)
+            _stores[thread_id] = store
+        _stores.move_to_end(thread_id)
+
+        # Least recently used first; in-memory stores stay, minus their caches
+        for idle_id in list(_stores)[:max(0, len(_stores) - VERSION_STORE_LIMIT)]:
+            _release(idle_id)
+        return store
+
+
+def release_version_store(thread_id: str) -> bool:
+    """Free a thread's store, e.g. when memory_budget evicts the thread. False if none was loaded."""
+    with _stores_lock:
+        return _release(thread_id)
+
+
+def version_store_sizes() -> Dict[str, int]:
+    """Resident size of each loaded store, by thread_id."""
+    with _stores_lock:
+        stores = list(_stores.items())
+    return {thread_id: store.memory_bytes() for thread_id, store in stores}
+
+
+def diff_stats(diff_text: str) -> Tuple[int, int]:
+    """Count (added, removed) lines in a unified diff."""
+    added = sum(1 for l in diff_text.splitlines() if l.startswith("+") and not l.startswith("+++"))
+    removed = sum(1 for l in diff_text.splitlines() if l.startswith("-") and not l.startswith("---"))
+    return added, removed
@@ -1,6 +1,8 @@
 """
 Test script for component_master node with gap detection.
 Run: GOOGLE_API_KEY=<key> python test_components.py
+Record once with SPEC_WRITER_CASSETTE_MODE=record, then rerun offline with
+SPEC_WRITER_CASSETTE_MODE=replay (see "Record and Replay" in README.md).
 """
 
 import logging
@@ -178,6 +180,193 @@ Metrics: Track dark mode adoption rate with a target of 40% within 30 days. Meas
     return result
 
 
+
+def test_edge_sanity_verdict():
+    """Edge sanity verdicts from a stubbed component response decide routing without Gemini."""
+    print("\n" + "=" * 60)
+    print("TEST 5: Edge sanity verdict routing (stubbed component)")
+    print("=" * 60)
+    
+    import json
+    from src import edge_sanity_checker
+    from src.graph import entry_router
+    
+    raw_input = "Build an app for users"
+    original_stub = edge_sanity_checker.EDGE_SANITY_STUB
+    try:
+        routes = {}
+        for label, response in {
+            "reject": {"can_proceed": False, "confidence": 0.95, "feedback": "Say who the users are."},
+            "accept": {"can_proceed": True, "confidence": 0.9, "feedback": "Clear enough."},
+            "unsure": {"can_proceed": False, "confidence": 0.4, "feedback": "Maybe."},
+            "error": {"error": "WebGPU is not available in this browser"},
+        }.items():
+            edge_sanity_checker.EDGE_SANITY_STUB = json.dumps(response)
+            verdict = edge_sanity_checker.edge_sanity_check(raw_input)
+            state = edge_sanity_checker.apply_edge_verdict(create_test_state(raw_input) | {"can_proceed": False}, verdict, raw_input)
+            routes[label] = entry_router(state)
+            print(f"  {label}: decisive={edge_sanity_checker.is_decisive(verdict)} -> {routes[label]}")
+    finally:
+        edge_sanity_checker.EDGE_SANITY_STUB = original_stub
+    
+    # A verdict for a different brief is ignored
+    stale = edge_sanity_checker.parse_component_value({"input_hash": "0" * 16, "can_proceed": False, "confidence": 1.0}, raw_input)
+    
+    assert routes == {"reject": "end", "accept": "component_master", "unsure": "sanity_checker", "error": "sanity_checker"}
+    assert stale is None
+    return routes
+
+
+
+def test_adapt_text_whole_words():
+    """Reused outputs only rewrite whole-token matches of a changed source phrase."""
+    print("\n" + "=" * 60)
+    print("TEST 6: Similarity reuse adapts whole words only")
+    print("=" * 60)
+    
+    from src.utils.similarity import adapt_text
+    
+    cases = [
+        (("We sync in Q2", "We sync of Q2", "We increase integration in Europe and sync into Q3"),
+         "We increase integration of Europe and sync into Q3"),
+        (("Reach 30 signups", "Reach 40 signups", "Reach 300 signups, then 30 more"),
+         "Reach 300 signups, then 40 more"),
+        # Ambiguous (twice) or absent as a whole token: can't be adapted safely
+        (("Reach 30 signups", "Reach 40 signups", "Reach 30 signups, then 30 more"), None),
+        (("Reach 30 signups", "Reach 40 signups", "Reach 300 signups"), None),
+    ]
+    for (old_source, new_source, old_output), expected in cases:
+        adapted = adapt_text(old_source, new_source, old_output)
+        print(f"  {old_output!r} -> {adapted!r}")
+        assert adapted == expected
+    return cases
+
+
+
+def test_version_delta_size():
+    """Version deltas round-trip and grow with the edit, not with the component."""
+    print("\n" + "=" * 60)
+    print("TEST 7: Version history delta size")
+    print("=" * 60)
+    
+    from src.utils.versioning import serialize_spec, deserialize_spec, make_delta, apply_delta
+    
+    goal = " ".join(f"Sentence {i} covers retention target number {i * 7} for cohort {i}." for i in range(60))
+    components = {name: None for name in PRD_COMPONENT_NAMES} | {"Goal": goal}
+    detailed = {"Goal": {"text": goal + "\nSecond paragraph. Done!", "questions": ["Who owns it? Why?"]}}
+    edited = dict(components, Goal=goal.replace("number 140", "number 150"))
+    
+    base = serialize_spec(components, detailed).splitlines()
+    new = serialize_spec(edited, detailed).splitlines()
+    ops = make_delta(base, new)
+    inserted = sum(len(line) for op in ops if op[0] == "i" for line in op[1])
+    
+    print(f"  Goal: {len(goal)} chars, delta inserts {inserted} chars in {len(ops)} ops")
+    assert apply_delta(base, ops) == new
+    assert deserialize_spec("\n".join(apply_delta(base, ops))) == {"components": edited, "detailed_components": detailed}
+    assert inserted < 200 < len(goal)
+    return ops
+
+
+
+def test_apply_edits():
+    """Patch refinement applies edits at unique anchors and rejects the rest."""
+    print("\n" + "=" * 60)
+    print("TEST 8: Refiner patch edits")
+    print("=" * 60)
+    
+    from src.nodes.refiner import apply_edits, PatchError
+    
+    text = "Teams plan work in weekly cycles. Managers review progress on Fridays. The board syncs with calendars."
+    
+    inserted = apply_edits(text, [{"op": "insert", "anchor": "weekly cycles.", "text": "Cycles start on Monday."}])
+    print(f"  insert: {inserted}")
+    assert inserted == "Teams plan work in weekly cycles. Cycles start on Monday. Managers review progress on Fridays. The board syncs with calendars."
+    
+    removed = apply_edits(text, [{"op": "replace", "anchor": " Managers review progress on Fridays.", "text": ""}])
+    print(f"  replace with empty: {removed}")
+    assert removed == "Teams plan work in weekly cycles. The board syncs with calendars."
+    
+    rejected = {
+        "repeated anchor": [{"op": "insert", "anchor": "s.", "text": "More detail."}],
+        "missing anchor": [{"op": "replace", "anchor": "quarterly", "text": "monthly"}],
+        "below minimum length": [{"op": "replace", "anchor": text, "text": "Too short now."}],
+    }
+    for label, edits in rejected.items():
+        try:
+            apply_edits(text, edits)
+        except PatchError as e:
+            print(f"  {label}: PatchError({e})")
+        else:
+            raise AssertionError(f"{label} was applied")
+    return inserted
+
+
+
+def test_llm_scheduler():
+    """Interactive waiters go first, class caps hold, aged batch work is served, cancelled grants free their slot."""
+    print("\n" + "=" * 60)
+    print("TEST 9: LLM priority scheduler")
+    print("=" * 60)
+    
+    import asyncio
+    from src.utils.scheduler import LLMScheduler
+    
+    async def scenario():
+        scheduler = LLMScheduler(limit=2, class_limits={"interactive": 2, "background": 1, "batch": 1}, aging_seconds=60)
+        order, peak = [], {"background": 0}
+        
+        async def call(priority, tag, seconds=0.02):
+            async with scheduler.slot(priority):
+                order.append(tag)
+                peak["background"] = max(peak["background"], scheduler.snapshot()["background"]["in_flight"])
+                await asyncio.sleep(seconds)
+        
+        # Background fills its cap of one and queues the rest; interactive calls then take
+        # the free slot first, although they arrived after the queued background calls
+        tasks = [asyncio.create_task(call("background", f"b{i}")) for i in range(3)]
+        await asyncio.sleep(0)
+        tasks += [asyncio.create_task(call("interactive", f"i{i}")) for i in range(3)]
+        await asyncio.gather(*tasks)
+        
+        # Aging: a batch call waiting behind a steady interactive stream still gets through
+        aging = LLMScheduler(limit=1, class_limits={"interactive": 1, "background": 1, "batch": 1}, aging_seconds=0.05)
+        served = []
+        
+        async def stream():
+            for _ in range(20):
+                async with aging.slot("interactive"):
+                    served.append("i")
+                    await asyncio.sleep(0.01)
+        
+        async def batch():
+            async with aging.slot("batch"):
+                served.append("batch")
+        
+        await asyncio.gather(stream(), stream(), batch())
+        
+        # Cancelled right after being granted: the slot is returned
+        cancelled = LLMScheduler(limit=1, class_limits={"interactive": 1, "background": 1, "batch": 1})
+        await cancelled.acquire("interactive")
+        waiter = asyncio.create_task(cancelled.acquire("interactive"))
+        await asyncio.sleep(0)
+        cancelled.release("interactive")
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        
+        return order, peak, served, scheduler.snapshot(), cancelled.snapshot()
+    
+    order, peak, served, after, after_cancel = asyncio.run(scenario())
+    print(f"  service order: {order}")
+    print(f"  batch served at position {served.index('batch')} of {len(served)}")
+    
+    assert order[0] == "b0" and order[1:4] == ["i0", "i1", "i2"]
+    assert peak["background"] == 1
+    assert served.index("batch") < len(served) - 1
+    assert all(s["queued"] == 0 and s["in_flight"] == 0 for s in list(after.values()) + list(after_cancel.values()))
+    return order
+
+
 if __name__ == "__main__":
     print("\n" + "#" * 60)
     print("# COMPONENT MASTER NODE - TEST SUITE (v2)")
@@ -191,6 +380,11 @@ if __name__ == "__main__":
         "partial_prd": test_partial_prd(),
         "incremental": test_incremental_update(),
     }
+    test_edge_sanity_verdict()
+    test_adapt_text_whole_words()
+    test_version_delta_size()
+    test_apply_edits()
+    test_llm_scheduler()
     
     print("\n" + "=" * 60)
     print("SUMMARY")